@@ -0,0 +1,154 @@
+"""
+Report and email helpers for advance_agent.py.
+
+None of these need crewAI, so batch.py and the outbox can format reports and
+queue emails without loading it.
+"""
+import os
+
+from mailer import send_report_email
+from metrics import format_run_metrics, run_summary, write_json_summary
+from outbox import queue_report_email
+from report_writer import StreamingReportWriter
+
+# --- Output Formatting Function ---
+
+def report_header_lines(execution_timestamp, input_data_dict):
+    target_name = input_data_dict.get('target_name', 'Unknown Target')
+    industry = input_data_dict.get('industry', 'Unknown Industry')
+    return [
+        f"# Strategic Analysis Report: {target_name}",
+        f"## Industry: {industry}",
+        f"Generated On: {execution_timestamp}",
+        "=" * 70 + "\n",
+    ]
+
+def task_section_lines(index, task, task_output):
+    """Formats one task's section of the report."""
+    output_lines = []
+    task_desc_short = task.description.split('\n')[0]
+    agent_role = task.agent.role if task.agent else "Unknown Agent"
+    # Safely access .raw attribute
+    output_raw = getattr(task_output, 'raw', None)
+    if output_raw is None:
+         output_raw = str(task_output) # Fallback to string representation
+
+    output_lines.append(f"### Task {index+1}: {task_desc_short}")
+    output_lines.append(f"*Executed by: {agent_role}*")
+    output_lines.append("-" * 50)
+    output_lines.append("**Output:**\n")
+    if isinstance(output_raw, str):
+        for line in output_raw.strip().split('\n'):
+            output_lines.append(f"  {line.strip()}")
+    else:
+        output_lines.append(f"  (Output was not a string: {type(output_raw)})")
+        output_lines.append(f"  {str(output_raw)}")
+    output_lines.append("\n" + "=" * 70 + "\n")
+    return output_lines
+
+def report_metadata_lines(tasks_list, agents_list, metrics_summary=None):
+    output_lines = ["\n## Execution Metadata:", "-" * 50]
+    output_lines.append(f"Agents Involved: {', '.join(agents_list)}")
+    output_lines.append(f"Total Tasks in Workflow: {len(tasks_list)}")
+    if metrics_summary:
+        output_lines.extend(format_run_metrics(metrics_summary))
+    return output_lines
+
+def format_to_text(execution_timestamp, tasks_list, task_outputs_list, agents_list, input_data_dict, metrics_summary=None):
+    """Formats the crew execution results into a structured text report."""
+    output_lines = report_header_lines(execution_timestamp, input_data_dict)
+    if task_outputs_list and len(task_outputs_list) == len(tasks_list):
+        for i, task_output in enumerate(task_outputs_list):
+            output_lines.extend(task_section_lines(i, tasks_list[i], task_output))
+    else:
+        output_lines.append("!! Error: Mismatch between number of tasks and outputs, or no outputs generated.")
+        output_lines.append(f"  Tasks defined: {len(tasks_list)}")
+        output_lines.append(f"  Outputs received: {len(task_outputs_list) if task_outputs_list else 0}")
+    output_lines.extend(report_metadata_lines(tasks_list, agents_list, metrics_summary))
+    return "\n".join(output_lines)
+
+# --- Email Sending Function ---
+
+def send_email_with_attachment(recipient_email, subject, body, file_path):
+    """
+    Sends an email with the specified file attached, through the pooled mailer (see mailer.py).
+    `recipient_email` may list several comma-separated addresses; they share one message.
+    """
+    return send_report_email(recipient_email, subject, body, file_path, "EMAIL_SENDER_ADDRESS", "EMAIL_SENDER_PASSWORD")
+
+def queue_email_with_attachment(recipient_email, subject, body, file_path, run_id=None):
+    """Queues the email in the outbox and returns its outbox ID (None if it could not be queued) without waiting for SMTP."""
+    return queue_report_email(recipient_email, subject, body, file_path, "EMAIL_SENDER_ADDRESS", "EMAIL_SENDER_PASSWORD", run_id)
+
+# --- Report Writing ---
+
+def report_path_for(input_data, execution_time, output_dir=".", run_id=None):
+    """The report's file name. The run ID, when given, keeps runs started in the same second apart."""
+    target_name_sanitized = input_data.get('target_name', 'analysis_report')
+    target_name_sanitized = "".join(c if c.isalnum() else "_" for c in target_name_sanitized)
+    return os.path.join(output_dir, f"{target_name_sanitized}_{run_id or execution_time}.txt")
+
+def write_report(result, crew, input_data, execution_time, output_dir=".", run_metrics=None, run_id=None):
+    """
+    Formats the crew result and saves the report file, plus the run's metrics as
+    `<report>.metrics.json` when `run_metrics` is given. Returns the file path, or None if nothing was written.
+    """
+    if not (hasattr(result, 'tasks_output') and result.tasks_output):
+        print("\nError: Crew execution result did not contain 'tasks_output' or it was empty.")
+        print("Raw execution result:", result) # Print raw result for debugging
+        return None
+
+    agent_roles = [agent.role for agent in crew.agents]
+    metrics_summary = run_summary(run_metrics) if run_metrics is not None else None
+    formatted_text = format_to_text(
+        execution_time,
+        crew.tasks,
+        result.tasks_output,
+        agent_roles,
+        input_data,
+        metrics_summary
+    )
+
+    report_file_path = report_path_for(input_data, execution_time, output_dir, run_id)
+
+    try:
+        with open(report_file_path, 'w', encoding='utf-8') as f:
+            f.write(formatted_text)
+        print(f"\nFormatted report saved successfully to: '{report_file_path}'")
+    except IOError as e:
+        print(f"\nError writing report file '{report_file_path}': {e}")
+        return None
+
+    if metrics_summary is not None:
+        try:
+            write_json_summary(metrics_summary, os.path.splitext(report_file_path)[0] + ".metrics.json")
+        except IOError as e:
+            print(f"Warning: Could not write metrics summary: {e}")
+    return report_file_path
+
+def start_streaming_report(crew, input_data, execution_time, output_dir=".", run_id=None):
+    """Opens the report before kickoff and attaches it to the crew so task sections are written as they finish."""
+    writer = StreamingReportWriter(
+        report_path_for(input_data, execution_time, output_dir, run_id),
+        lambda index, task_output: task_section_lines(index, crew.tasks[index], task_output),
+        len(crew.tasks),
+    )
+    writer.start(report_header_lines(execution_time, input_data))
+    crew.on_task_output = writer.add
+    return writer
+
+def finish_streaming_report(writer, crew, run_metrics=None):
+    """Writes the metadata footer (and the metrics JSON). Returns the report path, or None if writing failed."""
+    metrics_summary = run_summary(run_metrics) if run_metrics is not None else None
+    try:
+        report_file_path = writer.finish(report_metadata_lines(crew.tasks, [agent.role for agent in crew.agents], metrics_summary))
+    except IOError as e:
+        print(f"\nError finishing report file '{writer.path}': {e}")
+        return None
+    print(f"\nFormatted report saved successfully to: '{report_file_path}'")
+    if report_file_path and metrics_summary is not None:
+        try:
+            write_json_summary(metrics_summary, os.path.splitext(report_file_path)[0] + ".metrics.json")
+        except IOError as e:
+            print(f"Warning: Could not write metrics summary: {e}")
+    return report_file_path
@@ -0,0 +1,369 @@
+"""
+Tools for the strategic analysis crew in advance_agent.py.
+
+These subclass crewAI's BaseTool, so they live apart from advance_agent.py and
+are only imported when `build_crew()` runs. Importing advance_agent.py for its
+report and email helpers (see advance_agent_report.py) never loads crewAI.
+"""
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, ClassVar, Optional, Type # Use Type for type hints
+import traceback # For detailed error printing
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from cassette import through_cassette
+from knowledge_index import KnowledgeIndex
+from metrics import record_tool_call, tool_reliability
+from report_index import research_search
+from research import parse_query_list, research_fanout
+from sentiment import get_sentiment_engine, parse_batch_input
+from snippet_dedup import dedupe_tool_output
+from token_budget import cap_tool_output, error_envelope
+from tool_memo import canonical_input, get_tool_memo
+from tool_registry import get_tool_registry
+
+# --- Tool Input Schema Definition ---
+
+class ToolInputSchema(BaseModel):
+    """Input schema for the enhanced tools."""
+    input_data: str = Field(..., description="The input data, query, or JSON string for the tool")
+
+# --- Enhanced Base Tool with Corrected _run Method ---
+
+class EnhancedBaseTool(BaseTool):
+    """
+    An enhanced base tool with standardized input schema, error handling,
+    and corrected _run method signature for single-input schemas.
+    """
+    args_schema: Type[BaseModel] = ToolInputSchema  # Expect 'input_data' field
+    # Tools whose output depends only on their input set memoize = True;
+    # results are then kept in a per-class LRU cache (see tool_memo.py)
+    memoize: ClassVar[bool] = False
+    memo_size: ClassVar[int] = 256
+    # Search tools set dedupe_snippets = True; snippets already shown in this run are then left out (see snippet_dedup.py)
+    dedupe_snippets: ClassVar[bool] = False
+
+    def _run(self, input_data: str) -> str:
+        """
+        Executes the tool's logic.
+        Receives the string value directly because args_schema has one required field.
+        """
+        started = time.perf_counter()
+        ok = False
+        try:
+            # The input_data is already the string needed by execute_tool_logic
+            result = through_cassette(self.name, input_data, self._execute)
+            ok = not str(result).startswith("Error") # Handled failures come back as "Error..." strings
+            if self.dedupe_snippets:
+                result = dedupe_tool_output(self.name, input_data, result)
+            return cap_tool_output(self.name, result, input_data) # Over-cap results keep the passages closest to the input
+        except Exception as e:
+            # The traceback goes to the console; the agent gets a short error it can act on
+            print(f"\nError executing tool '{self.name}' with input starting: '{str(input_data)[:100]}...'")
+            traceback.print_exc()
+            return error_envelope(self.name, e, input_data)
+        finally:
+            record_tool_call(self.name, time.perf_counter() - started, ok)
+
+    def _execute(self, input_data: str) -> str:
+        """Runs execute_tool_logic, serving repeated inputs from the memo for memoized tools."""
+        if not self.memoize:
+            return self.execute_tool_logic(input_data)
+        memo = get_tool_memo(type(self), self.memo_size)
+        key = canonical_input(input_data)
+        hit, result = memo.get(key)
+        if not hit:
+            result = self.execute_tool_logic(input_data)
+            memo.put(key, result)
+        return result
+
+    def execute_tool_logic(self, input_data: str) -> str:
+        """Placeholder for the specific logic of the derived tool."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def get_metadata(self) -> Dict[str, Any]:
+        """Provides metadata about the tool."""
+        metadata = {
+            **get_tool_registry().describe(self), # Name, description and args schema, computed once per tool type
+            "last_updated": datetime.now().isoformat(),
+            "reliability_score": tool_reliability(self.name) # Success rate in this process; None before the first call
+        }
+        if self.memoize:
+            metadata["memo"] = get_tool_memo(type(self), self.memo_size).stats()
+        return metadata
+
+# --- Specific Tool Implementations ---
+
+class AdvancedResearchTool(EnhancedBaseTool):
+    name: str = "Advanced Research Tool"
+    description: str = ("Performs comprehensive web research on organizations, individuals, "
+                       "and industry trends using DuckDuckGo. Accepts one query, or a JSON list of "
+                       "queries (e.g. [\"X financials\", \"X leadership\", \"X recent news\"]) researched together in one call.")
+    dedupe_snippets: ClassVar[bool] = True
+
+    def execute_tool_logic(self, query: str) -> str:
+        """Researches from the local report index, or DuckDuckGo (through the search cache) when it falls short."""
+        queries = parse_query_list(query)
+        if queries:
+            # Several queries in one call: searched concurrently, merged into per-query sections
+            print(f"\nExecuting Advanced Research Tool with {len(queries)} queries: {queries}\n")
+            return research_fanout(queries)
+        try:
+            print(f"\nExecuting Advanced Research Tool with query: {query}\n")
+            results = research_search(query) # Earlier reports first, the web when they fall short
+            return f"Research Findings for '{query}':\n\n{results}"
+        except Exception as e:
+            return f"Error during DuckDuckGo search for '{query}': {str(e)}"
+
+class MarketAnalysisTool(EnhancedBaseTool):
+    name: str = "Market Analysis Tool"
+    description: str = ("Analyzes market trends, competitor landscapes, and industry "
+                       "developments based on a provided industry name.")
+    memoize: ClassVar[bool] = True
+
+    def execute_tool_logic(self, industry: str) -> str:
+        """Provides a simulated market analysis for the given industry."""
+        print(f"\nExecuting Market Analysis Tool for industry: {industry}\n")
+        # In a real scenario, this could query databases, APIs, or use complex models.
+        # This is a placeholder returning structured text.
+        analysis = (
+            f"Market Analysis for the '{industry}' Industry:\n\n"
+            f"1.  **Current Growth & Size**: The {industry} sector is experiencing [significant/moderate/slow] growth, driven by factors like [technology adoption/consumer demand shifts/regulatory changes]. Market size is estimated at [Provide estimate if known].\n"
+            f"2.  **Key Technology Trends**: Dominant trends include [AI integration/automation/cloud migration/sustainability tech/etc.]. These are reshaping [operations/customer experience/product development].\n"
+            f"3.  **Competitive Landscape**: Characterized by [a few dominant players/fragmentation/high competition]. Key players include [List examples if known]. Recent M&A activity [is high/moderate/low]. New entrants are focusing on [niche markets/disruptive tech].\n"
+            f"4.  **Consumer Behavior Shifts**: Consumers are increasingly valuing [digital experiences/personalization/sustainability/value for money]. Brand loyalty is [strong/weakening].\n"
+            f"5.  **Regulatory Environment**: Key regulations impacting the industry involve [data privacy (e.g., GDPR)/environmental standards/trade policies/safety standards]. Compliance is [a major challenge/standard practice].\n"
+            f"6.  **Opportunities**: Potential growth areas lie in [emerging markets/new technologies/underserved segments/sustainability initiatives].\n"
+            f"7.  **Challenges**: Major hurdles include [supply chain disruptions/talent shortages/economic uncertainty/intense competition/regulatory burdens]."
+        )
+        return analysis
+
+class SentimentAnalysisTool(EnhancedBaseTool):
+    name: str = "Sentiment Analysis Tool"
+    description: str = ("Analyzes sentiment (positive, negative, neutral) in text data "
+                       "like communications, social media posts, or news articles. "
+                       "Accepts one text or a JSON list of texts (e.g. several draft variants) to score in one call.")
+
+    def execute_tool_logic(self, text: str) -> str:
+        """Scores sentiment with the weighted lexicon engine (one text, or a JSON list of texts)."""
+        print(f"\nExecuting Sentiment Analysis Tool on text starting with: {text[:100]}...\n")
+        engine = get_sentiment_engine()
+
+        texts = parse_batch_input(text)
+        if texts:
+            results = engine.analyze_batch(texts)
+            lines = [f"- Text {i}: **{r.label}** (Compound: {r.compound:+.2f}, Score: {r.score:+.1f}) \"{t[:60]}...\""
+                     for i, (t, r) in enumerate(zip(texts, results), start=1)]
+            return "Sentiment Analysis Results:\n\n" + "\n".join(lines)
+
+        result = engine.analyze(text)
+        if result.label == "Positive":
+            sentiment = "Positive"
+        elif result.label == "Negative":
+            sentiment = "Negative"
+        else:
+            sentiment = "Neutral or Mixed"
+        indicators = ", ".join(result.top_terms) or "no strong sentiment keywords"
+
+        return (f"Sentiment Analysis Result:\n\n"
+                f"Detected Sentiment: **{sentiment}** (Score: {result.score:+.1f}, Compound: {result.compound:+.2f})\n"
+                f"Basis: {result.positive_hits} positive and {result.negative_hits} negative terms "
+                f"({result.negated_hits} negated) across {result.words} words; strongest: {indicators}.\n"
+                f"Note: This is a lexicon-based analysis. Context is crucial for accurate interpretation.")
+
+class StrategicPlanningTool(EnhancedBaseTool):
+    name: str = "Strategic Planning Tool"
+    description: str = ("Develops strategic recommendations based on input context. "
+                       "Expects a JSON string containing 'organization_type' and 'objectives'.")
+    memoize: ClassVar[bool] = True
+
+    def execute_tool_logic(self, context_data_json: str) -> str:
+        """Generates strategic recommendations from a JSON input string."""
+        print(f"\nExecuting Strategic Planning Tool with JSON: {context_data_json}\n")
+        try:
+            data = json.loads(context_data_json)
+            org_type = data.get("organization_type", "general business")
+            objectives = data.get("objectives", ["growth", "efficiency"])
+            # Optional: Include context for more tailored advice
+            target_info = data.get("target_info", "the organization")
+
+        except json.JSONDecodeError:
+            return (f"Error: Invalid JSON received by Strategic Planning Tool. "
+                    f"Input started with: {context_data_json[:100]}...")
+        except Exception as e:
+            return f"Error processing input in Strategic Planning Tool: {str(e)}"
+
+        # Expanded dictionary of strategies mapped to objectives
+        strategies = {
+            "growth": f"Focus on market expansion for {target_info}. Explore targeted digital marketing, strategic partnerships, and potentially new service/product lines based on market analysis.",
+            "efficiency": f"Implement process optimization for {target_info}. Analyze workflows for automation opportunities (RPA/AI), adopt data analytics for decision-making, and review resource allocation.",
+            "innovation": f"Foster an innovation culture within {target_info}. Establish R&D initiatives or cross-functional teams, explore emerging technologies relevant to {org_type}, and create pathways for internal idea generation.",
+            "customer_retention": f"Enhance customer loyalty for {target_info}. Develop personalized engagement strategies using CRM data, improve customer support channels, and implement feedback loops for continuous improvement.",
+            "market_penetration": f"Increase market share within existing segments for {target_info}. Consider competitive pricing strategies, enhanced marketing campaigns, and loyalty programs.",
+            "product_development": f"Introduce new products/services or enhance existing ones for {target_info}. Conduct market research to identify unmet needs and invest in R&D.",
+            "diversification": f"Expand into new markets or product categories for {target_info} to reduce risk. Assess adjacent opportunities and potential synergies.",
+            "risk_assessment": f"Conduct a thorough risk analysis for {target_info} covering operational, financial, market, and regulatory areas. Identify key vulnerabilities and impacts.",
+            "improvement": f"Identify specific areas for performance improvement within {target_info} based on prior analysis (e.g., sales process, supply chain, product quality). Set measurable targets.",
+            "contingency_planning": f"Develop contingency plans for identified high-impact risks for {target_info}. Outline response strategies for scenarios like economic downturns, competitor actions, or operational disruptions."
+        }
+
+        recommendations = []
+        for obj in objectives:
+            if obj in strategies:
+                recommendations.append(f"- **Objective: {obj.replace('_', ' ').title()}**\n  - Strategy: {strategies[obj]}")
+            else:
+                recommendations.append(f"- Objective: {obj.replace('_', ' ').title()} - No predefined strategy template available. Requires custom development.")
+
+        if not recommendations:
+            recommendations.append("- No specific objectives provided or matched. Default recommendation: Focus on core business stability and incremental improvements.")
+
+        return (f"Strategic Recommendations for {target_info} ({org_type}):\n\n" +
+                "\n".join(recommendations))
+
+class CommunicationOptimizationTool(EnhancedBaseTool):
+    name: str = "Communication Optimization Tool"
+    description: str = ("Analyzes and suggests enhancements for communication effectiveness. "
+                       "Expects a JSON string with 'audience', 'message' context, and 'objective'.")
+    memoize: ClassVar[bool] = True
+
+    def execute_tool_logic(self, input_data_json: str) -> str:
+        """Provides suggestions to optimize communication based on JSON input."""
+        print(f"\nExecuting Communication Optimization Tool with JSON: {input_data_json}\n")
+        try:
+            data = json.loads(input_data_json)
+            audience = data.get("audience", "a general audience")
+            message_context = data.get("message", "a standard communication")
+            objective = data.get("objective", "inform")
+
+        except json.JSONDecodeError:
+            return (f"Error: Invalid JSON received by Communication Optimization Tool. "
+                    f"Input started with: {input_data_json[:100]}...")
+        except Exception as e:
+            return f"Error processing input in Communication Optimization Tool: {str(e)}"
+
+        # Tailored suggestions based on input
+        enhancements = [
+            f"**Audience Adaptation**: Ensure language, tone, and complexity are appropriate for `{audience}`. Avoid jargon unless the audience is technical.",
+            f"**Clarity of Objective**: Make the purpose ('{objective}') clear early on. What should the audience know or do after receiving the message?",
+            "**Structure**: Use a logical flow (e.g., Intro, Key Points, Supporting Details, Call to Action/Conclusion). Use headings or bullet points for readability.",
+            f"**Value Proposition**: If applicable ({objective} often involves persuasion), clearly articulate the 'what's in it for them' for the `{audience}`.",
+            "**Conciseness**: Remove redundant words or phrases. Be direct and to the point, respecting the audience's time.",
+            "**Call to Action (CTA)**: If the objective requires action ('{objective}'), make the CTA specific, clear, and easy to follow.",
+            f"**Tone**: Match the tone to the audience (`{audience}`) and objective ('{objective}'). (e.g., Formal for executives, encouraging for team updates).",
+            "**Supporting Evidence**: If making claims, briefly mention supporting data or examples where appropriate.",
+            f"**Personalization**: Consider if personalization (e.g., using names, referencing specific context) is possible and appropriate for `{audience}`."
+        ]
+
+        return (
+            f"Communication Optimization Suggestions:\n\n"
+            f"**Target Audience**: {audience}\n"
+            f"**Communication Objective**: {objective}\n"
+            f"**Original Message Context**: {message_context[:150]}...\n\n"
+            f"**Recommended Enhancements**:\n" +
+            "\n".join([f"- {enhancement}" for enhancement in enhancements]) +
+            f"\n\n**Final Check**: Review the message from the perspective of `{audience}`. Does it achieve the '{objective}' effectively?"
+        )
+
+class KnowledgeBaseTool(EnhancedBaseTool):
+    name: str = "Knowledge Base Tool"
+    description: str = ("Provides access to built-in knowledge on frameworks, models, "
+                       "guidelines, and industry insights.")
+    memoize: ClassVar[bool] = True
+
+    # FULL Knowledge dictionary (a ClassVar, so every instance shares this one dict)
+    knowledge: ClassVar[Dict[str, Dict[str, str]]] = {
+        "research_frameworks": {
+            "competitive_analysis": (
+                "Framework for competitive analysis:\n"
+                "1. Identify key competitors (direct, indirect, potential).\n"
+                "2. Analyze their product/service offerings (features, quality, innovation).\n"
+                "3. Evaluate pricing strategies and business models.\n"
+                "4. Assess market positioning, branding, and messaging.\n"
+                "5. Review strengths, weaknesses, market share, and customer reviews.\n"
+                "6. Identify opportunities for differentiation and potential threats they pose."
+            ),
+            "stakeholder_mapping": (
+                "Framework for stakeholder mapping:\n"
+                "1. Identify all relevant stakeholders (internal/external, e.g., execs, users, partners, regulators).\n"
+                "2. Categorize by influence (high/low) and interest (high/low).\n"
+                "3. Determine their key interests, motivations, and potential concerns.\n"
+                "4. Map relationships and potential conflicts between stakeholders.\n"
+                "5. Identify potential champions, blockers, and neutral parties.\n"
+                "6. Develop tailored engagement and communication strategies for each key stakeholder group."
+            )
+        },
+        "strategic_models": {
+            "swot_analysis": (
+                "SWOT Analysis Framework:\n"
+                "- Strengths: Internal capabilities, resources, and advantages (e.g., brand reputation, skilled workforce, IP).\n"
+                "- Weaknesses: Internal limitations and areas for improvement (e.g., outdated tech, lack of resources, process inefficiencies).\n"
+                "- Opportunities: External factors that can be leveraged (e.g., market growth, new tech, changing regulations, competitor weaknesses).\n"
+                "- Threats: External factors that pose risks (e.g., new competitors, economic downturns, changing consumer preferences, regulatory changes)."
+            ),
+            "value_proposition": (
+                "Value Proposition Canvas Components:\n"
+                "1. Customer Segment(s): Who are you creating value for?\n"
+                "2. Customer Jobs: What tasks/problems are customers trying to solve?\n"
+                "3. Pains: What negative outcomes/risks do customers face?\n"
+                "4. Gains: What outcomes/benefits do customers desire?\n"
+                "5. Products/Services: What do you offer to help with jobs, pains, gains?\n"
+                "6. Pain Relievers: How does your offering alleviate customer pains?\n"
+                "7. Gain Creators: How does your offering create customer gains?\n"
+                "Fit: Ensure strong alignment between customer profile and value map."
+            )
+        },
+        "communication_guidelines": {
+            "stakeholder_messaging": (
+                "Tailoring Messages for Stakeholders:\n"
+                "1. C-Level Executives: Focus on strategic impact, ROI, market position, competitive advantage, risk management. Keep it concise and high-level.\n"
+                "2. Directors/VPs: Emphasize operational efficiency, departmental goals, cross-functional benefits, resource allocation, team performance.\n"
+                "3. Managers: Highlight implementation details, team impact, workflow improvements, required resources, timelines, training needs.\n"
+                "4. End Users/Employees: Showcase ease of use, individual productivity gains, time savings, required changes to daily tasks, support resources.\n"
+                "5. Financial Stakeholders (Investors, Finance Dept): Stress financial metrics (revenue, cost savings, ROI, profitability), risk analysis, market potential."
+            ),
+            "objection_handling": (
+                "Framework for Handling Objections (LAARC/LAER):\n"
+                "1. Listen: Actively listen to understand the full objection without interrupting.\n"
+                "2. Acknowledge/Validate: Show empathy and validate their concern ('I understand why you'd ask that...', 'That's a valid point...').\n"
+                "3. Ask/Explore/Clarify: Ask probing questions to uncover the root cause or specific details ('Could you tell me more about...?', 'What specifically concerns you about...?').\n"
+                "4. Respond/Address: Provide a relevant, concise answer addressing the specific concern, using facts, data, or examples. Offer solutions if applicable.\n"
+                "5. Confirm/Check: Ensure your response has satisfied their concern ('Does that address your question?', 'How does that sound?')."
+            )
+        },
+        "industry_insights": {
+            "technology": "The technology sector is characterized by rapid innovation cycles, intense competition, talent wars, and evolving cybersecurity threats. Key trends include AI/ML adoption, cloud/edge computing synergy, increasing focus on data privacy, and the rise of sustainable tech.",
+            "financial_services": "Financial services are undergoing massive digital transformation driven by fintech disruption, open banking initiatives, AI for fraud detection and personalization, and stringent regulatory oversight (e.g., Basel III/IV, AML/KYC). Customer experience and cybersecurity are paramount.",
+            "healthcare": "Healthcare transformation focuses on value-based care, telehealth expansion, interoperability challenges, AI in diagnostics/drug discovery, and personalized medicine. Regulatory compliance (HIPAA) and data security remain critical considerations. Staffing shortages are also a major issue.",
+            "retail": "Retail is adapting to omnichannel customer journeys, supply chain resilience challenges, the rise of social commerce, and experiential retail concepts. Key drivers include personalization via data analytics, sustainability demands, and optimizing last-mile delivery.",
+            "fast-moving consumer goods": "FMCG sector focuses on brand building, supply chain efficiency, adapting to changing consumer preferences (health, sustainability), navigating retailer relationships, and leveraging e-commerce growth. Inflation and raw material costs are current pressures."
+        }
+    }
+
+    top_k: int = 3 # Number of ranked entries returned per query
+    _shared_index: ClassVar[Optional[KnowledgeIndex]] = None
+
+    def execute_tool_logic(self, query: str) -> str:
+        """Retrieves the best-ranked knowledge base entries for the query."""
+        print(f"\nExecuting Knowledge Base Tool with query: {query}\n")
+        index = KnowledgeBaseTool._shared_index
+        if index is None:
+            # Built on first use and shared by every instance in the process
+            index = KnowledgeBaseTool._shared_index = KnowledgeIndex(self.knowledge)
+
+        matches = index.search(query, k=self.top_k)
+        # Keep only entries that are close in relevance to the best match
+        matches = [match for match in matches if match.score >= matches[0].score * 0.5]
+        if matches:
+            return "\n\n---\n\n".join(
+                f"Knowledge Base Result: **{match.category_title} - {match.title}** (relevance {match.score:.2f})\n\n{match.content}"
+                for match in matches
+            )
+
+        # Fallback if no good match is found
+        available_categories = ", ".join([c.replace('_', ' ').title() for c in self.knowledge.keys()])
+        return (f"No specific knowledge base entry found matching '{query}'.\n"
+                f"Available top-level categories: {available_categories}.\n"
+                f"Try queries like 'information on competitive analysis', 'details about objection handling', or 'insights for the retail industry'.")
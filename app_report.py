@@ -0,0 +1,165 @@
+"""
+Report and email helpers for app.py.
+
+None of these need crewAI, so batch.py and the outbox can format reports and
+queue emails without loading it.
+"""
+import os
+
+from mailer import send_report_email
+from metrics import format_run_metrics, run_summary, write_json_summary
+from outbox import queue_report_email
+from report_writer import StreamingReportWriter
+
+# --- Email Sending Function (Copied and adjusted from advance_agent 2.py) ---
+def send_email_with_attachment(recipient_email, subject, body, file_path):
+    """
+    Sends an email with the specified file attached, through the pooled mailer (see mailer.py).
+    `recipient_email` may list several comma-separated addresses; they share one message.
+    """
+    # Use EMAIL_ADDRESS and EMAIL_PASSWORD as previously specified for .env
+    return send_report_email(recipient_email, subject, body, file_path, "EMAIL_ADDRESS", "EMAIL_PASSWORD")
+
+def queue_email_with_attachment(recipient_email, subject, body, file_path, run_id=None):
+    """Queues the email in the outbox and returns its outbox ID (None if it could not be queued) without waiting for SMTP."""
+    return queue_report_email(recipient_email, subject, body, file_path, "EMAIL_ADDRESS", "EMAIL_PASSWORD", run_id)
+
+def report_header_lines(execution_time, input_data):
+    company_name = input_data.get('company_name', 'Unknown Company')
+    industry = input_data.get('industry', 'Unknown Industry')
+    return [
+        f"{company_name} Strategic Analysis Report",
+        f"Industry: {industry}",
+        f"Generated on: {execution_time}",
+        "=" * 50,
+        "",
+    ]
+
+def task_section_lines(index, task, task_output, input_data):
+    company_name = input_data.get('company_name', 'Unknown Company')
+    industry = input_data.get('industry', 'Unknown Industry')
+    output_lines = []
+    task_desc = task.description.split(".")[0]
+    # Adjust task description formatting slightly if needed
+    task_desc_formatted = task_desc.replace("{company_name}", company_name).replace("{industry}", industry).strip()
+    output_lines.append(f"\nTask {index+1}: {task_desc_formatted}")
+    output_lines.append("-" * 40)
+
+    output_content = getattr(task_output, 'raw', None)
+    if output_content is None:
+         print(f"Debug: Task {index+1} output object type: {type(task_output)}, lacks 'raw'. Value: {str(task_output)[:200]}...")
+         output_content = str(task_output)
+
+    output_lines.append("Key Findings:")
+    if output_content and isinstance(output_content, str):
+        for line in output_content.strip().split("\n"):
+            line_stripped = line.strip()
+            if line_stripped.startswith(("**", "##", "1.", "2.", "3.", "4.", "5.", "-")) and len(line_stripped) > 2:
+                output_lines.append(line_stripped)
+            elif line_stripped:
+                output_lines.append(f"  - {line_stripped}")
+    elif output_content:
+         output_lines.append(f"  - Output (non-string): {str(output_content)[:300]}...")
+    else:
+        output_lines.append("  - No output content found for this task.")
+    output_lines.append("")
+    return output_lines
+
+def usage_metrics_of(result_container):
+    if getattr(result_container, 'token_usage', None) is not None:
+        return result_container.token_usage.model_dump()
+    return getattr(result_container, 'usage_metrics', None) or {}
+
+def report_metadata_lines(tasks, agents, executed_count, total_usage_metrics, metrics_summary=None):
+    output_lines = []
+    output_lines.append("\n--- Execution Metadata ---")
+    output_lines.append("-" * 40)
+    agent_roles = [agent.role for agent in agents]
+    output_lines.append(f"Agents Used: {', '.join(agent_roles)}")
+    output_lines.append(f"Tasks Defined: {len(tasks)}")
+    if executed_count: output_lines.append(f"Tasks Executed (with output): {executed_count}")
+    if total_usage_metrics:
+         output_lines.append(f"Total Tokens Used: {total_usage_metrics.get('total_tokens', 'N/A')}")
+    if metrics_summary:
+        output_lines.extend(format_run_metrics(metrics_summary))
+    return output_lines
+
+def format_to_text(execution_time, tasks, result_container, agents, input_data, metrics_summary=None):
+    output_lines = report_header_lines(execution_time, input_data)
+
+    task_outputs = []
+    total_usage_metrics = {}
+    if result_container:
+        if hasattr(result_container, 'tasks_output') and isinstance(result_container.tasks_output, list):
+            task_outputs = result_container.tasks_output
+        total_usage_metrics = usage_metrics_of(result_container)
+        if not hasattr(result_container, 'tasks_output'):
+             print(f"Debug: Result object type: {type(result_container)}, value: {str(result_container)[:500]}... Lacks 'tasks_output'.")
+             
+    if task_outputs and len(task_outputs) == len(tasks):
+        output_lines.append("--- Task Results ---")
+        for i, (task, task_output) in enumerate(zip(tasks, task_outputs)):
+            output_lines.extend(task_section_lines(i, task, task_output, input_data))
+    elif not task_outputs:
+        output_lines.append("Execution resulted in no task outputs.")
+        if result_container: output_lines.append(f"Raw result: {str(result_container)[:500]}...")
+    else:
+        output_lines.append(f"Task output count ({len(task_outputs)}) does not match defined task count ({len(tasks)}).")
+        output_lines.append(f"Raw result: {str(result_container)[:500]}...")
+
+    output_lines.extend(report_metadata_lines(tasks, agents, len(task_outputs), total_usage_metrics, metrics_summary))
+    return "\n".join(output_lines)
+
+def report_file_path(input_data, execution_time_str, output_dir=".", run_id=None):
+    """The report's file name. The run ID, when given, keeps runs started in the same second apart."""
+    target_name_safe = input_data.get('company_name', 'analysis').replace(" ", "_").replace(".", "").lower()
+    return os.path.join(output_dir, f"{target_name_safe}_report_{run_id or execution_time_str}.txt")
+
+def write_metrics_summary(file_path, metrics_summary):
+    try:
+        write_json_summary(metrics_summary, os.path.splitext(file_path)[0] + ".metrics.json")
+    except Exception as e:
+        print(f"Warning: Could not write metrics summary for '{file_path}': {e}")
+
+def write_report(result, crew, input_data, execution_time_str, output_dir=".", run_metrics=None, run_id=None):
+    """
+    Formats the crew result and writes the text report, plus the run's metrics as
+    `<report>.metrics.json` when `run_metrics` is given. Returns the report path, or None if writing failed.
+    """
+    metrics_summary = run_summary(run_metrics) if run_metrics is not None else None
+    formatted_text = format_to_text(execution_time_str, crew.tasks, result, crew.agents, input_data, metrics_summary)
+    file_path = report_file_path(input_data, execution_time_str, output_dir, run_id)
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(formatted_text)
+        print(f"Text report file '{file_path}' created successfully.")
+    except Exception as e:
+        print(f"Error writing report file '{file_path}': {e}")
+        return None
+    if metrics_summary is not None:
+        write_metrics_summary(file_path, metrics_summary)
+    return file_path
+
+def start_streaming_report(crew, input_data, execution_time_str, output_dir=".", run_id=None):
+    """Opens the report before kickoff and attaches it to the crew so task sections are written as they finish."""
+    writer = StreamingReportWriter(
+        report_file_path(input_data, execution_time_str, output_dir, run_id),
+        lambda index, task_output: task_section_lines(index, crew.tasks[index], task_output, input_data),
+        len(crew.tasks),
+    )
+    writer.start(report_header_lines(execution_time_str, input_data) + ["--- Task Results ---"])
+    crew.on_task_output = writer.add
+    return writer
+
+def finish_streaming_report(writer, result, crew, run_metrics=None):
+    """Writes the metadata footer (and the metrics JSON). Returns the report path, or None if writing failed."""
+    metrics_summary = run_summary(run_metrics) if run_metrics is not None else None
+    executed = len(getattr(result, 'tasks_output', None) or [])
+    try:
+        file_path = writer.finish(report_metadata_lines(crew.tasks, crew.agents, executed, usage_metrics_of(result), metrics_summary))
+    except Exception as e:
+        print(f"Error finishing report file '{writer.path}': {e}")
+        return None
+    if file_path and metrics_summary is not None:
+        write_metrics_summary(file_path, metrics_summary)
+    return file_path
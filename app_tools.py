@@ -0,0 +1,278 @@
+"""
+Tools for the strategic analysis crew in app.py.
+
+These subclass crewAI's BaseTool, so they live apart from app.py and are only
+imported when `build_crew()` runs. Importing app.py for its report and email
+helpers (see app_report.py) never loads crewAI.
+"""
+import json
+import time
+from datetime import datetime
+from typing import Any, ClassVar, Dict
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from cassette import through_cassette
+from knowledge_store import get_knowledge_store
+from metrics import record_tool_call, tool_reliability
+from report_index import research_search
+from research import parse_query_list, research_fanout
+from sentiment import get_sentiment_engine, parse_batch_input
+from snippet_dedup import dedupe_tool_output
+from token_budget import cap_tool_output, error_envelope
+from tool_memo import canonical_input, get_tool_memo
+from tool_registry import get_tool_registry
+
+# Enhanced BaseTool implementation with error handling and metadata
+class ToolInputSchema(BaseModel):
+    description: str = Field(..., description="The input data, query, or context for the tool")
+
+# Base tool class
+class EnhancedBaseTool(BaseTool):
+    args_schema: type[BaseModel] = ToolInputSchema
+    # Deterministic tools set memoize = True to reuse results for repeated inputs
+    memoize: ClassVar[bool] = False
+    memo_size: ClassVar[int] = 256
+    # Search tools set dedupe_snippets = True to leave out snippets the crew has already seen this run
+    dedupe_snippets: ClassVar[bool] = False
+
+    def _run(self, description: str) -> str:
+        tool_name = self.name or "Unknown Tool"
+        started = time.perf_counter()
+        ok = False
+        try:
+            if not description:
+                 print(f"Warning: Tool '{tool_name}' received empty description input.")
+                 return f"Error: Tool '{tool_name}' requires a non-empty description input."
+
+            result = through_cassette(tool_name, description, self._execute)
+            # Tools report handled failures as "Error..." strings rather than raising
+            ok = not str(result).startswith("Error")
+            if self.dedupe_snippets:
+                result = dedupe_tool_output(tool_name, description, result)
+            return cap_tool_output(tool_name, result, description) # Over-cap results keep the passages closest to the input
+        except NotImplementedError:
+             print(f"Error: execute_tool_logic not implemented in {tool_name}")
+             raise 
+        except Exception as e:
+            print(f"ERROR during {tool_name} execution.")
+            print(f"  Input description received by _run: '{description}'")
+            print(f"  Exception: {type(e).__name__}: {str(e)}")
+            return error_envelope(tool_name, e, description)
+        finally:
+            record_tool_call(tool_name, time.perf_counter() - started, ok)
+
+    def _execute(self, description: str) -> str:
+        if not self.memoize:
+            return self.execute_tool_logic(description)
+        memo = get_tool_memo(type(self), self.memo_size)
+        key = self.memo_key(description)
+        hit, result = memo.get(key)
+        if not hit:
+            result = self.execute_tool_logic(description)
+            memo.put(key, result)
+        return result
+
+    def execute_tool_logic(self, input_string: str) -> str:
+        raise NotImplementedError(f"execute_tool_logic is not implemented for tool {self.name}")
+
+    def memo_key(self, input_string: str) -> str:
+        # Override when the result also depends on tool state (e.g. loaded data)
+        return canonical_input(input_string)
+
+    def get_metadata(self) -> Dict[str, Any]:
+        # Name, description and argument schema come from the registry's precomputed manifest
+        metadata = {
+            **get_tool_registry().describe(self),
+            "last_updated": datetime.now().isoformat(),
+            # Share of successful calls so far in this process; None until the tool has run
+            "reliability_score": tool_reliability(self.name or "Unknown Tool")
+        }
+        if self.memoize:
+            metadata["memo"] = get_tool_memo(type(self), self.memo_size).stats()
+        return metadata
+
+# Advanced Research Tool
+class AdvancedResearchTool(EnhancedBaseTool):
+    name: str = "Advanced Research Tool"
+    description: str = ("Performs comprehensive research on organizations, individuals, and industry trends from multiple sources. "
+                        "Accepts one query, or a JSON list of queries (e.g. [\"X financials\", \"X leadership\", \"X competitors\"]) "
+                        "researched together in one call.")
+    dedupe_snippets: ClassVar[bool] = True
+
+    def execute_tool_logic(self, query: str) -> str:
+        if not query: return "Error: Advanced Research Tool query cannot be empty."
+        # A JSON list of queries is searched concurrently and merged into one response
+        queries = parse_query_list(query)
+        if queries:
+            return research_fanout(queries)
+        try:
+            results = research_search(query) # Earlier reports first, the web when they fall short
+            if not results or "No good DuckDuckGo Search Results found" in results:
+                 print(f"Warning: DuckDuckGo returned no results for query: {query}")
+                 return f"No research findings found for '{query}'. Try refining the query."
+            return f"Research findings for '{query}':\n\n{results}"
+        except Exception as e:
+            print(f"Error during DuckDuckGo search for '{query}': {e}")
+            return f"Error performing research for '{query}': {e}"
+
+# Market Analysis Tool
+class MarketAnalysisTool(EnhancedBaseTool):
+    name: str = "Market Analysis Tool"
+    description: str = "Analyzes market trends, competitor landscapes, and industry developments"
+    memoize: ClassVar[bool] = True
+
+    def execute_tool_logic(self, industry: str) -> str:
+        if not industry: return "Error: Market Analysis Tool requires an industry name."
+        analysis = (
+            f"Market Analysis for {industry} industry:\n\n"
+            f"1. Current Growth Rate: The {industry} sector is experiencing significant transformation\n"
+            f"2. Technology Trends: AI integration, cloud solutions, and automation are reshaping operational models\n"
+            f"3. Competitive Landscape: The market shows a mix of established players and disruptive newcomers\n"
+            f"4. Consumer Behavior: Shifting toward digital-first, personalized experiences with emphasis on value\n"
+            f"5. Regulatory Environment: Increasing focus on data privacy, security, and compliance requirements"
+        )
+        return analysis
+
+# Sentiment Analysis Tool
+class SentimentAnalysisTool(EnhancedBaseTool):
+    name: str = "Sentiment Analysis Tool"
+    description: str = "Analyzes sentiment in communications, social media, and public perception. Accepts one text or a JSON list of texts to score together."
+
+    def execute_tool_logic(self, text: str) -> str:
+        if not text: return "Neutral sentiment detected (No text provided)."
+        engine = get_sentiment_engine()
+
+        # A JSON list of texts (e.g. several draft variants) is scored in one batch call
+        texts = parse_batch_input(text)
+        if texts:
+            results = engine.analyze_batch(texts)
+            lines = [f"- Text {i}: {r.label} (compound: {r.compound:+.2f}, score: {r.score:+.1f}) \"{t[:60]}...\"" for i, (t, r) in enumerate(zip(texts, results), start=1)]
+            return f"Sentiment for {len(texts)} texts:\n" + "\n".join(lines)
+
+        result = engine.analyze(text)
+        key_terms = ", ".join(result.top_terms) or "none"
+        if result.label == "Positive":
+            return f"Positive sentiment detected (score: {result.score:+.1f}, compound: {result.compound:+.2f}). Key indicators: {key_terms}."
+        elif result.label == "Negative":
+            return f"Negative sentiment detected (score: {result.score:+.1f}, compound: {result.compound:+.2f}). Key indicators: {key_terms}. Potential concerns to address in communications."
+        else:
+            return f"Neutral sentiment detected (score: {result.score:+.1f}). Recommend balanced approach focusing on factual information and value proposition."
+        
+
+# Strategic Planning Tool
+class StrategicPlanningTool(EnhancedBaseTool):
+    name: str = "Strategic Planning Tool"
+    description: str = "Develops strategic recommendations based on market research and organizational needs"
+    memoize: ClassVar[bool] = True
+
+    def execute_tool_logic(self, context_data_json: str) -> str:
+        if not context_data_json: return "Error: Strategic Planning Tool requires context data (JSON expected)."
+        try:
+            data = json.loads(context_data_json)
+            org_type = data.get("organization_type", "general")
+            objectives = data.get("objectives", ["growth", "efficiency"])
+            if not isinstance(objectives, list):
+                print(f"Warning: Objectives data is not a list: {objectives}. Using default.")
+                objectives = ["growth", "efficiency"]
+
+        except json.JSONDecodeError:
+            print(f"Warning: StrategicPlanningTool received non-JSON input: '{context_data_json}'. Using default objectives.")
+            org_type = "general" 
+            objectives = ["growth", "efficiency"]
+        except Exception as e:
+            print(f"Error processing input in StrategicPlanningTool: {e}")
+            return f"Error processing strategic planning context '{context_data_json[:50]}...': {e}"
+
+        strategies = {
+            "growth": "Expand market presence through targeted digital campaigns and strategic partnerships",
+            "efficiency": "Implement process automation and data-driven decision making",
+            "innovation": "Establish cross-functional innovation teams and rapid prototyping processes",
+            "customer_retention": "Develop personalized engagement programs and enhanced customer success frameworks",
+            "risk_assessment": "Conduct thorough risk assessment focusing on market volatility and competitive threats",
+            "improvement": "Identify key areas for process improvement and strategic refinement",
+            "contingency_planning": "Develop contingency plans for potential market disruptions or strategic failures"
+        }
+        
+        available_strategies = {k: v for k, v in strategies.items() if k in objectives}
+        if not available_strategies:
+            available_strategies = {"general": "Focus on a balanced approach incorporating sustainable growth and operational excellence based on the provided context."}
+            if not objectives: objectives = ["general context"] 
+
+        return f"Strategic recommendations for {org_type} organization based on objectives ({', '.join(objectives)}):\n\n" + "\n".join([f"- {strategy}" for strategy in available_strategies.values()])
+    
+# Communication Optimization Tool
+class CommunicationOptimizationTool(EnhancedBaseTool):
+    name: str = "Communication Optimization Tool"
+    description: str = "Analyzes and enhances communication effectiveness for different contexts and audiences"
+    memoize: ClassVar[bool] = True
+
+    def execute_tool_logic(self, input_data_json: str) -> str:
+        if not input_data_json: return "Error: Communication Optimization Tool requires input data (JSON expected)."
+        try:
+            data = json.loads(input_data_json)
+            audience = data.get("audience", "general")
+            message = data.get("message", "")
+            objective = data.get("objective", "inform")
+        except json.JSONDecodeError:
+            print(f"Warning: CommunicationOptimizationTool received non-JSON input: '{input_data_json}'. Treating as message context.")
+            audience = "general"
+            message = input_data_json
+            objective = "inform"
+        except Exception as e:
+            print(f"Error processing input in CommunicationOptimizationTool: {e}")
+            return f"Error processing communication context '{input_data_json[:50]}...': {e}"
+
+        enhancements = [
+            "Simplified technical language for broader accessibility",
+            "Added concrete examples to illustrate key points",
+            "Structured message with clear call-to-action",
+            "Incorporated relevant value propositions",
+            "Optimized for engagement with concise, impactful statements"
+        ]
+        
+        return (
+            f"Communication optimization for {audience} audience with {objective} objective:\n\n"
+            f"Original message context: {message[:150]}...\n\n"
+            f"Enhancements applied:\n" + "\n".join([f"- {enhancement}" for enhancement in enhancements])
+        )
+
+# Knowledge Base Tool (reads the shared snapshot of knowledge_base.json)
+class KnowledgeBaseTool(EnhancedBaseTool):
+    name: str = "Knowledge Base Tool"
+    description: str = "Provides access to built-in knowledge and best practices for research, strategy, and communications loaded from knowledge_base.json"
+    knowledge_file: str = "knowledge_base.json" # Provide default here
+    top_k: int = 3 # Number of ranked entries returned per query
+    memoize: ClassVar[bool] = True
+
+    def __init__(self, **kwargs): # Accept arbitrary kwargs for flexibility
+        super().__init__(**kwargs) 
+        # The file is parsed once per process; later instances reuse the same snapshot
+        get_knowledge_store(self.knowledge_file)
+
+    @property
+    def knowledge(self):
+        """The current knowledge base, reloaded automatically when the file changes."""
+        return get_knowledge_store(self.knowledge_file).knowledge
+
+    def memo_key(self, input_string: str) -> str:
+        # Results depend on the loaded file, so a reload starts a fresh set of keys
+        store = get_knowledge_store(self.knowledge_file)
+        return f"{store.path}|{store.version}|{self.top_k}|{canonical_input(input_string)}"
+
+    def execute_tool_logic(self, query: str) -> str:
+        store = get_knowledge_store(self.knowledge_file)
+        if not store.knowledge:
+             return "Error: Knowledge Base is not loaded or is empty. Cannot process query."
+        if not query: return "Error: Knowledge Base Tool query cannot be empty."
+        
+        matches = store.index.search(query, k=self.top_k)
+        # Drop trailing entries that only share a generic word with the query
+        matches = [match for match in matches if match.score >= matches[0].score * 0.5]
+        if not matches:
+            available_categories = ", ".join([c.replace("_", " ").title() for c in store.knowledge.keys()])
+            return f"No specific match found for '{query}' in Knowledge Base. Available categories: {available_categories}. Please refine your query."
+
+        sections = [f"Knowledge Base: {match.title} ({match.category_title}, relevance {match.score:.2f})\n\n{match.content}" for match in matches]
+        return "\n\n---\n\n".join(sections)
@@ -0,0 +1,253 @@
+"""
+Batch analysis mode: runs one crew kickoff per target listed in a CSV or JSONL file.
+
+Usage:
+    python batch.py watchlist.csv --app app --workers 4
+    python batch.py watchlist.jsonl --app advance_agent --processes --output-dir nightly_reports
+
+Each row holds the crew inputs (e.g. company_name/industry for app.py, or
+target_name/industry/key_decision_maker/position/milestone for advance_agent.py).
+Finished targets are recorded in <output-dir>/progress.jsonl, so re-running the
+same command skips them and only retries failed or missing targets.
+Each report gets a <report>.metrics.json with that target's task, tool and token
+metrics; in thread mode the combined Prometheus textfile is written at the end
+when METRICS_TEXTFILE is set. Every run, completed or failed, is also appended to
+the run store (see run_store.py) under its own run ID. With --email, each report
+is queued for delivery as soon as it is written (see outbox.py) and sent in the
+background while the remaining targets run.
+"""
+import argparse
+import csv
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from checkpoint import new_run_id
+from metrics import run_summary, start_run_metrics, write_prometheus_textfile
+from outbox import start_background_sender
+from report_index import index_new_report
+from run_store import record_crew_run
+
+PROGRESS_FILE = "progress.jsonl"
+
+# --- Target Loading ---
+
+def load_targets(path: str) -> List[Dict[str, Any]]:
+    """Reads target inputs from a .csv (header row required) or .jsonl file."""
+    targets = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                targets.append({k.strip(): (v or "").strip() for k, v in row.items() if k})
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    targets.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {line_number} of '{path}': {e}") from e
+    return targets
+
+
+def target_key(target: Dict[str, Any]) -> str:
+    """Stable identifier for a target row, used to track progress across runs."""
+    canonical = json.dumps(target, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def target_label(target: Dict[str, Any]) -> str:
+    return str(target.get('company_name') or target.get('target_name') or target_key(target))
+
+# --- Progress Tracking ---
+
+def load_completed(progress_path: str) -> Dict[str, Dict[str, Any]]:
+    """Returns the latest successful progress record for every finished target."""
+    completed: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(progress_path):
+        return completed
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # A partially written last line from an interrupted run
+            if record.get("status") == "ok":
+                completed[record["key"]] = record
+            else:
+                completed.pop(record.get("key"), None)
+    return completed
+
+
+def append_progress(progress_path: str, record: Dict[str, Any], lock: threading.Lock) -> None:
+    with lock:
+        with open(progress_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+# --- Worker ---
+
+def run_target(app_module: str, target: Dict[str, Any], output_dir: str, email_to: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs the crew from `app_module` for one target on an isolated copy of the crew.
+    Never raises; failures are returned as a record with status 'failed'.
+    """
+    record = {"key": target_key(target), "target": target_label(target), "status": "failed",
+              "report": None, "error": None, "seconds": 0.0, "run_id": new_run_id()}
+    started = time.time()
+    crew = run_metrics = None
+    try:
+        module = importlib.import_module(app_module)
+        crew = module.build_crew() # Tasks are interpolated in place, so every target gets its own crew
+
+        missing = sorted(crew.fetch_inputs() - set(target))
+        if missing:
+            record["error"] = f"Missing inputs: {', '.join(missing)}"
+            return record
+
+        run_metrics = start_run_metrics()
+        result = crew.kickoff(inputs=target)
+        execution_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        report_path = module.write_report(result, crew, target, execution_time, output_dir=output_dir,
+                                          run_metrics=run_metrics, run_id=record["run_id"])
+        if report_path:
+            record["status"] = "ok"
+            record["report"] = report_path
+            index_new_report(report_path)
+            if email_to:
+                record["emailed"] = module.queue_email_with_attachment(
+                    email_to, f"Strategic Analysis Report: {record['target']}",
+                    f"Attached is the strategic analysis report for {record['target']}, generated on {execution_time}.",
+                    report_path, run_id=record["run_id"]) is not None
+        else:
+            record["error"] = "Report could not be written."
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    finally:
+        record["seconds"] = round(time.time() - started, 2)
+        record["finished_at"] = datetime.now().isoformat()
+        if run_metrics is not None:
+            record_crew_run(record["run_id"], app_module, target, crew,
+                            status="completed" if record["status"] == "ok" else "failed",
+                            started_at=datetime.fromtimestamp(started), report_path=record["report"],
+                            metrics=run_summary(run_metrics), error=record["error"])
+    return record
+
+# --- Batch Runner ---
+
+def run_batch(targets_path: str, app_module: str = "app", workers: int = 4,
+              use_processes: bool = False, output_dir: str = "batch_reports",
+              email_to: Optional[str] = None) -> Dict[str, Any]:
+    """Runs every pending target on a bounded worker pool and returns a summary."""
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    targets = load_targets(targets_path)
+    completed = load_completed(progress_path)
+
+    pending, seen = [], set()
+    for target in targets:
+        key = target_key(target)
+        if key in completed or key in seen:
+            continue
+        seen.add(key)
+        pending.append(target)
+
+    print(f"Batch: {len(targets)} targets, {len(targets) - len(pending)} already done or duplicated, "
+          f"{len(pending)} to run with {workers} {'processes' if use_processes else 'threads'}.")
+
+    from scheduler import preserve_std_streams # Loads crewAI, so it is only imported once there is work to run
+    lock = threading.Lock()
+    records: List[Dict[str, Any]] = []
+    started = time.time()
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with preserve_std_streams(), executor_cls(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(run_target, app_module, target, output_dir, email_to): target for target in pending}
+        for future in as_completed(futures):
+            target = futures[future]
+            try:
+                record = future.result()
+            except Exception as e: # e.g. a worker process died
+                record = {"key": target_key(target), "target": target_label(target), "status": "failed",
+                          "report": None, "error": f"{type(e).__name__}: {e}", "seconds": 0.0,
+                          "finished_at": datetime.now().isoformat()}
+            append_progress(progress_path, record, lock)
+            records.append(record)
+            print(f"[{len(records)}/{len(pending)}] {record['target']}: {record['status']} "
+                  f"({record['seconds']}s){' - ' + record['error'] if record['error'] else ''}")
+
+    if email_to:
+        # Worker processes exit without draining their outbox threads; this process sends what is left
+        start_background_sender()
+    elapsed = time.time() - started
+    succeeded = [r for r in records if r["status"] == "ok"]
+    failed = [r for r in records if r["status"] != "ok"]
+    summary = {
+        "targets_file": targets_path,
+        "app": app_module,
+        "workers": workers,
+        "mode": "processes" if use_processes else "threads",
+        "total_targets": len(targets),
+        "skipped": len(targets) - len(pending),
+        "attempted": len(records),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "elapsed_seconds": round(elapsed, 2),
+        "targets_per_minute": round(len(succeeded) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "mean_seconds_per_target": round(sum(r["seconds"] for r in records) / len(records), 2) if records else 0.0,
+        "emailed": sum(1 for r in succeeded if r.get("emailed")) if email_to else None,
+        "failures": [{"target": r["target"], "key": r["key"], "error": r["error"]} for r in failed],
+    }
+    summary_path = os.path.join(output_dir, f"batch_summary_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    print_summary(summary)
+    print(f"Summary written to '{summary_path}'.")
+    if not use_processes:
+        # Worker processes keep their own registries; their numbers are in each report's metrics JSON
+        metrics_path = write_prometheus_textfile()
+        if metrics_path:
+            print(f"Prometheus metrics written to '{metrics_path}'.")
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print("\n--- Batch Summary ---")
+    print(f"Targets: {summary['total_targets']} (skipped {summary['skipped']}, attempted {summary['attempted']})")
+    print(f"Succeeded: {summary['succeeded']}  Failed: {summary['failed']}")
+    print(f"Elapsed: {summary['elapsed_seconds']}s  Throughput: {summary['targets_per_minute']} targets/min  "
+          f"Mean per target: {summary['mean_seconds_per_target']}s")
+    if summary.get("emailed") is not None:
+        print(f"Reports queued for email: {summary['emailed']} of {summary['succeeded']} (see: python outbox.py status)")
+    for failure in summary["failures"]:
+        print(f"  FAILED {failure['target']} ({failure['key']}): {failure['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analysis crew for every target in a CSV or JSONL file.")
+    parser.add_argument("targets", help="Path to a .csv or .jsonl file with one set of crew inputs per row")
+    parser.add_argument("--app", default="app", choices=["app", "advance_agent"], help="Which crew definition to run")
+    parser.add_argument("--workers", type=int, default=4, help="Number of targets analysed concurrently")
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads")
+    parser.add_argument("--output-dir", default="batch_reports", help="Directory for reports, progress and summaries")
+    parser.add_argument("--email", metavar="ADDRESSES", help="Comma-separated recipients for every finished report")
+    args = parser.parse_args()
+    load_dotenv() # The app modules no longer load .env on import
+    summary = run_batch(args.targets, args.app, args.workers, args.processes, args.output_dir, args.email)
+    raise SystemExit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
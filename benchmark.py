@@ -0,0 +1,461 @@
+"""
+Offline end-to-end benchmark for the crews in app.py and advance_agent.py.
+
+Usage:
+    python benchmark.py --app app --runs 5
+    python benchmark.py --app advance_agent --runs 10 --concurrency 2 \
+        --llm-latency lognormal:1.5:0.4 --search-latency uniform:0.3:1.2 --baseline bench_before.json
+
+The real Crew definitions run end to end against two local stand-ins, so no
+API key or network access is needed:
+  - an OpenAI-compatible HTTP endpoint on 127.0.0.1 that answers chat completions
+    (ReAct answers, occasionally an Action for one of the agent's tools, and tool
+    calls for crewAI's structured-output helpers) and embeddings (for crew memory);
+  - a search backend installed with search_cache.set_search_backend().
+Both sleep according to a latency distribution and return responses of
+configurable size. Results (runs per minute, p50/p95 run and per-task latency,
+peak RSS) are printed and saved as JSON. Pass --baseline to compare with an
+earlier result file.
+
+Latency specs: "fixed:S", "uniform:LO:HI", "normal:MEAN:SD" or
+"lognormal:MEDIAN:SIGMA" (all in seconds).
+"""
+import argparse
+import base64
+import hashlib
+import importlib
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from cassette import minimal_instance
+from metrics import percentile, start_run_metrics
+
+_FILLER = ("market growth strategy revenue customers product channel partnership margin risk "
+           "digital brand competitor pricing investment expansion operations supply demand "
+           "leadership innovation portfolio segment opportunity efficiency").split()
+
+# --- Latency Models ---
+
+class LatencyModel:
+    """Samples delays in seconds from a distribution given as "kind:param[:param]"."""
+
+    def __init__(self, spec: str, seed: Optional[int] = None):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind.strip().lower()
+        try:
+            self.params = [float(p) for p in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec '{spec}': parameters must be numbers.")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec '{spec}'. Use fixed:S, uniform:LO:HI, normal:MEAN:SD or lognormal:MEDIAN:SIGMA.")
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                value = self.params[0]
+            elif self.kind == "uniform":
+                value = self._rng.uniform(*self.params)
+            elif self.kind == "normal":
+                value = self._rng.gauss(*self.params)
+            else:
+                median, sigma = self.params
+                value = median * self._rng.lognormvariate(0.0, sigma)
+        return max(0.0, value)
+
+    def sleep(self) -> float:
+        delay = self.sample()
+        time.sleep(delay)
+        return delay
+
+
+def _filler_text(seed_text: str, words: int) -> str:
+    """Deterministic pseudo-business prose of roughly `words` words."""
+    rng = random.Random(hashlib.sha1(seed_text.encode("utf-8")).hexdigest())
+    sentences, count = [], 0
+    while count < words:
+        length = min(rng.randint(8, 16), words - count)
+        sentence = " ".join(rng.choice(_FILLER) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        count += length
+    return " ".join(sentences)
+
+# --- Stand-in LLM Endpoint ---
+
+class StandInLLM:
+    """
+    A local OpenAI-compatible endpoint (/v1/chat/completions, /v1/embeddings) with
+    modelled latency. Agents call one of their tools with probability `tool_rate`
+    before giving their final answer, so tool, search and cache code paths run too.
+    """
+
+    def __init__(self, latency: LatencyModel, response_words: int = 250, tool_rate: float = 0.5,
+                 embedding_dim: int = 64, seed: Optional[int] = None):
+        self.latency = latency
+        self.response_words = response_words
+        self.tool_rate = tool_rate
+        self.embedding_dim = embedding_dim
+        self.requests = 0
+        self.tool_actions = 0
+        self.prompt_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StandInLLM":
+        llm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    if self.path.rstrip("/").endswith("/embeddings"):
+                        body = llm.embeddings(payload)
+                    else:
+                        body = llm.chat_completion(payload)
+                    status = 200
+                except Exception as e:
+                    body, status = {"error": {"message": f"{type(e).__name__}: {e}", "type": "stand_in_error"}}, 500
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass # Keep benchmark output readable
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stand-in-llm", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _choose(self, probability: float) -> bool:
+        with self._lock:
+            return self._rng.random() < probability
+
+    def _react_answer(self, messages: List[Dict[str, Any]]) -> str:
+        text = "\n".join(str(m.get("content") or "") for m in messages)
+        # Single-argument tools only; delegation tools need a coworker name
+        tools = re.findall(r"Tool Name: (.+?)\nTool Arguments: \{'(\w+)': \{[^{}]*\}\}\n", text)
+        task = re.search(r"Current Task: (.+)", text)
+        task_line = task.group(1) if task else text[-200:]
+        # An assistant turn in the history means a tool was already used for this task
+        answered = any(m.get("role") == "assistant" for m in messages)
+        if tools and not answered and self._choose(self.tool_rate):
+            with self._lock:
+                name, argument = self._rng.choice(tools)
+                self.tool_actions += 1
+            query = " ".join(task_line.split()[:10])
+            return (f"Thought: I should gather information before answering.\n"
+                    f"Action: {name.strip()}\nAction Input: {json.dumps({argument: query})}")
+        return "Thought: I now know the final answer\nFinal Answer: " + _filler_text(task_line, self.response_words)
+
+    def chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.requests += 1
+        self.latency.sleep()
+        messages = payload.get("messages") or []
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+        tools = payload.get("tools") or []
+        if tools:
+            function = tools[0].get("function", {})
+            parameters = function.get("parameters", {})
+            arguments = minimal_instance(parameters)
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{self.requests}", "type": "function",
+                "function": {"name": function.get("name", "tool"), "arguments": json.dumps(arguments)},
+            }]}
+            finish_reason, completion_tokens = "tool_calls", len(json.dumps(arguments)) // 4
+        else:
+            content = self._react_answer(messages)
+            message = {"role": "assistant", "content": content}
+            finish_reason, completion_tokens = "stop", len(content) // 4
+        return {
+            "id": f"chatcmpl-bench-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stand-in"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = payload.get("input")
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = []
+        for index, text in enumerate(inputs):
+            digest = hashlib.sha256(str(text).encode("utf-8")).digest()
+            vector = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(self.embedding_dim)]
+            if payload.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            else:
+                embedding = vector
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(str(text)) for text in inputs) // 4
+        return {"object": "list", "data": data, "model": payload.get("model", "stand-in"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+# --- Stand-in Search Backend ---
+
+class StandInSearch:
+    """Search backend returning `results` deterministic snippets per query after a modelled delay."""
+
+    def __init__(self, latency: LatencyModel, results: int = 5, words_per_result: int = 40):
+        self.latency = latency
+        self.results = results
+        self.words_per_result = words_per_result
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+        self.latency.sleep()
+        return "\n".join(
+            f"[{i + 1}] {query.title()} update: {_filler_text(f'{query}|{i}', self.words_per_result)}"
+            for i in range(self.results)
+        )
+
+# --- Benchmark Runner ---
+
+# Variables _configure_environment sets; run_benchmark puts them back when it finishes
+_BENCHMARK_ENV = ("MODEL", "OPENAI_API_KEY", "OPENAI_API_BASE", "OPENAI_BASE_URL", "CREWAI_STORAGE_DIR",
+                  "SEARCH_CACHE_PATH", "RESEARCH_MODE", "OTEL_SDK_DISABLED", "CREWAI_DISABLE_TELEMETRY")
+
+
+def _configure_environment(llm: StandInLLM, storage_dir: str, search_cache_path: str) -> Dict[str, Optional[str]]:
+    """
+    Points crewAI, litellm and the OpenAI client at the stand-in. Must run before the app module is imported.
+    Returns the previous values of the variables it sets, for _restore_environment.
+    """
+    saved = {name: os.environ.get(name) for name in _BENCHMARK_ENV}
+    os.environ["MODEL"] = "openai/gpt-4o-mini"
+    os.environ["OPENAI_API_KEY"] = "stand-in"
+    os.environ["OPENAI_API_BASE"] = llm.base_url
+    os.environ["OPENAI_BASE_URL"] = llm.base_url # Read by the OpenAI client used for memory embeddings
+    # An absolute path here replaces crewAI's per-user data directory, so memory starts empty
+    os.environ["CREWAI_STORAGE_DIR"] = storage_dir
+    os.environ["SEARCH_CACHE_PATH"] = search_cache_path
+    os.environ.setdefault("RESEARCH_MODE", "web") # Every research call reaches the stand-in search, whatever reports are indexed
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    return saved
+
+
+def _restore_environment(saved: Dict[str, Optional[str]]) -> None:
+    for name, value in saved.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+def _run_once(module, index: int, inputs: Dict[str, Any], max_concurrency: Optional[int], verbose: bool) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"run": index, "ok": False, "seconds": 0.0, "tasks": {}, "error": None}
+    run_metrics = start_run_metrics()
+    started = time.perf_counter()
+    try:
+        crew = module.build_crew()
+        if max_concurrency is not None and hasattr(crew, "max_concurrency"):
+            crew.max_concurrency = max_concurrency
+        if not verbose:
+            from crewai.utilities.events.event_listener import event_listener
+            crew.verbose = False
+            event_listener.verbose = event_listener.formatter.verbose = False # Set when the crew was built
+            for agent in crew.agents:
+                agent.verbose = False
+        crew.kickoff(inputs=inputs)
+        record["ok"] = True
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    record["seconds"] = time.perf_counter() - started
+    for labels, histogram in run_metrics.series("crew_task_duration_seconds").items():
+        record["tasks"][dict(labels)["task"]] = histogram.sum
+    return record
+
+
+def _vary(inputs: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Gives every run distinct inputs, so search results and memoized tools cannot be reused across runs."""
+    return {key: f"{value} #{index + 1}" if isinstance(value, str) else value for key, value in inputs.items()}
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def run_benchmark(app_module: str = "app", runs: int = 3, concurrency: int = 1, max_concurrency: Optional[int] = None,
+                  llm_latency: str = "lognormal:0.8:0.4", response_words: int = 250, tool_rate: float = 0.5,
+                  search_latency: str = "uniform:0.2:0.8", search_results: int = 5, search_words: int = 40,
+                  vary_inputs: bool = False, search_cache_path: Optional[str] = None, seed: int = 7,
+                  verbose: bool = False) -> Dict[str, Any]:
+    """Runs the crew `runs` times against the stand-ins and returns the benchmark result."""
+    import search_cache
+
+    # Bad latency specs fail here, before anything is started or created on disk
+    llm_latency_model = LatencyModel(llm_latency, seed)
+    search = StandInSearch(LatencyModel(search_latency, seed + 1), search_results, search_words)
+    workdir = tempfile.mkdtemp(prefix="crew_benchmark_")
+    llm = StandInLLM(llm_latency_model, response_words, tool_rate, seed=seed).start()
+    saved_env = _configure_environment(llm, os.path.join(workdir, "crewai"),
+                                       search_cache_path or os.path.join(workdir, "search_cache.sqlite3"))
+    # The benchmark gets its own search cache and backend; the process's own are put back afterwards
+    saved_cache = search_cache.set_search_cache(None)
+    saved_backend = search_cache.set_search_backend(search)
+    try:
+        # Imported only now: crewAI reads the telemetry and storage settings at import time
+        from scheduler import preserve_std_streams
+        module = importlib.import_module(app_module)
+
+        print(f"Benchmarking {app_module}: {runs} runs, {concurrency} at a time, LLM {llm_latency}, search {search_latency}.")
+        started = time.perf_counter()
+        with preserve_std_streams(), ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bench-run") as pool:
+            futures = [pool.submit(_run_once, module, i, _vary(module.input_data, i) if vary_inputs else dict(module.input_data),
+                                   max_concurrency, verbose) for i in range(runs)]
+            records = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        ok_runs = [r for r in records if r["ok"]]
+        run_seconds = [r["seconds"] for r in ok_runs]
+        per_task: Dict[str, List[float]] = {}
+        for record in ok_runs:
+            for task, seconds in record["tasks"].items():
+                per_task.setdefault(task, []).append(seconds)
+        all_tasks = [s for samples in per_task.values() for s in samples]
+        cache_stats = search_cache.get_search_cache().stats()
+
+        return {
+            "app": app_module,
+            "generated_at": datetime.now().isoformat(),
+            "config": {"runs": runs, "concurrency": concurrency, "max_concurrency": max_concurrency,
+                       "llm_latency": llm_latency, "response_words": response_words, "tool_rate": tool_rate,
+                       "search_latency": search_latency, "search_results": search_results,
+                       "search_words": search_words, "vary_inputs": vary_inputs, "seed": seed},
+            "runs_ok": len(ok_runs),
+            "runs_failed": len(records) - len(ok_runs),
+            "errors": [r["error"] for r in records if r["error"]],
+            "elapsed_seconds": _round(elapsed),
+            "runs_per_minute": _round(len(ok_runs) / elapsed * 60 if elapsed > 0 else 0.0),
+            "run_seconds": {"p50": _round(percentile(run_seconds, 50)), "p95": _round(percentile(run_seconds, 95))},
+            "task_seconds": {"p50": _round(percentile(all_tasks, 50)), "p95": _round(percentile(all_tasks, 95))},
+            "per_task_seconds": {task: {"p50": _round(percentile(samples, 50)), "p95": _round(percentile(samples, 95)),
+                                        "runs": len(samples)} for task, samples in sorted(per_task.items())},
+            "llm_requests": llm.requests,
+            "llm_prompt_tokens": llm.prompt_tokens,
+            "tool_actions": llm.tool_actions,
+            "search_backend_calls": search.calls,
+            "search_cache_hit_rate": cache_stats["hit_rate"],
+            # ru_maxrss is reported in kilobytes on Linux
+            "peak_rss_mb": _round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+    finally:
+        llm.stop()
+        search_cache.set_search_backend(saved_backend)
+        search_cache.set_search_cache(saved_cache)
+        _restore_environment(saved_env)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_result(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    def line(label: str, value: Any, base: Any = None, lower_is_better: bool = True) -> None:
+        text = f"{label:<28} {value}"
+        if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+            change = (value - base) / base * 100
+            better = (change < 0) == lower_is_better
+            text += f"   (baseline {base}, {change:+.1f}%{' better' if better and change else ''})"
+        print(text)
+
+    base = baseline or {}
+    print("\n--- Benchmark Result ---")
+    line("Runs ok / failed", f"{result['runs_ok']} / {result['runs_failed']}")
+    line("Runs per minute", result["runs_per_minute"], base.get("runs_per_minute"), lower_is_better=False)
+    line("Run p50 (s)", result["run_seconds"]["p50"], base.get("run_seconds", {}).get("p50"))
+    line("Run p95 (s)", result["run_seconds"]["p95"], base.get("run_seconds", {}).get("p95"))
+    line("Task p50 (s)", result["task_seconds"]["p50"], base.get("task_seconds", {}).get("p50"))
+    line("Task p95 (s)", result["task_seconds"]["p95"], base.get("task_seconds", {}).get("p95"))
+    for task, stats in result["per_task_seconds"].items():
+        base_task = base.get("per_task_seconds", {}).get(task, {})
+        line(f"  {task} p50/p95 (s)", f"{stats['p50']} / {stats['p95']}")
+        if base_task:
+            line("    vs baseline p95", stats["p95"], base_task.get("p95"))
+    line("LLM requests", result["llm_requests"], base.get("llm_requests"))
+    if "llm_prompt_tokens" in result:
+        line("LLM prompt tokens", result["llm_prompt_tokens"], base.get("llm_prompt_tokens"))
+    line("Search backend calls", result["search_backend_calls"], base.get("search_backend_calls"))
+    line("Search cache hit rate", result["search_cache_hit_rate"], base.get("search_cache_hit_rate"), lower_is_better=False)
+    line("Peak RSS (MB)", result["peak_rss_mb"], base.get("peak_rss_mb"))
+    for error in result["errors"][:5]:
+        print(f"Error: {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark a crew offline against a stand-in LLM and search backend.")
+    parser.add_argument("--app", default="app", choices=["app", "advance_agent"], help="Module whose `build_crew()` and `input_data` are benchmarked.")
+    parser.add_argument("--runs", type=int, default=3, help="Number of crew kickoffs.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Kickoffs running at the same time.")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Override the crew's task-level max_concurrency.")
+    parser.add_argument("--llm-latency", default="lognormal:0.8:0.4", help="Latency of each LLM request.")
+    parser.add_argument("--llm-words", type=int, default=250, help="Words in each final answer.")
+    parser.add_argument("--tool-rate", type=float, default=0.5, help="Probability that an agent calls a tool before answering.")
+    parser.add_argument("--search-latency", default="uniform:0.2:0.8", help="Latency of each search backend call.")
+    parser.add_argument("--search-results", type=int, default=5, help="Results returned per search.")
+    parser.add_argument("--search-words", type=int, default=40, help="Words per search result.")
+    parser.add_argument("--vary-inputs", action="store_true", help="Give each run distinct inputs (no cross-run cache reuse).")
+    parser.add_argument("--search-cache", default=None, help="Search cache file to use (default: a fresh temporary one).")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for latency sampling and tool choices.")
+    parser.add_argument("--output", default=None, help="Result file (default: benchmark_<app>_<timestamp>.json).")
+    parser.add_argument("--baseline", default=None, help="Earlier result file to compare against.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the crew's verbose agent output.")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.app, args.runs, args.concurrency, args.max_concurrency, args.llm_latency,
+                           args.llm_words, args.tool_rate, args.search_latency, args.search_results,
+                           args.search_words, args.vary_inputs, args.search_cache, args.seed, args.verbose)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_result(result, baseline)
+
+    output = args.output or f"benchmark_{args.app}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResult written to '{output}'.")
+
+
+if __name__ == "__main__":
+    main()
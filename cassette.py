@@ -0,0 +1,350 @@
+"""
+Record/replay cassettes for LLM, embedding and tool calls.
+
+Record mode wraps a real `crew.kickoff` and captures every litellm completion (agent
+calls and crewAI's structured-output calls), every memory embedding request and
+every EnhancedBaseTool._run input/output. Replay mode serves them back with zero
+network access. That makes it cheap to profile formatting, tool logic and crew
+orchestration, and to run repeatable performance regression checks.
+
+Usage:
+    CREW_CASSETTE=cassettes/hul.json CREW_CASSETTE_MODE=record python advance_agent.py
+    CREW_CASSETTE=cassettes/hul.json CREW_CASSETTE_MODE=replay python advance_agent.py
+
+    # Build a replayable cassette from an analysis that was already run
+    python cassette.py seed --app advance_agent --source reports/Hindustan_Unilever_Limited_2025-03-29_17-33-11.txt \\
+        --out cassettes/hul.json
+
+Replay looks a request up by its exact content first. Prompts can drift between runs,
+e.g. with crew memory enabled, so a miss falls back to the next unused response
+recorded for the same agent role (or the same structured-output function).
+Structured-output calls with nothing recorded get a minimal schema-valid answer,
+and unrecorded embeddings get deterministic hash vectors. Any other miss raises CassetteMiss.
+Set OTEL_SDK_DISABLED=true as well to stop crewAI's telemetry from using the network.
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from tool_memo import canonical_input
+
+CASSETTE_VERSION = 1
+MODES = ("record", "replay")
+_ROLE_PATTERN = re.compile(r"^You are (.+?)\. ", re.DOTALL)
+
+
+class CassetteMiss(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _message_text(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def minimal_instance(schema: Dict[str, Any], definitions: Optional[Dict[str, Any]] = None) -> Any:
+    """Builds the smallest value that satisfies a JSON schema (empty lists, placeholder scalars)."""
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return minimal_instance(definitions.get(schema["$ref"].split("/")[-1], {}), definitions)
+    for key in ("anyOf", "allOf", "oneOf"):
+        if key in schema:
+            return minimal_instance(schema[key][0], definitions)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {name: minimal_instance(prop, definitions) for name, prop in schema.get("properties", {}).items()}
+    return {"array": [], "string": "n/a", "integer": 0, "number": 0.0, "boolean": False}.get(kind)
+
+# --- Cassette ---
+
+class Cassette:
+    """Recorded interactions grouped by kind ("llm", "embedding", "tool"), with thread-safe lookup."""
+
+    def __init__(self, path: str, mode: str = "replay", live_tools: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}'. Use one of: {', '.join(MODES)}.")
+        self.path = path
+        self.mode = mode
+        self.live_tools = live_tools # Replay: run tool logic for real instead of serving recorded outputs
+        self.interactions: Dict[str, List[Dict[str, Any]]] = {"llm": [], "embedding": [], "tool": []}
+        self.counters = {"recorded": 0, "exact": 0, "fallback": 0, "synthesized": 0, "misses": 0}
+        self._used: set = set()
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Cassette '{self.path}' not found. Record it first with CREW_CASSETTE_MODE=record.")
+        for kind in self.interactions:
+            self.interactions[kind] = list(data.get("interactions", {}).get(kind, []))
+
+    def save(self) -> str:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "recorded_at": datetime.now().isoformat(), "interactions": self.interactions}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, default=str)
+        os.replace(tmp_path, self.path)
+        return self.path
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters, **{f"{kind}_entries": len(entries) for kind, entries in self.interactions.items()})
+
+    def _record(self, kind: str, key: str, stream: str, request: Any, response: Any) -> None:
+        with self._lock:
+            self.interactions[kind].append({"key": key, "stream": stream, "request": request, "response": response})
+            self.counters["recorded"] += 1
+
+    def _find(self, kind: str, key: str, stream: str) -> Optional[Dict[str, Any]]:
+        """Next unused entry with this exact key, else the next unused one from the same stream."""
+        with self._lock:
+            entries = self.interactions[kind]
+            for match, counter in ((lambda e: e["key"] == key, "exact"), (lambda e: e["stream"] == stream, "fallback")):
+                for position, entry in enumerate(entries):
+                    if (kind, position) not in self._used and match(entry):
+                        self._used.add((kind, position))
+                        self.counters[counter] += 1
+                        return entry
+            return None
+
+    def _miss(self, message: str) -> CassetteMiss:
+        with self._lock:
+            self.counters["misses"] += 1
+        return CassetteMiss(f"{message} (cassette '{self.path}')")
+
+    # --- LLM completions ---
+
+    @staticmethod
+    def llm_stream(params: Dict[str, Any]) -> str:
+        """Groups requests that answer the same thing: agent role, structured-output function, or first prompt."""
+        tools = params.get("tools") or []
+        if tools:
+            return "function:" + str(tools[0].get("function", {}).get("name", "unknown"))
+        messages = params.get("messages") or []
+        for message in messages:
+            match = _ROLE_PATTERN.match(_message_text(message))
+            if match:
+                return "agent:" + match.group(1).strip()
+        return "prompt:" + _digest(_message_text(messages[0]) if messages else "")[:16]
+
+    def completion(self, params: Dict[str, Any], call: Callable[[], Any]) -> Any:
+        import litellm
+
+        key = _digest({name: params.get(name) for name in ("model", "messages", "tools", "tool_choice", "response_format")})
+        stream = self.llm_stream(params)
+        if self.mode == "record":
+            response = call()
+            if params.get("stream"):
+                print("Warning: Streaming LLM responses are not recorded in cassettes.")
+                return response
+            self._record("llm", key, stream, {"model": params.get("model"), "messages": params.get("messages")},
+                         response.model_dump(mode="json", warnings=False))
+            return response
+
+        if params.get("stream"):
+            raise self._miss("Streaming LLM calls cannot be replayed")
+        entry = self._find("llm", key, stream)
+        if entry is not None:
+            return litellm.ModelResponse(**entry["response"])
+        tools = params.get("tools") or []
+        if tools:
+            # Structured-output helpers (memory evaluation, entity extraction) get a minimal valid answer
+            function = tools[0].get("function", {})
+            with self._lock:
+                self.counters["synthesized"] += 1
+            return litellm.ModelResponse(model=params.get("model"), choices=[{
+                "index": 0, "finish_reason": "tool_calls",
+                "message": {"role": "assistant", "content": None, "tool_calls": [{
+                    "id": "call_cassette", "type": "function",
+                    "function": {"name": function.get("name"), "arguments": json.dumps(minimal_instance(function.get("parameters", {})))},
+                }]},
+            }])
+        raise self._miss(f"No recorded LLM response for {stream}")
+
+    # --- Embeddings ---
+
+    def embed(self, texts: List[str], call: Callable[[], Any]) -> List[List[float]]:
+        key = _digest(texts)
+        if self.mode == "record":
+            vectors = [[float(x) for x in vector] for vector in call()]
+            self._record("embedding", key, "embedding", texts, vectors)
+            return vectors
+        with self._lock:
+            for entry in self.interactions["embedding"]:
+                if entry["key"] == key:
+                    self.counters["exact"] += 1
+                    return entry["response"]
+            dim = next((len(e["response"][0]) for e in self.interactions["embedding"] if e["response"]), 1536)
+            self.counters["synthesized"] += 1
+        vectors = []
+        for text in texts:
+            seed = hashlib.sha256(text.encode("utf-8")).digest()
+            vectors.append([(seed[i % len(seed)] - 127.5) / 127.5 for i in range(dim)])
+        return vectors
+
+    # --- Tools ---
+
+    def tool_call(self, tool_name: str, input_string: str, run: Callable[[str], str]) -> str:
+        key = _digest([tool_name, canonical_input(input_string)])
+        if self.mode == "record":
+            result = run(input_string)
+            self._record("tool", key, tool_name, input_string, result)
+            return result
+        if self.live_tools:
+            return run(input_string)
+        entry = self._find("tool", key, tool_name)
+        if entry is not None:
+            return entry["response"]
+        raise self._miss(f"No recorded output for tool '{tool_name}'")
+
+# --- Activation ---
+
+_active: Optional[Cassette] = None
+
+
+def get_active_cassette() -> Optional[Cassette]:
+    return _active
+
+
+def through_cassette(tool_name: str, input_string: str, run: Callable[[str], str]) -> str:
+    """Runs a tool call through the active cassette, or directly when none is active."""
+    cassette = _active
+    if cassette is None:
+        return run(input_string)
+    return cassette.tool_call(tool_name, input_string, run)
+
+
+@contextlib.contextmanager
+def use_cassette(path: str, mode: str = "replay", live_tools: bool = False) -> Iterator[Cassette]:
+    """Installs the cassette for the duration of the block; record mode saves it on exit."""
+    global _active
+    import litellm
+
+    if _active is not None:
+        raise RuntimeError("A cassette is already active.")
+    cassette = Cassette(path, mode, live_tools)
+    original_completion = litellm.completion
+
+    def completion(*args, **kwargs):
+        return cassette.completion(kwargs, lambda: original_completion(*args, **kwargs))
+
+    embedding_cls, original_embed = None, None
+    try:
+        from chromadb.utils.embedding_functions.openai_embedding_function import OpenAIEmbeddingFunction
+        embedding_cls, original_embed = OpenAIEmbeddingFunction, OpenAIEmbeddingFunction.__call__
+    except ImportError:
+        pass # Crew memory is not in use without chromadb
+
+    def embed(self, input):
+        return cassette.embed(list(input), lambda: original_embed(self, input))
+
+    litellm.completion = completion
+    if embedding_cls is not None:
+        embedding_cls.__call__ = embed
+    _active = cassette
+    print(f"Cassette '{path}' active ({mode}).")
+    try:
+        yield cassette
+    finally:
+        _active = None
+        litellm.completion = original_completion
+        if embedding_cls is not None:
+            embedding_cls.__call__ = original_embed
+        if mode == "record":
+            cassette.save()
+        print(f"Cassette '{path}' {'saved' if mode == 'record' else 'closed'}: {cassette.stats()}")
+
+
+def cassette_from_env():
+    """use_cassette() for CREW_CASSETTE / CREW_CASSETTE_MODE / CREW_CASSETTE_LIVE_TOOLS, or a no-op when unset."""
+    path = os.getenv("CREW_CASSETTE")
+    if not path:
+        return contextlib.nullcontext()
+    live_tools = os.getenv("CREW_CASSETTE_LIVE_TOOLS", "").strip().lower() in ("1", "true", "yes", "on")
+    return use_cassette(path, os.getenv("CREW_CASSETTE_MODE", "replay"), live_tools)
+
+# --- Seeding From Earlier Runs ---
+
+def load_task_outputs(path: str) -> List[str]:
+    """
+    Reads the per-task outputs of an earlier run from crew_results.json or from a
+    text report written by advance_agent.py (### Task / **Output:** blocks) or app.py
+    (Task N: / Key Findings: blocks).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(".json"):
+        return [str(item.get("output", "")) for item in json.loads(text).get("results", [])]
+
+    outputs = []
+    if "**Output:**" in text:
+        for section in re.split(r"^### Task \d+:", text, flags=re.MULTILINE)[1:]:
+            body = section.split("**Output:**", 1)[-1]
+            body = re.split(r"^={10,}|^## Execution Metadata", body, flags=re.MULTILINE)[0]
+            outputs.append("\n".join(line[2:] if line.startswith("  ") else line for line in body.strip("\n").split("\n")).strip())
+        return outputs
+    for section in re.split(r"^Task \d+: .*$", text, flags=re.MULTILINE)[1:]:
+        body = section.split("Key Findings:", 1)[-1]
+        body = re.split(r"^--- Execution Metadata ---", body, flags=re.MULTILINE)[0]
+        lines = [line.strip() for line in body.strip().split("\n") if line.strip()]
+        outputs.append("\n".join(line[2:] if line.startswith("- ") else line for line in lines))
+    return outputs
+
+
+def seed_cassette(crew, outputs: List[str], path: str, model: str = "seeded") -> str:
+    """
+    Writes a replay cassette whose agents answer each task with the given outputs, in task
+    order. Tool calls are not part of a seeded cassette, so agents answer directly.
+    """
+    if len(outputs) != len(crew.tasks):
+        raise ValueError(f"Got {len(outputs)} task outputs for a crew with {len(crew.tasks)} tasks.")
+    cassette = Cassette(path, mode="record")
+    for task, output in zip(crew.tasks, outputs):
+        role = task.agent.role if task.agent else "unknown"
+        response = {
+            "id": "seeded", "object": "chat.completion", "created": 0, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                "role": "assistant", "content": f"Thought: I now know the final answer\nFinal Answer: {output}"}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(output) // 4, "total_tokens": len(output) // 4},
+        }
+        cassette._record("llm", f"seeded:{_digest(task.description)}", f"agent:{role}", {"task": task.description[:200]}, response)
+    return cassette.save()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build cassettes from earlier runs.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    seed = subcommands.add_parser("seed", help="Create a replay cassette from crew_results.json or a text report.")
+    seed.add_argument("--app", default="advance_agent", choices=["app", "advance_agent"], help="Module whose crew the outputs belong to.")
+    seed.add_argument("--source", required=True, help="crew_results.json or a report .txt file.")
+    seed.add_argument("--out", required=True, help="Cassette file to write.")
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.app)
+    outputs = load_task_outputs(args.source)
+    path = seed_cassette(module.build_crew(), outputs, args.out)
+    print(f"Seeded cassette '{path}' with {len(outputs)} task outputs from '{args.source}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Task-level checkpoints for crew runs.
+
+Every finished task's output is written atomically to
+<CHECKPOINT_DIR>/<run-id>/task_<n>.json as soon as the task completes, next to a
+run.json holding the run's inputs. A run that dies part-way (LLM error, SMTP
+failure, Ctrl-C) can be resumed with its run ID: completed tasks are skipped and
+their saved outputs are fed back as context to the remaining ones.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING: # Imported where needed, so run_store and the CLI can use this module without loading crewAI
+    from crewai import Task
+    from crewai.tasks.task_output import TaskOutput
+
+DEFAULT_CHECKPOINT_DIR = ".checkpoints"
+
+
+def new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def task_fingerprint(task: "Task") -> str:
+    """Identifies a task by its interpolated description and expected output."""
+    return hashlib.sha256(f"{task.description}\n{task.expected_output}".encode("utf-8")).hexdigest()[:16]
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CheckpointRun:
+    """The checkpoint directory of one run."""
+
+    def __init__(self, run_id: str, root: Optional[str] = None):
+        self.run_id = run_id
+        self.root = root or os.getenv("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+        self.path = os.path.join(self.root, run_id)
+
+    @classmethod
+    def start(cls, inputs: Dict[str, Any], app: str = "", root: Optional[str] = None) -> "CheckpointRun":
+        """Creates a new run directory recording the run's inputs."""
+        run = cls(new_run_id(), root)
+        os.makedirs(run.path, exist_ok=True)
+        write_json_atomic(os.path.join(run.path, "run.json"), {
+            "run_id": run.run_id, "app": app, "inputs": inputs,
+            "started_at": datetime.now().isoformat(), "status": "running",
+        })
+        return run
+
+    @classmethod
+    def resume(cls, run_id: str, root: Optional[str] = None) -> "CheckpointRun":
+        run = cls(run_id, root)
+        if not os.path.exists(os.path.join(run.path, "run.json")):
+            raise FileNotFoundError(f"No checkpoint found for run '{run_id}' in '{run.root}'.")
+        return run
+
+    def metadata(self) -> Dict[str, Any]:
+        with open(os.path.join(self.path, "run.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @property
+    def inputs(self) -> Dict[str, Any]:
+        return self.metadata().get("inputs", {})
+
+    def mark(self, status: str, **details: Any) -> None:
+        metadata = self.metadata()
+        metadata.update(details, status=status, updated_at=datetime.now().isoformat())
+        write_json_atomic(os.path.join(self.path, "run.json"), metadata)
+
+    def save_task(self, index: int, task: "Task", output: "TaskOutput") -> None:
+        """Atomically stores a finished task's output."""
+        write_json_atomic(os.path.join(self.path, f"task_{index}.json"), {
+            "index": index,
+            "fingerprint": task_fingerprint(task),
+            "saved_at": datetime.now().isoformat(),
+            # The pydantic model class cannot be rebuilt from JSON; json_dict carries the same data
+            "output": output.model_dump(mode="json", exclude={"pydantic"}),
+        })
+
+    def load_tasks(self, tasks: List["Task"]) -> Dict[int, "TaskOutput"]:
+        """Saved outputs by task index, skipping any whose task no longer matches its checkpoint."""
+        from crewai.tasks.task_output import TaskOutput
+        restored: Dict[int, "TaskOutput"] = {}
+        for index, task in enumerate(tasks):
+            path = os.path.join(self.path, f"task_{index}.json")
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("fingerprint") != task_fingerprint(task):
+                    print(f"Warning: Checkpoint for task {index + 1} does not match the current task definition; it will run again.")
+                    continue
+                restored[index] = TaskOutput(**data["output"])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Could not read checkpoint '{path}': {e}. Task {index + 1} will run again.")
+        return restored
@@ -0,0 +1,78 @@
+"""
+Command-line entry point for the project.
+
+Every script keeps its own command line; this module only dispatches to it, importing
+the command's module when that command runs. Commands that never build a crew (run
+history, report index, outbox, mailer) therefore never load crewAI, langchain or
+the search tools, and start in a fraction of a second. Crews are built by each
+app's `build_crew()` only when a run starts.
+
+Usage (installed with `pip install -e .`, or as `python cli.py ...`):
+    crew-analysis run [--resume RUN_ID] [--incremental]    # app.py
+    crew-analysis advance                                  # advance_agent.py
+    crew-analysis email-agent                              # email_agent.py
+    crew-analysis batch targets.csv --workers 4
+    crew-analysis runs list --company "HDFC Bank"
+    crew-analysis outbox status
+    crew-analysis --timing runs list                       # print startup time to stderr
+
+Configuration (environment variables, all optional):
+    CLI_TIMING   Set to "true" to always print startup time (same as --timing)
+"""
+import importlib
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+_LOADED_AT = time.perf_counter()
+
+# Command name -> (module, help). Modules are imported on demand only.
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "run": ("app", "Run the strategic analysis crew."),
+    "advance": ("advance_agent", "Run the advanced strategic analysis crew."),
+    "email-agent": ("email_agent", "Run the lead outreach crew."),
+    "batch": ("batch", "Run a crew for every target in a CSV or JSONL file."),
+    "benchmark": ("benchmark", "Benchmark a crew offline against stand-in services."),
+    "runs": ("run_store", "Query and import the run history."),
+    "index": ("report_index", "Build or search the index of past reports."),
+    "outbox": ("outbox", "Drain or inspect the email outbox."),
+    "mail": ("mailer", "Run the stand-in SMTP server or the mailer self-test."),
+    "cassette": ("cassette", "Build a replay cassette from an earlier run."),
+}
+
+
+def usage() -> str:
+    lines = ["usage: crew-analysis [--timing] <command> [args...]", "", "commands:"]
+    lines.extend(f"  {name:<12} {help_text}" for name, (_, help_text) in COMMANDS.items())
+    lines.append("\nRun `crew-analysis <command> --help` for a command's options.")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = list(sys.argv[1:] if argv is None else argv)
+    timing = os.getenv("CLI_TIMING", "false").lower() == "true"
+    if args and args[0] == "--timing":
+        timing = True
+        args.pop(0)
+    if not args or args[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, rest = args[0], args[1:]
+    if command not in COMMANDS:
+        raise SystemExit(f"Unknown command '{command}'.\n\n{usage()}")
+
+    module_name = COMMANDS[command][0]
+    imported_at = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if timing:
+        now = time.perf_counter()
+        print(f"Startup: {(now - _LOADED_AT) * 1000:.0f} ms ({module_name} import: {(now - imported_at) * 1000:.0f} ms)",
+              file=sys.stderr)
+    # Each script parses sys.argv itself, so hand it the command's arguments
+    sys.argv = [f"crew-analysis {command}", *rest]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
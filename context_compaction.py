@@ -0,0 +1,200 @@
+"""
+Extractive compaction of task context.
+
+Late tasks receive the raw outputs of every task in their `context`. In app.py,
+strategy development reads four upstream reports and reflection reads four more,
+so prompts (and the time to the first token) grow with every stage. This stage
+sits between a task and its context. When the upstream outputs add up to more
+than the task's token budget, each output is cut down to its key points under
+a share of that budget proportional to its length.
+
+Selection is extractive and deterministic. No LLM is involved, and the same
+inputs always give the same context. Outputs are split into heading, list-item
+and sentence units. Each unit is scored on:
+- how central its terms are to the output
+- how much it overlaps the consuming task's description
+- whether it carries figures
+- how early it comes in its section
+
+The best units that fit the share are kept. Near-duplicates of units already
+kept are skipped, and the kept units stay in their original order under their
+headings. Compacted outputs are cached per upstream output hash, budget share
+and focus, so an output read by several tasks is only compacted once.
+
+Configuration (environment variables, all optional):
+    CONTEXT_COMPACTION     Set to "false" to pass context through unchanged (default: true)
+    CONTEXT_TOKEN_BUDGET   Estimated context tokens per task (default: 2000)
+    CONTEXT_TASK_BUDGETS   Per-task overrides by task name, e.g. "task_5=3000,task_7=1500"
+"""
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from knowledge_index import tokenize
+from metrics import record_context_compaction
+from token_budget import estimate_tokens
+from tool_memo import ToolMemo
+
+DEFAULT_TOKEN_BUDGET = 2000
+MIN_SHARE_TOKENS = 120 # Below this an output cannot keep anything meaningful, so small budgets are raised to it
+DIVIDER = "\n\n----------\n\n" # crewAI's separator between upstream outputs
+OMISSION = "[...]"
+
+_HEADING = re.compile(r"^(?:#{1,6}\s+.+|\*\*[^*]{2,120}\*\*:?|[A-Z][^.!?]{2,80}:)$")
+_LIST_ITEM = re.compile(r"^(?:[-*•]\s+|\d{1,2}[.)]\s+)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(*])")
+_FIGURE = re.compile(r"\d")
+
+
+class Unit(NamedTuple):
+    position: int
+    text: str
+    heading: Optional[int] # Position of the heading this unit sits under
+    is_heading: bool
+    rank_in_section: int
+
+
+def split_units(text: str) -> List[Unit]:
+    """Splits an output into headings, list items and sentences, remembering each one's heading."""
+    units: List[Unit] = []
+    heading: Optional[int] = None
+    rank = 0
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line or set(line) <= set("-=*_#"):
+            continue
+        if _HEADING.match(line) and len(line) <= 120:
+            heading = len(units)
+            units.append(Unit(heading, line, None, True, 0))
+            rank = 0
+            continue
+        pieces = [line] if _LIST_ITEM.match(line) else [piece.strip() for piece in _SENTENCE_END.split(line) if piece.strip()]
+        for piece in pieces:
+            units.append(Unit(len(units), piece, heading, False, rank))
+            rank += 1
+    return units
+
+
+def _score_units(units: List[Unit], focus_terms: set) -> Dict[int, float]:
+    """Scores every body unit; higher means more worth keeping."""
+    unit_terms = {unit.position: set(tokenize(unit.text)) for unit in units}
+    frequency = Counter(term for unit in units if not unit.is_heading for term in unit_terms[unit.position])
+    scores: Dict[int, float] = {}
+    for unit in units:
+        if unit.is_heading:
+            continue
+        terms = unit_terms[unit.position]
+        if not terms:
+            scores[unit.position] = 0.0
+            continue
+        # Terms repeated across the output mark what it is about; length is damped so long sentences do not always win
+        centrality = sum(math.log1p(frequency[term]) for term in terms) / math.sqrt(len(terms))
+        relevance = len(terms & focus_terms) / math.sqrt(len(focus_terms)) if focus_terms else 0.0
+        figures = 0.5 if _FIGURE.search(unit.text) else 0.0
+        lead = 1.0 / (1.0 + unit.rank_in_section)
+        scores[unit.position] = centrality + 2.0 * relevance + figures + lead
+    return scores
+
+
+def compact_text(text: str, budget_tokens: int, focus: str = "") -> str:
+    """The key points of `text` within about `budget_tokens`, or `text` itself when it already fits."""
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    units = split_units(text)
+    scores = _score_units(units, set(tokenize(focus)))
+    ranked = sorted(scores, key=lambda position: (-scores[position], position))
+
+    selected: Dict[int, Unit] = {}
+    kept_terms: List[set] = []
+    used = 0
+    for position in ranked:
+        unit = units[position]
+        terms = set(tokenize(unit.text))
+        # Skip near-duplicates of something already kept (restated findings are common across sections)
+        if terms and any(len(terms & other) / len(terms | other) > 0.8 for other in kept_terms):
+            continue
+        cost = estimate_tokens(unit.text) + 1
+        if unit.heading is not None and unit.heading not in selected:
+            cost += estimate_tokens(units[unit.heading].text) + 1
+        if used + cost > budget_tokens:
+            continue
+        selected[position] = unit
+        if unit.heading is not None:
+            selected[unit.heading] = units[unit.heading]
+        kept_terms.append(terms)
+        used += cost
+
+    lines: List[str] = []
+    previous = -1
+    for position in sorted(selected):
+        if position != previous + 1 and lines and lines[-1] != OMISSION:
+            lines.append(OMISSION)
+        lines.append(selected[position].text)
+        previous = position
+    if previous != len(units) - 1 and lines:
+        lines.append(OMISSION)
+    return "\n".join(lines)
+
+
+# --- Compaction Stage ---
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+class ContextCompactor:
+    """Compacts a task's upstream outputs under a per-task token budget, caching each compacted output."""
+
+    def __init__(self, budget_tokens: int = DEFAULT_TOKEN_BUDGET, task_budgets: Optional[Dict[str, int]] = None,
+                 cache_size: int = 512):
+        self.budget_tokens = budget_tokens
+        self.task_budgets = dict(task_budgets or {})
+        self.cache = ToolMemo("context_compaction", cache_size)
+
+    @classmethod
+    def from_env(cls) -> Optional["ContextCompactor"]:
+        """The compactor configured by CONTEXT_* variables, or None when compaction is turned off."""
+        if os.getenv("CONTEXT_COMPACTION", "true").lower() == "false":
+            return None
+        return cls(int(os.getenv("CONTEXT_TOKEN_BUDGET", str(DEFAULT_TOKEN_BUDGET))),
+                   _parse_budgets(os.getenv("CONTEXT_TASK_BUDGETS", "")))
+
+    def budget_for(self, task_name: str) -> int:
+        return self.task_budgets.get(task_name, self.budget_tokens)
+
+    def signature(self, task_name: str) -> str:
+        """Identifies the settings that shape a task's context, for the task cache key."""
+        return f"extractive-v1:{self.budget_for(task_name)}"
+
+    def compact_output(self, raw: str, budget_tokens: int, focus: str = "") -> str:
+        digest = hashlib.sha256((raw or "").encode("utf-8")).hexdigest()
+        key = f"{digest}|{budget_tokens}|{hashlib.sha256(focus.encode('utf-8')).hexdigest()[:16]}"
+        hit, compacted = self.cache.get(key)
+        if not hit:
+            compacted = compact_text(raw, budget_tokens, focus)
+            self.cache.put(key, compacted)
+        return compacted
+
+    def compact(self, task_name: str, focus: str, raw_outputs: List[str]) -> str:
+        """The context string for a task: upstream outputs joined as crewAI does, compacted when over budget."""
+        full_tokens = sum(estimate_tokens(raw) for raw in raw_outputs)
+        budget = self.budget_for(task_name)
+        if full_tokens <= budget:
+            return DIVIDER.join(raw_outputs)
+        # Each output gets a share of the budget proportional to its size
+        parts = [self.compact_output(raw, max(MIN_SHARE_TOKENS, budget * estimate_tokens(raw) // full_tokens), focus)
+                 for raw in raw_outputs]
+        context = DIVIDER.join(parts)
+        record_context_compaction(task_name, full_tokens, estimate_tokens(context))
+        return context
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
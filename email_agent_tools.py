@@ -0,0 +1,27 @@
+"""
+Tools for the sales crew in email_agent.py. They subclass crewAI's BaseTool, so
+they are only imported when `build_crew()` runs.
+"""
+from crewai.tools import BaseTool  # Correct import from crewai.tools
+from search_cache import cached_search
+from sentiment import get_sentiment_engine
+from token_budget import cap_tool_output
+
+# Custom DuckDuckGo Search Tool using crewai.tools.BaseTool
+class DuckDuckGoSearchTool(BaseTool):
+    name: str = "DuckDuckGo Search Tool"
+    description: str = "A tool to search the web using DuckDuckGo without an API key."
+
+    def _run(self, query: str) -> str:
+        """Search the web synchronously using DuckDuckGo, served from the local cache when possible."""
+        return cap_tool_output(self.name, cached_search(query), query)
+
+# Custom Sentiment Analysis Tool using crewai.tools.BaseTool
+class SentimentAnalysisTool(BaseTool):
+    name: str = "Sentiment Analysis Tool"
+    description: str = "Analyze the sentiment of the text."
+
+    def _run(self, text: str) -> str:
+        """Score the text with the lexicon sentiment engine."""
+        result = get_sentiment_engine().analyze(text)
+        return f"{result.label.lower()} (compound: {result.compound:+.2f}; key terms: {', '.join(result.top_terms) or 'none'})"
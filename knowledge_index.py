@@ -0,0 +1,108 @@
+"""
+Inverted-index retrieval over the knowledge base.
+
+The index is built once from the {category: {subcategory: content}} mapping and
+ranks entries with BM25. Category and subcategory names count as a heavily
+weighted field, so a query naming a framework ("SWOT analysis") ranks that entry
+first, while content words still find entries whose names do not match.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple
+
+from text_terms import FUNCTION_WORDS
+
+# Requests to the knowledge tool are phrased as questions, so conversational words are filler too
+_STOPWORDS = FUNCTION_WORDS | {
+    "as", "be", "can", "details", "give", "how", "i", "info", "information", "it", "me", "or", "please",
+    "provide", "show", "tell", "that", "this", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases, splits on non-alphanumerics (including underscores) and drops stopwords."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1] # Light plural folding: "insights" -> "insight"
+        tokens.append(word)
+    return tokens
+
+
+class KnowledgeMatch(NamedTuple):
+    score: float
+    category: str
+    subcategory: str
+    content: str
+
+    @property
+    def title(self) -> str:
+        return self.subcategory.replace("_", " ").title()
+
+    @property
+    def category_title(self) -> str:
+        return self.category.replace("_", " ").title()
+
+
+class KnowledgeIndex:
+    """BM25 inverted index over knowledge base entries, with names weighted above content."""
+
+    def __init__(self, knowledge: Dict[str, Dict[str, str]], name_weight: float = 3.0,
+                 k1: float = 1.2, b: float = 0.75):
+        self.entries: List[KnowledgeMatch] = []
+        self.categories = list(knowledge.keys())
+        self._phrases: List[str] = []
+        term_frequencies: List[Counter] = []
+        for category, subcategories in knowledge.items():
+            for subcategory, content in subcategories.items():
+                self.entries.append(KnowledgeMatch(0.0, category, subcategory, str(content)))
+                self._phrases.append(" ".join(tokenize(subcategory)))
+                frequencies: Counter = Counter(tokenize(str(content)))
+                for token in tokenize(f"{category} {subcategory}"):
+                    frequencies[token] += name_weight
+                term_frequencies.append(frequencies)
+
+        doc_count = len(self.entries)
+        lengths = [sum(frequencies.values()) for frequencies in term_frequencies]
+        avg_length = (sum(lengths) / doc_count) if doc_count else 0.0
+        document_frequency: Counter = Counter()
+        for frequencies in term_frequencies:
+            document_frequency.update(frequencies.keys())
+
+        # Every posting stores its full BM25 contribution, so a query is just a sum over postings.
+        self._postings: Dict[str, List[tuple]] = {}
+        for doc_id, frequencies in enumerate(term_frequencies):
+            norm = k1 * (1 - b + b * (lengths[doc_id] / avg_length if avg_length else 0.0))
+            for term, tf in frequencies.items():
+                df = document_frequency[term]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                weight = idf * tf * (k1 + 1) / (tf + norm)
+                self._postings.setdefault(term, []).append((doc_id, weight))
+        self._max_weight = max((w for postings in self._postings.values() for _, w in postings), default=0.0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[KnowledgeMatch]:
+        """Returns up to k entries ranked by BM25 score (highest first)."""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        scores: Dict[int, float] = {}
+        for term in set(query_tokens):
+            for doc_id, weight in self._postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+
+        # An entry whose full name appears in the query is what the caller asked for by name.
+        query_phrase = f" {' '.join(query_tokens)} "
+        for doc_id in scores:
+            phrase = self._phrases[doc_id]
+            if phrase and f" {phrase} " in query_phrase:
+                scores[doc_id] += self._max_weight
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.entries[doc_id]._replace(score=round(score, 3))
+                for doc_id, score in ranked[:k] if score > min_score]
@@ -0,0 +1,82 @@
+"""
+Process-wide, read-only knowledge base loaded from knowledge_base.json.
+
+Every KnowledgeBaseTool instance shares one parsed snapshot (and its search index)
+per file instead of parsing the JSON itself. The file's modification time is
+checked on each access, and a changed file is reloaded once for the whole process,
+so long-running workers pick up edits without a restart.
+"""
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional
+
+from knowledge_index import KnowledgeIndex
+
+
+class KnowledgeStore(NamedTuple):
+    """An immutable snapshot of one knowledge base file."""
+    path: str
+    knowledge: Mapping[str, Mapping[str, str]]
+    index: KnowledgeIndex
+    version: int # st_mtime_ns of the file when loaded; 0 if the file could not be read
+
+
+def _freeze(knowledge: Dict[str, Dict[str, str]]) -> Mapping[str, Mapping[str, str]]:
+    return MappingProxyType({
+        category: MappingProxyType(dict(subcategories)) if isinstance(subcategories, dict) else MappingProxyType({})
+        for category, subcategories in knowledge.items()
+    })
+
+
+def _empty_store(path: str) -> KnowledgeStore:
+    return KnowledgeStore(path, MappingProxyType({}), KnowledgeIndex({}), 0)
+
+
+_stores: Dict[str, KnowledgeStore] = {}
+_lock = threading.Lock()
+
+
+def _load(path: str, version: int, previous: Optional[KnowledgeStore]) -> KnowledgeStore:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            knowledge = _freeze(json.load(f))
+    except json.JSONDecodeError as e:
+        if previous is not None and previous.version:
+            # Keep serving the last good snapshot while the file is mid-edit
+            print(f"Warning: Failed to decode JSON from '{path}': {e}. Keeping the previously loaded knowledge base.")
+            return previous._replace(version=version)
+        print(f"Error: Failed to decode JSON from '{path}': {e}. Initializing with empty knowledge.")
+        return _empty_store(path)._replace(version=version)
+    except Exception as e:
+        print(f"An unexpected error occurred loading knowledge base from '{path}': {e}")
+        return _empty_store(path)._replace(version=version)
+    store = KnowledgeStore(path, knowledge, KnowledgeIndex(knowledge), version)
+    action = "reloaded" if previous is not None and previous.version else "loaded"
+    print(f"Knowledge base {action} from {path} ({len(store.index)} entries).")
+    return store
+
+
+def get_knowledge_store(path: str = "knowledge_base.json") -> KnowledgeStore:
+    """Returns the shared snapshot for `path`, reloading it if the file changed since the last load."""
+    key = os.path.abspath(path)
+    try:
+        version = os.stat(key).st_mtime_ns
+    except OSError:
+        version = 0
+    store = _stores.get(key)
+    if store is not None and store.version == version:
+        return store
+    with _lock:
+        store = _stores.get(key)
+        if store is not None and store.version == version:
+            return store # Another thread reloaded it while we waited
+        if version == 0:
+            if store is None or store.version != 0:
+                print(f"Error: Knowledge base file '{path}' not found. Initializing with empty knowledge.")
+            store = _empty_store(path)
+        else:
+            store = _load(key, version, store)
+        _stores[key] = store
+        return store
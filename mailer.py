@@ -0,0 +1,809 @@
+"""
+Pooled SMTP delivery for report emails.
+
+Authenticated SMTP sessions are kept in a small pool and reused for many
+messages, so a batch of reports pays for one connect/EHLO/STARTTLS/login per
+pooled connection instead of one per email. Each message goes to the server
+once, with every recipient as its own RCPT TO; report attachments are read,
+compressed above a size threshold and base64-encoded in chunks while the DATA
+section is written, so a large report is never held in memory. Transient failures (dropped connections, timeouts, 4xx replies) are
+retried with exponential backoff on a fresh connection; permanent ones (5xx,
+bad credentials) fail at once.
+
+Configuration (environment variables; the apps read the credentials from their own
+variable names, see `SMTPSettings.from_env`):
+    SMTP_SERVER, SMTP_PORT  Server address (port 465 uses implicit TLS)
+    SMTP_STARTTLS           Upgrade plain connections with STARTTLS (default: true)
+    SMTP_TIMEOUT            Socket timeout in seconds (default: 20)
+    SMTP_POOL_SIZE          Connections kept open per server and account (default: 2)
+    SMTP_RETRIES            Retries after a transient failure (default: 3)
+    SMTP_BACKOFF            First retry delay in seconds, doubled per retry (default: 1.0)
+    EMAIL_COMPRESSION       auto (gzip one file, zip several), gzip, zip or none (default: auto)
+    EMAIL_COMPRESS_THRESHOLD  Total attachment bytes from which compression applies (default: 524288)
+
+`python mailer.py selftest` sends a batch through the stand-in SMTP server defined
+below, with injected transient failures, and prints the delivery counters.
+"""
+import argparse
+import atexit
+import base64
+import os
+import queue
+import quopri
+import random
+import re
+import smtplib
+import socket
+import socketserver
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from email.header import Header
+from email.utils import encode_rfc2231, formatdate, make_msgid, quote
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_TIMEOUT = 20
+DEFAULT_POOL_SIZE = 2
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+MAX_MESSAGES_PER_CONNECTION = 100 # Many servers cap messages per session; reconnect before hitting it
+MAX_IDLE_SECONDS = 60 # Idle connections older than this are checked with NOOP before reuse
+DEFAULT_COMPRESS_THRESHOLD = 512 * 1024 # Attachments at least this large (in total) are compressed
+READ_CHUNK_BYTES = 57 * 1024 # Whole base64 lines per chunk
+SEND_BUFFER_BYTES = 64 * 1024
+_LEADING_DOT = re.compile(rb"^\.", re.MULTILINE)
+
+# Failures worth retrying on a new connection
+_TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def parse_recipients(recipients: Any) -> List[str]:
+    """Accepts one address, a comma/semicolon separated string, or a list. Keeps order, drops duplicates."""
+    if isinstance(recipients, str):
+        recipients = recipients.replace(";", ",").split(",")
+    return list(dict.fromkeys(address.strip() for address in recipients or [] if address and address.strip()))
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+class SMTPSettings(NamedTuple):
+    host: str
+    port: int
+    username: str
+    password: str
+    use_ssl: bool
+    starttls: bool
+    timeout: float
+
+    @classmethod
+    def from_env(cls, username_var: str, password_var: str) -> "SMTPSettings":
+        """Reads the server and credentials from the environment. Raises ValueError naming what is missing."""
+        values = {name: os.getenv(name) for name in (username_var, password_var, "SMTP_SERVER", "SMTP_PORT")}
+        missing = [name for name, value in values.items() if not value]
+        if missing:
+            raise ValueError(f"Email settings missing from the environment: {', '.join(missing)}.")
+        try:
+            port = int(values["SMTP_PORT"])
+        except ValueError:
+            raise ValueError(f"Invalid SMTP_PORT: {values['SMTP_PORT']}. Must be a number.")
+        return cls(values["SMTP_SERVER"], port, values[username_var], values[password_var],
+                   use_ssl=port == 465, starttls=port != 465 and _env_flag("SMTP_STARTTLS", True),
+                   timeout=float(os.getenv("SMTP_TIMEOUT", DEFAULT_TIMEOUT)))
+
+
+class DeliveryResult(NamedTuple):
+    ok: bool
+    delivered: List[str]
+    refused: Dict[str, Tuple[int, str]]
+    attempts: int
+    error: Optional[str] = None
+
+# --- Message Building ---
+
+class _Base64Lines:
+    """Incremental base64 encoder producing 76-character CRLF lines from arbitrary chunks."""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._pending + data
+        cut = len(data) - len(data) % 57 # 57 input bytes make one 76-character line
+        self._pending = data[cut:]
+        return base64.encodebytes(data[:cut]).replace(b"\n", b"\r\n") if cut else b""
+
+    def finish(self) -> bytes:
+        data, self._pending = self._pending, b""
+        return base64.encodebytes(data).replace(b"\n", b"\r\n") if data else b""
+
+
+class _ZipSink:
+    """Write-only stream that hands zipfile's output back in pieces instead of keeping it."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+            yield chunk
+
+
+def _gzip_chunks(path: str) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits 31 writes the gzip container
+    for chunk in _read_chunks(path):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _zip_chunks(paths: Sequence[str]) -> Iterator[bytes]:
+    sink = _ZipSink()
+    # zipfile writes to an unseekable stream using data descriptors, so nothing is buffered whole
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for path in paths:
+            with bundle.open(os.path.basename(path), "w") as member:
+                for chunk in _read_chunks(path):
+                    member.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()
+
+
+class _Attachment(NamedTuple):
+    filename: str
+    content_type: str
+    chunks: Callable[[], Iterator[bytes]] # Re-callable, so a retry streams the files again
+
+
+def plan_attachments(paths: Sequence[str], compression: Optional[str] = None,
+                     threshold: Optional[int] = None) -> List[_Attachment]:
+    """
+    Decides how report files travel. Below the size threshold they are attached as they are;
+    at or above it a single file is gzipped and several files are bundled into one zip
+    (EMAIL_COMPRESSION=auto), or the chosen gzip/zip/none mode is used.
+    """
+    compression = (compression or os.getenv("EMAIL_COMPRESSION", "auto")).strip().lower()
+    threshold = int(threshold if threshold is not None else os.getenv("EMAIL_COMPRESS_THRESHOLD", DEFAULT_COMPRESS_THRESHOLD))
+    total = sum(os.path.getsize(path) for path in paths) # Also fails early (OSError) on a missing file
+    if compression == "none" or total < threshold or not paths:
+        return [_Attachment(os.path.basename(path), "application/octet-stream", lambda path=path: _read_chunks(path))
+                for path in paths]
+    if compression == "gzip" or (compression == "auto" and len(paths) == 1):
+        return [_Attachment(f"{os.path.basename(path)}.gz", "application/gzip", lambda path=path: _gzip_chunks(path))
+                for path in paths]
+    name = os.path.splitext(os.path.basename(paths[0]))[0] if len(paths) == 1 else f"reports_{len(paths)}"
+    return [_Attachment(f"{name}.zip", "application/zip", lambda: _zip_chunks(paths))]
+
+
+class ReportMessage:
+    """
+    A plain-text email with report attachments, generated on the fly. Attachments are read,
+    optionally compressed and base64-encoded one chunk at a time, so memory use does not
+    grow with the report size and nothing is encoded until the message is sent.
+    """
+
+    def __init__(self, sender: str, recipients: Sequence[str], subject: str, body: str,
+                 attachments: Sequence[_Attachment] = ()):
+        self.headers = {
+            "From": sender,
+            "To": ", ".join(recipients),
+            "Subject": subject,
+            "Date": formatdate(localtime=True),
+            "Message-ID": make_msgid(),
+            "MIME-Version": "1.0",
+        }
+        self.body = body
+        self.attachments = list(attachments)
+        self.boundary = f"=============={uuid.uuid4().hex}=="
+        # Encoded up front, so text that cannot be encoded fails here rather than halfway through DATA
+        self._head = self._header_lines()
+        self._text_part = self._body_part()
+        self._part_heads = [self._attachment_head(attachment) for attachment in self.attachments]
+
+    def __getitem__(self, name: str) -> Optional[str]:
+        return self.headers.get(name)
+
+    def _header_lines(self) -> bytes:
+        lines = []
+        for name, value in self.headers.items():
+            value = value if value.isascii() else Header(value, "utf-8").encode()
+            lines.append(f"{name}: {value}")
+        lines.append(f'Content-Type: multipart/mixed; boundary="{self.boundary}"')
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("ascii")
+
+    def _body_part(self) -> bytes:
+        text = quopri.encodestring(self.body.encode("utf-8")).replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+        return (f"--{self.boundary}\r\nContent-Type: text/plain; charset=\"utf-8\"\r\n"
+                f"Content-Transfer-Encoding: quoted-printable\r\n\r\n").encode("ascii") + text.rstrip(b"\r\n") + b"\r\n"
+
+    def _attachment_head(self, attachment: _Attachment) -> bytes:
+        # Non-ASCII file names use the RFC 2231 form, e.g. filename*=utf-8''R%C3%A9sum%C3%A9.txt
+        if attachment.filename.isascii():
+            filename = f'filename="{quote(attachment.filename)}"'
+        else:
+            filename = f"filename*={encode_rfc2231(attachment.filename, 'utf-8')}"
+        return (f"--{self.boundary}\r\nContent-Type: {attachment.content_type}\r\n"
+                f"Content-Transfer-Encoding: base64\r\n"
+                f"Content-Disposition: attachment; {filename}\r\n\r\n").encode("ascii")
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """The serialized message in blocks, each ending at a CRLF line break."""
+        yield self._head
+        yield self._text_part
+        for attachment, head in zip(self.attachments, self._part_heads):
+            yield head
+            encoder = _Base64Lines()
+            for chunk in attachment.chunks():
+                encoded = encoder.feed(chunk)
+                if encoded:
+                    yield encoded
+            tail = encoder.finish()
+            if tail:
+                yield tail
+        yield f"--{self.boundary}--\r\n".encode("ascii")
+
+    def as_bytes(self) -> bytes:
+        return b"".join(self.iter_bytes())
+
+
+def build_report_message(sender: str, recipients: Sequence[str], subject: str, body: str,
+                         file_path: Any = None) -> ReportMessage:
+    """
+    A plain-text email with the report(s) attached; `file_path` is one path or a list of paths.
+    Raises OSError if an attachment is missing, UnicodeError if the text cannot be encoded.
+    """
+    paths = [file_path] if isinstance(file_path, str) else list(file_path or [])
+    return ReportMessage(sender, recipients, subject, body, plan_attachments(paths))
+
+
+def _send_streaming(server: smtplib.SMTP, sender: str, recipients: Sequence[str],
+                    message: ReportMessage) -> Dict[str, Tuple[int, bytes]]:
+    """
+    smtplib's sendmail(), but writing the DATA section block by block as it is generated.
+    Returns and raises exactly what sendmail() would.
+    """
+    server.ehlo_or_helo_if_needed()
+    code, reply = server.mail(sender)
+    if code != 250:
+        if code == 421:
+            server.close()
+        else:
+            server.rset()
+        raise smtplib.SMTPSenderRefused(code, reply, sender)
+    refused = {}
+    for recipient in recipients:
+        code, reply = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, reply)
+        if code == 421:
+            server.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(recipients):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, reply = server.docmd("data")
+    if code != 354:
+        raise smtplib.SMTPDataError(code, reply)
+    # Small writes are coalesced; one send() per header or text part would stall on Nagle's algorithm
+    buffered, size = [], 0
+    for block in message.iter_bytes():
+        buffered.append(_LEADING_DOT.sub(b"..", block)) # Dot-stuffing; every block starts on a new line
+        size += len(block)
+        if size >= SEND_BUFFER_BYTES:
+            server.send(b"".join(buffered))
+            buffered, size = [], 0
+    server.send(b"".join(buffered) + b".\r\n")
+    code, reply = server.getreply()
+    if code != 250:
+        if code == 421:
+            server.close()
+        else:
+            server.rset()
+        raise smtplib.SMTPDataError(code, reply)
+    return refused
+
+# --- Connection Pool ---
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Keeps up to `size` authenticated SMTP sessions open and lends them out one at a time."""
+
+    def __init__(self, settings: SMTPSettings, size: int = DEFAULT_POOL_SIZE):
+        self.settings = settings
+        self.size = max(1, size)
+        self.handshakes = 0
+        self._idle: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _PooledConnection:
+        settings = self.settings
+        if settings.use_ssl:
+            server = smtplib.SMTP_SSL(settings.host, settings.port, timeout=settings.timeout)
+        else:
+            server = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+        try:
+            server.ehlo()
+            if settings.starttls:
+                server.starttls()
+                server.ehlo() # Re-greet over TLS
+            server.login(settings.username, settings.password)
+        except BaseException:
+            self._close(server)
+            raise
+        with self._lock:
+            self.handshakes += 1
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _is_alive(self, connection: _PooledConnection) -> bool:
+        if connection.server.sock is None:
+            return False
+        if time.monotonic() - connection.last_used < MAX_IDLE_SECONDS:
+            return True
+        try:
+            return connection.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def acquire(self) -> _PooledConnection:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_alive(connection):
+                    return connection
+                self._close(connection.server)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection: _PooledConnection, broken: bool = False) -> None:
+        """Returns a connection to the pool, or closes it if it failed or has sent its share of messages."""
+        try:
+            if broken or connection.messages >= MAX_MESSAGES_PER_CONNECTION:
+                self._close(connection.server)
+            else:
+                connection.last_used = time.monotonic()
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._close(self._idle.get_nowait().server)
+            except queue.Empty:
+                return
+
+# --- Delivery ---
+
+class Mailer:
+    """Sends messages over a connection pool, retrying transient failures with backoff."""
+
+    def __init__(self, settings: SMTPSettings, pool_size: Optional[int] = None,
+                 retries: Optional[int] = None, backoff: Optional[float] = None):
+        self.settings = settings
+        self.pool = SMTPPool(settings, int(pool_size if pool_size is not None else os.getenv("SMTP_POOL_SIZE", DEFAULT_POOL_SIZE)))
+        self.retries = int(retries if retries is not None else os.getenv("SMTP_RETRIES", DEFAULT_RETRIES))
+        self.backoff = float(backoff if backoff is not None else os.getenv("SMTP_BACKOFF", DEFAULT_BACKOFF))
+        self.messages = 0
+        self.recipients = 0
+        self.retried = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def send(self, message: Any, recipients: Any, sender: Optional[str] = None) -> DeliveryResult:
+        """
+        Delivers one message to all recipients in a single SMTP transaction. Recipients the
+        server refuses temporarily are retried; permanently refused ones are reported. A message
+        that cannot be encoded raises UnicodeError.
+        """
+        pending = parse_recipients(recipients)
+        sender = sender or message['From'] or self.settings.username
+        # A ReportMessage is streamed; any other email.message.Message is serialized once
+        payload = None if isinstance(message, ReportMessage) else message.as_bytes()
+        delivered: List[str] = []
+        refused: Dict[str, Tuple[int, str]] = {}
+        error: Optional[str] = None
+        attempt = 0
+        while pending:
+            attempt += 1
+            retry_error: Optional[BaseException] = None
+            try:
+                connection = self.pool.acquire()
+            except Exception as e:
+                retry_error = e
+            else:
+                broken = False
+                try:
+                    if payload is None:
+                        rejected = _send_streaming(connection.server, sender, pending, message)
+                    else:
+                        rejected = connection.server.sendmail(sender, pending, payload)
+                    connection.messages += 1
+                    delivered.extend(address for address in pending if address not in rejected)
+                    temporary = {address: reply for address, reply in rejected.items() if 400 <= reply[0] < 500}
+                    refused.update({address: reply for address, reply in rejected.items() if address not in temporary})
+                    pending = list(temporary)
+                    if temporary:
+                        retry_error = smtplib.SMTPRecipientsRefused(temporary)
+                except smtplib.SMTPRecipientsRefused as e:
+                    # Nothing was sent: everyone not refused for good is still owed the message, including
+                    # the recipients after a 421 that ended the session before their RCPT
+                    permanent = {address: reply for address, reply in e.recipients.items() if not 400 <= reply[0] < 500}
+                    refused.update(permanent)
+                    pending = [address for address in pending if address not in permanent]
+                    retry_error = e if pending else None
+                    broken = connection.server.sock is None
+                    if not broken:
+                        self._reset(connection)
+                except UnicodeError:
+                    # The message cannot be encoded; no retry or other server will change that
+                    broken = True
+                    raise
+                except Exception as e:
+                    # A 421 reply means the server is closing the session; smtplib has already dropped it
+                    broken = (not isinstance(e, smtplib.SMTPResponseException) or e.smtp_code == 421
+                              or connection.server.sock is None)
+                    if not broken:
+                        self._reset(connection)
+                    retry_error = e
+                finally:
+                    self.pool.release(connection, broken)
+
+            if retry_error is None:
+                continue
+            transient = is_transient(retry_error) or isinstance(retry_error, smtplib.SMTPRecipientsRefused)
+            if not transient or attempt > self.retries:
+                error = f"{type(retry_error).__name__}: {retry_error}"
+                # Keep the server's reply code (0 when there was none) so callers can tell temporary from permanent
+                replies = retry_error.recipients if isinstance(retry_error, smtplib.SMTPRecipientsRefused) else {}
+                code = getattr(retry_error, "smtp_code", 0)
+                refused.update({address: replies.get(address, (code, error)) for address in pending})
+                break
+            delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+            print(f"Email delivery to {', '.join(pending)} failed ({type(retry_error).__name__}); retrying in {delay:.1f}s.")
+            with self._lock:
+                self.retried += 1
+            time.sleep(delay)
+
+        with self._lock:
+            self.messages += 1
+            self.recipients += len(delivered)
+            self.failed += 1 if refused else 0
+        return DeliveryResult(not refused and bool(delivered), delivered, refused, attempt, error)
+
+    @staticmethod
+    def _reset(connection: _PooledConnection) -> None:
+        # Clear the half-finished transaction so the session can be reused
+        try:
+            connection.server.rset()
+        except Exception:
+            pass
+
+    def send_report(self, recipients: Any, subject: str, body: str, file_path: Any) -> DeliveryResult:
+        addresses = parse_recipients(recipients)
+        message = build_report_message(self.settings.username, addresses, subject, body, file_path)
+        return self.send(message, addresses)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "recipients": self.recipients,
+                "retries": self.retried,
+                "failed": self.failed,
+                "handshakes": self.pool.handshakes,
+            }
+
+    def close(self) -> None:
+        self.pool.close()
+
+# --- Process-wide Mailers ---
+
+_mailers: Dict[SMTPSettings, Mailer] = {}
+_mailers_lock = threading.Lock()
+
+
+def get_mailer(settings: SMTPSettings) -> Mailer:
+    """One pooled mailer per server and account, shared by all threads of the process."""
+    with _mailers_lock:
+        mailer = _mailers.get(settings)
+        if mailer is None:
+            mailer = _mailers[settings] = Mailer(settings)
+        return mailer
+
+
+@atexit.register
+def close_mailers() -> None:
+    with _mailers_lock:
+        for mailer in _mailers.values():
+            mailer.close()
+        _mailers.clear()
+
+
+def send_report_email(recipients: Any, subject: str, body: str, file_path: str,
+                      username_var: str, password_var: str) -> bool:
+    """
+    Emails a report through the pooled mailer, printing what happened. Returns True when every
+    recipient accepted it. `recipients` may hold several comma-separated addresses.
+    """
+    try:
+        settings = SMTPSettings.from_env(username_var, password_var)
+    except ValueError as e:
+        print(f"Error: {e}")
+        print(f"Please ensure {username_var}, {password_var}, SMTP_SERVER, and SMTP_PORT are set.")
+        return False
+    addresses = parse_recipients(recipients)
+    invalid = [address for address in addresses if '@' not in address]
+    if not addresses or invalid:
+        print(f"Error: Invalid recipient email address provided: {', '.join(invalid) or recipients}")
+        return False
+    if not os.path.exists(file_path):
+        print(f"Error: Attachment file not found at: {file_path}")
+        return False
+
+    try:
+        result = get_mailer(settings).send_report(addresses, subject, body, file_path)
+    except OSError as e:
+        print(f"Error reading attachment file '{file_path}': {e}")
+        return False
+    except UnicodeError as e:
+        print(f"Error: The email could not be encoded: {e}")
+        return False
+    if result.delivered:
+        print(f"Email sent successfully to {', '.join(result.delivered)}!")
+    for address, (code, reason) in result.refused.items():
+        reason = reason.decode(errors="replace") if isinstance(reason, bytes) else reason
+        print(f"Error: Email to {address} was not delivered ({code or 'no reply'}: {reason}).")
+    if isinstance(result.error, str) and result.error.startswith("SMTPAuthenticationError"):
+        print("       SMTP Authentication failed. Check the email address and password/app password in .env file.")
+        print("       (If using Gmail with 2FA, ensure you are using an App Password).")
+    return result.ok
+
+# --- Stand-in SMTP Server ---
+
+class _StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough ESMTP (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for smtplib."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def readline(self) -> Optional[str]:
+        line = self.rfile.readline()
+        return line.decode(errors="replace").rstrip("\r\n") if line else None
+
+    def handle(self) -> None:
+        server: "StandInSMTPServer" = self.server # type: ignore[assignment]
+        server.count("connections")
+        self.reply("220 stand-in ESMTP ready")
+        sender, recipients, authenticated = None, [], False
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            verb, _, argument = line.partition(" ")
+            verb = verb.upper()
+            if server.latency:
+                time.sleep(server.latency)
+            fault = server.take_fault(verb)
+            if fault is not None:
+                if fault == 0:
+                    return # Drop the connection without a reply
+                self.reply(f"{fault} stand-in injected failure")
+                continue
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-stand-in" if verb == "EHLO" else "250 stand-in")
+                if verb == "EHLO":
+                    self.reply("250-AUTH PLAIN LOGIN")
+                    self.reply("250 8BITMIME")
+            elif verb == "AUTH":
+                mechanism, _, initial = argument.partition(" ")
+                if mechanism.upper() == "PLAIN":
+                    _, username, password = base64.b64decode(initial or "").decode().split("\0")
+                else:
+                    self.reply("334 VXNlcm5hbWU6")
+                    username = base64.b64decode(self.readline() or "").decode()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    password = base64.b64decode(self.readline() or "").decode()
+                authenticated = server.password is None or (username, password) == (server.username, server.password)
+                if authenticated:
+                    server.count("logins")
+                self.reply("235 Authentication succeeded" if authenticated else "535 Authentication credentials invalid")
+            elif verb == "MAIL":
+                if server.password is not None and not authenticated:
+                    self.reply("530 Authentication required")
+                    continue
+                sender, recipients = argument.split(":", 1)[-1].strip().strip("<>").split(">")[0], []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = argument.split(":", 1)[-1].strip().strip("<>")
+                code = server.refuse.get(address) or server.take_refusal(address)
+                if code:
+                    self.reply(f"{code} mailbox unavailable")
+                    continue
+                recipients.append(address)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                if not recipients:
+                    self.reply("503 No valid recipients")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                server.store(sender, recipients, b"".join(lines))
+                sender, recipients = None, []
+                self.reply("250 OK queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server for tests and benchmarks. Records every delivered message,
+    and can inject failures: `fail(verb, code)` answers the next matching command
+    with `code` (0 drops the connection), `refuse[address] = code` rejects a recipient
+    and `refuse_once[address] = code` rejects it only the next time.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, username: Optional[str] = None,
+                 password: Optional[str] = None, latency: float = 0.0):
+        super().__init__((host, port), _StandInSMTPHandler)
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.messages: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {"connections": 0, "logins": 0}
+        self.refuse: Dict[str, int] = {}
+        self.refuse_once: Dict[str, int] = {}
+        self._faults: List[Tuple[str, int]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def fail(self, verb: str, code: int, times: int = 1) -> None:
+        with self._lock:
+            self._faults.extend([(verb.upper(), code)] * times)
+
+    def take_fault(self, verb: str) -> Optional[int]:
+        with self._lock:
+            for position, (fault_verb, code) in enumerate(self._faults):
+                if fault_verb == verb:
+                    del self._faults[position]
+                    return code
+        return None
+
+    def take_refusal(self, address: str) -> Optional[int]:
+        with self._lock:
+            return self.refuse_once.pop(address, None)
+
+    def store(self, sender: Optional[str], recipients: List[str], data: bytes) -> None:
+        with self._lock:
+            self.messages.append({"from": sender, "to": list(recipients), "data": data})
+
+    def start(self) -> "StandInSMTPServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="stand-in-smtp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+# --- Command Line ---
+
+def selftest(messages: int, recipients: int, pool_size: int) -> None:
+    """Sends a batch through the stand-in server with a dropped connection and a 421 reply on the way."""
+    server = StandInSMTPServer(username="reports@example.com", password="secret").start()
+    settings = SMTPSettings("127.0.0.1", server.port, "reports@example.com", "secret",
+                            use_ssl=False, starttls=False, timeout=5)
+    mailer = Mailer(settings, pool_size=pool_size, retries=3, backoff=0.05)
+    server.fail("DATA", 0)
+    server.fail("MAIL", 421)
+    addresses = [f"analyst{number}@example.com" for number in range(recipients)]
+    started = time.perf_counter()
+    results = [mailer.send(build_report_message(settings.username, addresses, f"Report {number}", "Attached."), addresses)
+               for number in range(messages)]
+    elapsed = time.perf_counter() - started
+    mailer.close()
+    server.stop()
+    print(f"Delivered {sum(result.ok for result in results)}/{messages} messages to {recipients} recipients each "
+          f"in {elapsed:.2f}s.")
+    print(f"Mailer: {mailer.stats()}")
+    print(f"Server: {len(server.messages)} messages stored, {server.counters}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pooled SMTP delivery utilities.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    serve = subcommands.add_parser("serve", help="Run the stand-in SMTP server (no TLS).")
+    serve.add_argument("--port", type=int, default=2525)
+    serve.add_argument("--username")
+    serve.add_argument("--password")
+    test = subcommands.add_parser("selftest", help="Send a batch through a stand-in server and print counters.")
+    test.add_argument("--messages", type=int, default=20)
+    test.add_argument("--recipients", type=int, default=3)
+    test.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = StandInSMTPServer(port=args.port, username=args.username, password=args.password)
+        print(f"Stand-in SMTP server listening on 127.0.0.1:{server.port} (set SMTP_STARTTLS=false to use it).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            print(f"{len(server.messages)} messages received.")
+    else:
+        selftest(args.messages, args.recipients, args.pool_size)
+
+
+if __name__ == "__main__":
+    main()
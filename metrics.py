@@ -0,0 +1,365 @@
+"""
+Latency, error and token metrics for tools, tasks and agents.
+
+Observations go to two places:
+  - the process-wide registry, which accumulates across runs and is exported in
+    Prometheus text format (e.g. for node_exporter's textfile collector);
+  - the registry of the current run, if one was started with start_run_metrics().
+    It holds only that run's numbers and its JSON summary is saved with the report.
+
+The current run is tracked with a context variable, so concurrent runs in
+batch mode each see their own numbers. ParallelCrew copies the context into its
+worker threads, so tool calls made inside a task are attributed to the right run.
+"""
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds: sub-millisecond tool logic up to multi-minute LLM tasks
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+SAMPLE_LIMIT = 2048 # Recent observations kept per histogram for exact percentiles
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, Any]]) -> Labels:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{v}"'.replace("\n", " ") for k, v in
+               ((k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs))
+    return "{" + ",".join(escaped) + "}"
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of the values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples: List[float] = []
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+        self.samples.append(value)
+        if len(self.samples) > SAMPLE_LIMIT:
+            del self.samples[:len(self.samples) - SAMPLE_LIMIT]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "p50": percentile(self.samples, 50),
+            "p95": percentile(self.samples, 95),
+            "max": round(self.max, 4),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by metric name and labels."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, value: float = 1.0, help: str = "") -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0.0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None, help: str = "") -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(labels)] = value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None, help: str = "") -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _labels(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def counter_value(self, name: str, labels: Optional[Dict[str, Any]] = None) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0.0)
+
+    def to_prometheus(self) -> str:
+        """Renders every series in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(metrics):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in sorted(metrics[name].items()):
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """A JSON-serializable view of every series."""
+        def label_key(labels: Labels) -> str:
+            return ",".join(f"{k}={v}" for k, v in labels) or "all"
+
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "elapsed_seconds": round(time.time() - self.started_at, 3),
+                "counters": {name: {label_key(l): v for l, v in series.items()} for name, series in self._counters.items()},
+                "gauges": {name: {label_key(l): v for l, v in series.items()} for name, series in self._gauges.items()},
+                "histograms": {name: {label_key(l): h.summary() for l, h in series.items()} for name, series in self._histograms.items()},
+            }
+
+    def series(self, name: str) -> Dict[Labels, Any]:
+        """Raw series of one metric (histograms are returned as Histogram objects)."""
+        with self._lock:
+            for metrics in (self._histograms, self._counters, self._gauges):
+                if name in metrics:
+                    return dict(metrics[name])
+        return {}
+
+# --- Registries ---
+
+_registry = MetricsRegistry()
+_current_run: contextvars.ContextVar[Optional[MetricsRegistry]] = contextvars.ContextVar("current_run_metrics", default=None)
+
+
+def get_metrics() -> MetricsRegistry:
+    """The process-wide registry (cumulative across runs)."""
+    return _registry
+
+
+def start_run_metrics() -> MetricsRegistry:
+    """Starts collecting a separate set of metrics for the run executing in the current context."""
+    run = MetricsRegistry()
+    _current_run.set(run)
+    return run
+
+
+def current_run_metrics() -> Optional[MetricsRegistry]:
+    return _current_run.get()
+
+
+def _registries() -> List[MetricsRegistry]:
+    run = _current_run.get()
+    return [_registry, run] if run is not None else [_registry]
+
+# --- Recording Helpers ---
+
+def record_tool_call(tool_name: str, seconds: float, ok: bool) -> None:
+    status = "ok" if ok else "error"
+    for registry in _registries():
+        registry.observe("crew_tool_latency_seconds", seconds, {"tool": tool_name}, help="Tool _run latency in seconds.")
+        registry.inc("crew_tool_calls_total", {"tool": tool_name, "status": status}, help="Tool calls by outcome.")
+
+
+def record_task(task_name: str, agent_role: str, seconds: float, tokens: Dict[str, int], ok: bool) -> None:
+    for registry in _registries():
+        registry.observe("crew_task_duration_seconds", seconds, {"task": task_name, "agent": agent_role},
+                         help="Wall time of each task in seconds.")
+        registry.inc("crew_tasks_total", {"task": task_name, "status": "ok" if ok else "error"}, help="Task executions by outcome.")
+        registry.inc("crew_agent_busy_seconds_total", {"agent": agent_role}, seconds, help="Wall time spent executing tasks, per agent.")
+        for kind, value in tokens.items():
+            if value:
+                registry.inc("crew_task_tokens_total", {"task": task_name, "kind": kind}, value, help="LLM tokens used per task.")
+                registry.inc("crew_agent_tokens_total", {"agent": agent_role, "kind": kind}, value, help="LLM tokens used per agent.")
+
+
+def record_task_cache(task_name: str, hit: bool) -> None:
+    for registry in _registries():
+        registry.inc("crew_task_cache_total", {"task": task_name, "result": "hit" if hit else "miss"},
+                     help="Task cache lookups by result.")
+
+
+def record_context_compaction(task_name: str, tokens_before: int, tokens_after: int) -> None:
+    for registry in _registries():
+        registry.inc("crew_context_tokens_total", {"task": task_name, "stage": "raw"}, tokens_before,
+                     help="Estimated context tokens of compacted tasks, before and after compaction.")
+        registry.inc("crew_context_tokens_total", {"task": task_name, "stage": "compacted"}, tokens_after,
+                     help="Estimated context tokens of compacted tasks, before and after compaction.")
+
+
+def record_prefetch_query(outcome: str) -> None:
+    for registry in _registries():
+        registry.inc("crew_prefetch_queries_total", {"outcome": outcome},
+                     help="Queries prefetched at kickoff, by outcome (fetched, cached, local, empty, failed).")
+
+
+def record_prefetch_use(match: str) -> None:
+    for registry in _registries():
+        registry.inc("crew_prefetch_served_total", {"match": match},
+                     help="Agent searches answered by a prefetched query, by match (same or related query).")
+
+
+def record_snippet_dedup(tool_name: str, checked: int, dropped: int, tokens_saved: int) -> None:
+    for registry in _registries():
+        registry.inc("crew_snippets_total", {"tool": tool_name, "result": "kept"}, checked - dropped,
+                     help="Search snippets checked for near-duplicates, by result (kept or dropped).")
+        registry.inc("crew_snippets_total", {"tool": tool_name, "result": "dropped"}, dropped,
+                     help="Search snippets checked for near-duplicates, by result (kept or dropped).")
+        registry.inc("crew_snippet_tokens_saved_total", {"tool": tool_name}, tokens_saved,
+                     help="Estimated tokens of near-duplicate snippets left out of tool results.")
+
+
+def tool_reliability(tool_name: str) -> Optional[float]:
+    """Share of successful calls for a tool in this process, or None before its first call."""
+    ok = _registry.counter_value("crew_tool_calls_total", {"tool": tool_name, "status": "ok"})
+    errors = _registry.counter_value("crew_tool_calls_total", {"tool": tool_name, "status": "error"})
+    total = ok + errors
+    return round(ok / total, 4) if total else None
+
+
+def agent_token_usage(agent: Any) -> Dict[str, int]:
+    """Cumulative token counters of a crewAI agent (zeros if the agent does not track them)."""
+    process = getattr(agent, "_token_process", None)
+    try:
+        usage = process.get_summary()
+    except Exception:
+        return {"prompt": 0, "completion": 0, "total": 0}
+    return {
+        "prompt": int(getattr(usage, "prompt_tokens", 0) or 0),
+        "completion": int(getattr(usage, "completion_tokens", 0) or 0),
+        "total": int(getattr(usage, "total_tokens", 0) or 0),
+    }
+
+
+def _snapshot_cache_gauges(registry: MetricsRegistry) -> None:
+    """Copies search cache and tool memo hit rates into gauges just before export."""
+    from search_cache import get_search_cache
+    from tool_memo import memo_stats
+
+    try:
+        stats = get_search_cache().stats()
+    except Exception:
+        stats = None
+    if stats:
+        for key in ("hits", "misses", "entries", "hit_rate"):
+            registry.set_gauge(f"crew_search_cache_{key}", stats[key], help=f"Search cache {key.replace('_', ' ')} in this process.")
+    for tool, memo in memo_stats().items():
+        registry.set_gauge("crew_tool_memo_hit_rate", memo["hit_rate"], {"tool": tool}, help="Memoized tool hit rate.")
+
+
+def run_summary(run: Optional[MetricsRegistry]) -> Dict[str, Any]:
+    """JSON summary for a run (cache figures are process-wide), attached to its report."""
+    from token_budget import budget_summary
+
+    registry = run or _registry
+    _snapshot_cache_gauges(registry)
+    summary = registry.summary()
+    if run is not None:
+        summary["token_budget"] = budget_summary(run)
+    return summary
+
+
+def write_prometheus_textfile(path: Optional[str] = None) -> Optional[str]:
+    """
+    Atomically writes the process-wide registry to `path` (default: METRICS_TEXTFILE env var).
+    Returns the path written, or None when no path is configured.
+    """
+    path = path or os.getenv("METRICS_TEXTFILE")
+    if not path:
+        return None
+    _snapshot_cache_gauges(_registry)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(_registry.to_prometheus())
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_json_summary(summary: Dict[str, Any], path: str) -> str:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+
+def format_run_metrics(summary: Dict[str, Any]) -> List[str]:
+    """Human-readable lines for a report's Execution Metadata section."""
+    from token_budget import format_budget_lines
+
+    lines = []
+    histograms = summary.get("histograms", {})
+    for labels, stats in sorted(histograms.get("crew_task_duration_seconds", {}).items()):
+        lines.append(f"Task time [{labels}]: {stats['sum']:.1f}s")
+    tokens = summary.get("counters", {}).get("crew_agent_tokens_total", {})
+    for labels, value in sorted(tokens.items()):
+        if labels.endswith("kind=total"):
+            lines.append(f"Agent tokens [{labels.replace(',kind=total', '')}]: {int(value)}")
+    for labels, stats in sorted(histograms.get("crew_tool_latency_seconds", {}).items()):
+        lines.append(f"Tool latency [{labels}]: {stats['count']} calls, p50 {stats['p50']:.3f}s, p95 {stats['p95']:.3f}s")
+    errors = summary.get("counters", {}).get("crew_tool_calls_total", {})
+    error_count = sum(v for k, v in errors.items() if "status=error" in k)
+    if error_count:
+        lines.append(f"Tool errors: {int(error_count)}")
+    context_tokens = summary.get("counters", {}).get("crew_context_tokens_total", {})
+    if context_tokens:
+        raw = sum(v for k, v in context_tokens.items() if "stage=raw" in k)
+        compacted = sum(v for k, v in context_tokens.items() if "stage=compacted" in k)
+        lines.append(f"Context compaction: ~{int(raw)} -> ~{int(compacted)} tokens "
+                     f"across {len(context_tokens) // 2} task(s)")
+    lines.extend(format_budget_lines(summary.get("token_budget")))
+    prefetched = summary.get("counters", {}).get("crew_prefetch_queries_total", {})
+    if prefetched:
+        served = summary.get("counters", {}).get("crew_prefetch_served_total", {})
+        outcomes = ", ".join(f"{int(v)} {k.split('=', 1)[-1]}" for k, v in sorted(prefetched.items()))
+        lines.append(f"Research prefetch: {int(sum(prefetched.values()))} queries ({outcomes}); "
+                     f"{int(sum(served.values()))} agent searches served from them")
+    snippets = summary.get("counters", {}).get("crew_snippets_total", {})
+    if snippets:
+        dropped = sum(v for k, v in snippets.items() if "result=dropped" in k)
+        saved = sum(summary.get("counters", {}).get("crew_snippet_tokens_saved_total", {}).values())
+        lines.append(f"Snippet dedup: {int(dropped)} of {int(sum(snippets.values()))} search snippets left out "
+                     f"as near-duplicates, ~{int(saved)} tokens saved")
+    gauges = summary.get("gauges", {})
+    if "crew_search_cache_hit_rate" in gauges:
+        lines.append(f"Search cache hit rate: {gauges['crew_search_cache_hit_rate'].get('all', 0.0):.0%} "
+                     f"({int(gauges.get('crew_search_cache_hits', {}).get('all', 0))} hits, "
+                     f"{int(gauges.get('crew_search_cache_misses', {}).get('all', 0))} misses)")
+    return lines
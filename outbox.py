@@ -0,0 +1,459 @@
+"""
+Durable email outbox.
+
+Crew runs enqueue report emails into a local SQLite outbox and return at once;
+a sender worker drains it in the background. Delivery latency or an unreachable
+SMTP server therefore never holds up a run. Each message is sent at most once
+per recipient list, subject and attachment (duplicates are ignored), failed
+attempts are rescheduled with exponential backoff, and every message's status
+(queued, sending, sent, failed) is kept for inspection.
+
+Messages store the names of the credential variables, never the credentials
+themselves; the worker reads them from its own environment.
+
+Usage:
+    python outbox.py worker                 # keep draining until interrupted
+    python outbox.py worker --once          # send everything that is due, then exit
+    python outbox.py status                 # counts and the latest messages
+    python outbox.py retry <id>             # requeue a failed message
+
+Configuration (environment variables, all optional):
+    OUTBOX_PATH          SQLite file location (default: .outbox.sqlite3)
+    OUTBOX_CONCURRENCY   Messages sent at the same time (default: 2)
+    OUTBOX_MAX_ATTEMPTS  Attempts before a message is marked failed (default: 6)
+    OUTBOX_RETRY_BASE    First retry delay in seconds, doubled per attempt (default: 30)
+    OUTBOX_BACKGROUND    Drain the outbox from a thread inside the app process (default: true)
+    OUTBOX_EXIT_WAIT     Seconds the app waits at exit for queued mail (default: 30)
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from mailer import Mailer, SMTPSettings, build_report_message, parse_recipients
+
+DEFAULT_OUTBOX_PATH = ".outbox.sqlite3"
+DEFAULT_CONCURRENCY = 2
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_RETRY_BASE = 30.0
+LEASE_SECONDS = 300 # A message claimed by a worker that died is picked up again after this long
+POLL_SECONDS = 2.0
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS outbox ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " dedup_key TEXT NOT NULL UNIQUE,"
+    " recipients TEXT NOT NULL,"
+    " delivered TEXT NOT NULL DEFAULT '[]',"
+    " subject TEXT NOT NULL,"
+    " body TEXT NOT NULL,"
+    " file_path TEXT,"
+    " username_var TEXT NOT NULL,"
+    " password_var TEXT NOT NULL,"
+    " run_id TEXT,"
+    " status TEXT NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " next_attempt_at REAL NOT NULL,"
+    " lease_until REAL,"
+    " last_error TEXT,"
+    " created_at TEXT NOT NULL,"
+    " updated_at TEXT NOT NULL,"
+    " sent_at TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)",
+]
+
+
+def _file_digest(path: Optional[str]) -> str:
+    if not path or not os.path.exists(path):
+        return ""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dedup_key(recipients: List[str], subject: str, file_path: Optional[str]) -> str:
+    """Same recipients, subject and attachment content means the same email."""
+    material = json.dumps([sorted(recipients), subject, _file_digest(file_path) or file_path or ""])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class Outbox:
+    """SQLite-backed queue of report emails, shared by app processes and sender workers."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("OUTBOX_PATH", DEFAULT_OUTBOX_PATH)
+        self.max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        self.retry_base = float(os.getenv("OUTBOX_RETRY_BASE", DEFAULT_RETRY_BASE))
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _write(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def enqueue(self, recipients: Any, subject: str, body: str, file_path: Optional[str],
+                username_var: str, password_var: str, run_id: Optional[str] = None) -> int:
+        """
+        Queues an email and returns its ID without touching the network. An identical email
+        that is already queued or sent is not queued again; a failed one is requeued.
+        """
+        addresses = parse_recipients(recipients)
+        if not addresses:
+            raise ValueError("An email needs at least one recipient.")
+        key = dedup_key(addresses, subject, file_path)
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id, status FROM outbox WHERE dedup_key = ?", (key,)).fetchone()
+            if row is None:
+                message_id = conn.execute(
+                    "INSERT INTO outbox (dedup_key, recipients, subject, body, file_path, username_var, password_var,"
+                    " run_id, status, next_attempt_at, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (key, json.dumps(addresses), subject, body, os.path.abspath(file_path) if file_path else None,
+                     username_var, password_var, run_id, time.time(), now, now),
+                ).lastrowid
+            else:
+                message_id = row["id"]
+                if row["status"] == "failed":
+                    conn.execute("UPDATE outbox SET status = 'queued', attempts = 0, next_attempt_at = ?, updated_at = ?"
+                                 " WHERE id = ?", (time.time(), now, message_id))
+                else:
+                    print(f"Email {message_id} to {', '.join(addresses)} is already {row['status']}; not queued again.")
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        wake_background_sender()
+        return message_id
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Atomically leases up to `limit` due messages to the caller."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE (status = 'queued' AND next_attempt_at <= ?)"
+                " OR (status = 'sending' AND lease_until < ?) ORDER BY next_attempt_at LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            for row in rows:
+                conn.execute("UPDATE outbox SET status = 'sending', attempts = attempts + 1, lease_until = ?, updated_at = ?"
+                             " WHERE id = ?", (now + LEASE_SECONDS, datetime.now().isoformat(), row["id"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return [dict(row, attempts=row["attempts"] + 1) for row in rows]
+
+    def mark_sent(self, message_id: int, delivered: List[str]) -> None:
+        now = datetime.now().isoformat()
+        self._write("UPDATE outbox SET status = 'sent', delivered = ?, lease_until = NULL, last_error = NULL,"
+                    " updated_at = ?, sent_at = ? WHERE id = ?", (json.dumps(delivered), now, now, message_id))
+
+    def mark_retry(self, message: Dict[str, Any], remaining: List[str], delivered: List[str], error: str) -> str:
+        """Reschedules the recipients still owed the message, or fails it after the last attempt."""
+        if message["attempts"] >= self.max_attempts:
+            self.mark_failed(message["id"], delivered, f"{error} (gave up after {message['attempts']} attempts)")
+            return "failed"
+        delay = self.retry_base * (2 ** (message["attempts"] - 1))
+        self._write("UPDATE outbox SET status = 'queued', recipients = ?, delivered = ?, next_attempt_at = ?,"
+                    " lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(remaining), json.dumps(delivered), time.time() + delay, error,
+                     datetime.now().isoformat(), message["id"]))
+        return "queued"
+
+    def mark_failed(self, message_id: int, delivered: List[str], error: str) -> None:
+        self._write("UPDATE outbox SET status = 'failed', delivered = ?, lease_until = NULL, last_error = ?,"
+                    " updated_at = ? WHERE id = ?", (json.dumps(delivered), error, datetime.now().isoformat(), message_id))
+
+    def requeue(self, message_id: int) -> bool:
+        cursor = self._write("UPDATE outbox SET status = 'queued', attempts = 0, next_attempt_at = ?, updated_at = ?"
+                             " WHERE id = ? AND status = 'failed'", (time.time(), datetime.now().isoformat(), message_id))
+        return cursor.rowcount > 0
+
+    def counts(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            return {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")}
+        finally:
+            conn.close()
+
+    def pending(self) -> int:
+        """Messages not yet sent or failed."""
+        counts = self.counts()
+        return counts.get("queued", 0) + counts.get("sending", 0)
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next queued message is due (0 if one is due now), or None if none are queued."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'queued'").fetchone()
+        finally:
+            conn.close()
+        return max(0.0, row[0] - time.time()) if row and row[0] is not None else None
+
+    def latest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute("SELECT * FROM outbox ORDER BY id DESC LIMIT ?", (limit,))]
+        finally:
+            conn.close()
+
+# --- Sender Worker ---
+
+class OutboxWorker:
+    """Drains the outbox with at most `concurrency` messages in flight."""
+
+    def __init__(self, outbox: Outbox, concurrency: Optional[int] = None):
+        self.outbox = outbox
+        self.concurrency = max(1, int(concurrency or os.getenv("OUTBOX_CONCURRENCY", DEFAULT_CONCURRENCY)))
+        self.sent = 0
+        self.failed = 0
+        self._mailers: Dict[SMTPSettings, Mailer] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def _mailer(self, settings: SMTPSettings) -> Mailer:
+        with self._lock:
+            mailer = self._mailers.get(settings)
+            if mailer is None:
+                # The outbox schedules its own retries, so the mailer does not sleep between attempts
+                mailer = self._mailers[settings] = Mailer(settings, pool_size=self.concurrency, retries=0)
+            return mailer
+
+    def deliver(self, message: Dict[str, Any]) -> str:
+        """Sends one claimed message and records the outcome. Returns the new status."""
+        recipients = json.loads(message["recipients"])
+        delivered = json.loads(message["delivered"])
+        try:
+            settings = SMTPSettings.from_env(message["username_var"], message["password_var"])
+            email = build_report_message(settings.username, recipients, message["subject"], message["body"], message["file_path"])
+        except (ValueError, OSError) as e:
+            self.outbox.mark_failed(message["id"], delivered, f"{type(e).__name__}: {e}")
+            status = "failed"
+        else:
+            try:
+                result = self._mailer(settings).send(email, recipients)
+            except UnicodeError as e:
+                # The message itself cannot be encoded; another attempt would fail the same way
+                result = None
+                self.outbox.mark_failed(message["id"], delivered, f"{type(e).__name__}: {e}")
+                status = "failed"
+            except Exception as e:
+                result = None
+                status = self.outbox.mark_retry(message, recipients, delivered, f"{type(e).__name__}: {e}")
+            if result is not None:
+                delivered += result.delivered
+                # 4xx replies and connection errors (reported with code 0) are worth another try
+                retryable = [address for address, (code, _) in result.refused.items() if code == 0 or 400 <= code < 500]
+                permanent = {address: reply for address, reply in result.refused.items() if address not in retryable}
+                if retryable:
+                    # Everyone not yet delivered or refused for good, not only the addresses that drew a 4xx
+                    remaining = [address for address in recipients if address not in result.delivered and address not in permanent]
+                    status = self.outbox.mark_retry(message, remaining, delivered, self._describe(result.refused))
+                elif permanent:
+                    self.outbox.mark_failed(message["id"], delivered, self._describe(permanent))
+                    status = "failed"
+                else:
+                    self.outbox.mark_sent(message["id"], delivered)
+                    status = "sent"
+        with self._lock:
+            self.sent += status == "sent"
+            self.failed += status == "failed"
+        print(f"Outbox: email {message['id']} ({message['subject']}) {status} after attempt {message['attempts']}.")
+        return status
+
+    @staticmethod
+    def _describe(refused: Dict[str, Any]) -> str:
+        parts = []
+        for address, (code, reason) in refused.items():
+            reason = reason.decode(errors="replace") if isinstance(reason, bytes) else reason
+            parts.append(f"{address}: {code or 'no reply'} {reason}")
+        return "; ".join(parts)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _deliver_in_thread(self, message: Dict[str, Any], in_flight: List[threading.Thread]) -> None:
+        try:
+            self.deliver(message)
+        except Exception as e:
+            # The lease expires and another pass picks the message up again
+            print(f"Outbox: email {message['id']} could not be processed: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                in_flight.remove(threading.current_thread())
+            self._wake.set()
+
+    def run(self, once: bool = False, poll_seconds: float = POLL_SECONDS) -> None:
+        """Sends due messages until stopped. With `once`, returns when nothing is due or in flight."""
+        # Plain daemon threads rather than an executor: executors stop accepting work before
+        # atexit handlers run, and the background sender keeps draining during interpreter exit.
+        in_flight: List[threading.Thread] = []
+        while not self._stop.is_set():
+            with self._lock:
+                free = self.concurrency - len(in_flight)
+            claimed = self.outbox.claim(free) if free > 0 else []
+            for message in claimed:
+                thread = threading.Thread(target=self._deliver_in_thread, args=(message, in_flight),
+                                          name=f"outbox-{message['id']}", daemon=True)
+                with self._lock:
+                    in_flight.append(thread)
+                thread.start()
+            with self._lock:
+                busy = bool(in_flight)
+            if once and not claimed and not busy:
+                break
+            if not claimed:
+                due_in = self.outbox.next_due_in()
+                self._wake.wait(poll_seconds if due_in is None else min(poll_seconds, max(due_in, 0.05)))
+                self._wake.clear()
+        for thread in list(in_flight):
+            thread.join()
+        for mailer in self._mailers.values():
+            mailer.close()
+
+# --- Background Sender ---
+
+_outbox: Optional[Outbox] = None
+_worker: Optional[OutboxWorker] = None
+_worker_thread: Optional[threading.Thread] = None
+_background_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Returns the process-wide outbox, creating it on first use."""
+    global _outbox
+    if _outbox is None:
+        with _background_lock:
+            if _outbox is None:
+                _outbox = Outbox()
+    return _outbox
+
+
+def wake_background_sender() -> None:
+    if _worker is not None:
+        _worker.wake()
+
+
+def start_background_sender() -> None:
+    """Starts a daemon thread draining the outbox in this process, unless OUTBOX_BACKGROUND=false."""
+    global _worker, _worker_thread
+    if os.getenv("OUTBOX_BACKGROUND", "true").strip().lower() in ("0", "false", "no", "off"):
+        return
+    with _background_lock:
+        if _worker_thread is not None:
+            return
+        _worker = OutboxWorker(get_outbox())
+        _worker_thread = threading.Thread(target=_worker.run, name="outbox-sender", daemon=True)
+        _worker_thread.start()
+
+
+@atexit.register
+def _drain_at_exit() -> None:
+    """Gives the background sender up to OUTBOX_EXIT_WAIT seconds to finish; the rest stays queued."""
+    if _worker is None or _worker_thread is None:
+        return
+    outbox = get_outbox()
+    deadline = time.monotonic() + float(os.getenv("OUTBOX_EXIT_WAIT", "30"))
+    while time.monotonic() < deadline:
+        counts = outbox.counts()
+        due_in = outbox.next_due_in()
+        if not counts.get("sending") and (due_in is None or due_in > deadline - time.monotonic()):
+            break # Nothing in flight, and nothing left that falls due before the deadline
+        time.sleep(0.2)
+    _worker.stop()
+    _worker_thread.join(timeout=5)
+    left = outbox.pending()
+    if left:
+        print(f"Outbox: {left} email(s) still queued; send them with: python outbox.py worker --once")
+
+
+def queue_report_email(recipients: Any, subject: str, body: str, file_path: str,
+                       username_var: str, password_var: str, run_id: Optional[str] = None) -> Optional[int]:
+    """Queues a report email and makes sure a sender is draining the outbox. Never raises."""
+    addresses = parse_recipients(recipients)
+    invalid = [address for address in addresses if '@' not in address]
+    if not addresses or invalid:
+        print(f"Error: Invalid recipient email address provided: {', '.join(invalid) or recipients}")
+        return None
+    try:
+        message_id = get_outbox().enqueue(addresses, subject, body, file_path, username_var, password_var, run_id)
+    except Exception as e:
+        print(f"Error: Could not queue the report email: {type(e).__name__}: {e}")
+        return None
+    print(f"Report email to {', '.join(addresses)} is in the outbox (id {message_id}); it is sent in the background.")
+    start_background_sender()
+    return message_id
+
+# --- Command Line ---
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send and inspect queued report emails.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    worker = subcommands.add_parser("worker", help="Drain the outbox.")
+    worker.add_argument("--once", action="store_true", help="Exit when nothing is due.")
+    worker.add_argument("--concurrency", type=int)
+    worker.add_argument("--poll", type=float, default=POLL_SECONDS, help="Seconds between checks when idle.")
+    status = subcommands.add_parser("status", help="Show message counts and the latest messages.")
+    status.add_argument("--limit", type=int, default=10)
+    retry = subcommands.add_parser("retry", help="Requeue a failed message.")
+    retry.add_argument("id", type=int)
+    args = parser.parse_args()
+
+    outbox = get_outbox()
+    if args.command == "worker":
+        sender = OutboxWorker(outbox, args.concurrency)
+        print(f"Outbox worker on '{outbox.path}' with concurrency {sender.concurrency}.")
+        try:
+            sender.run(once=args.once, poll_seconds=args.poll)
+        except KeyboardInterrupt:
+            sender.stop()
+        print(f"Sent {sender.sent}, failed {sender.failed}. Outbox: {outbox.counts()}")
+    elif args.command == "status":
+        print(f"Outbox '{outbox.path}': {outbox.counts()}")
+        for message in outbox.latest(args.limit):
+            print(f"  #{message['id']:<5} {message['status']:<8} attempts={message['attempts']}  "
+                  f"{', '.join(json.loads(message['recipients']))}  {message['subject']}"
+                  f"{'  - ' + message['last_error'] if message['last_error'] else ''}")
+    else:
+        print(f"Message {args.id} requeued." if outbox.requeue(args.id) else f"Message {args.id} is not a failed message.")
+
+
+if __name__ == "__main__":
+    main()
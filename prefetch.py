@@ -0,0 +1,244 @@
+"""
+Research prefetch at kickoff.
+
+Every run used to start with the first agent working out web queries one LLM
+turn at a time, each followed by a DuckDuckGo round-trip. Most of those queries
+follow from the run's inputs (company or target name, industry, decision maker,
+milestone). When a crew kicks off, this module expands the inputs into a set of
+templated queries and searches them concurrently in the background, storing
+the results in the search cache (search_cache.py). The agents' LLM turns and
+the searches now overlap.
+
+An agent search that misses the cache checks the queries prefetched for its
+own run (the metrics run started by `metrics.start_run_metrics()`). A search
+for the same normalized query that is still in flight is waited for instead of
+being sent again. A search whose terms closely overlap a prefetched query
+(Jaccard similarity of the normalized terms) is answered with that query's
+results, labelled with the query they came from, but only when both name the
+same subject: a search about another company never gets this run's results.
+Prefetches are forgotten after the search cache TTL (SEARCH_CACHE_TTL). Queries the local report
+index already answers (report_index.py) are not fetched, and nothing is
+prefetched in RESEARCH_MODE=local or while a cassette replays tool calls.
+
+Configuration (environment variables, all optional):
+    RESEARCH_PREFETCH         Set to "false" to turn prefetching off (default: true)
+    PREFETCH_WORKERS          Searches run at the same time (default: 4)
+    PREFETCH_MAX_QUERIES      Queries prefetched per run (default: 8)
+    PREFETCH_MATCH_THRESHOLD  Term overlap at which a search is served a prefetched result (default: 0.6)
+    PREFETCH_WAIT             Seconds a search waits for a matching prefetch still in flight (default: 20)
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from metrics import current_run_metrics, record_prefetch_query, record_prefetch_use
+from report_index import local_findings, name_terms, subject_terms
+from search_cache import NO_RESULTS_MARKER, get_search_cache, normalize_query, search_and_store
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUERIES = 8
+DEFAULT_MATCH_THRESHOLD = 0.6
+DEFAULT_WAIT_SECONDS = 20.0
+MAX_TRACKED_QUERIES = 256
+
+# Input keys that name the subject of a run, in the order they are tried
+NAME_KEYS = ("company_name", "target_name", "lead_name")
+
+# (template, input fields it needs). "name" is the subject from NAME_KEYS.
+QUERY_TEMPLATES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("{name} latest news", ("name",)),
+    ("{name} {industry} market share competitors", ("name", "industry")),
+    ("{name} financial results revenue profit growth", ("name",)),
+    ("{name} strategy expansion digital initiatives", ("name",)),
+    ("{key_decision_maker} {position} {name}", ("key_decision_maker", "name")),
+    ("{name} {milestone}", ("name", "milestone")),
+    ("{industry} industry trends outlook", ("industry",)),
+    ("{name} leadership management changes", ("name",)),
+]
+
+
+def expand_queries(inputs: Dict[str, Any], max_queries: int = DEFAULT_MAX_QUERIES) -> List[str]:
+    """Templated search queries for a run's inputs, without duplicates (by normalized form)."""
+    fields = {key: " ".join(str(value).split()) for key, value in (inputs or {}).items() if isinstance(value, (str, int, float))}
+    fields["name"] = next((fields[key] for key in NAME_KEYS if fields.get(key)), "")
+    queries: List[str] = []
+    seen = set()
+    for template, required in QUERY_TEMPLATES:
+        if any(not fields.get(key) for key in required):
+            continue
+        query = " ".join(re.sub(r"\{(\w+)\}", lambda m: fields.get(m.group(1), ""), template).split())
+        key = normalize_query(query)
+        if key and key not in seen:
+            seen.add(key)
+            queries.append(query)
+    return queries[:max_queries]
+
+# --- Prefetched Queries ---
+
+class _Prefetch(NamedTuple):
+    query: str
+    terms: frozenset # Normalized terms
+    subject: frozenset # Terms naming who the query is about; a related search must share them
+    started: float
+    future: Future
+
+
+# Run metrics registry -> normalized key -> prefetch, oldest first. Runs never see each other's prefetches.
+_tracked: "weakref.WeakKeyDictionary[Any, OrderedDict[str, _Prefetch]]" = weakref.WeakKeyDictionary()
+_tracked_lock = threading.Lock()
+
+
+def _track(query: str, name: str, future: Future) -> None:
+    """Remembers a prefetch for the run in progress; outside a run its results only warm the search cache."""
+    run = current_run_metrics()
+    if run is None:
+        return
+    key = normalize_query(query)
+    terms = frozenset(key.split())
+    subject = frozenset(subject_terms(query)) | frozenset(term for term in name_terms(name) if term in terms)
+    with _tracked_lock:
+        prefetches = _tracked.setdefault(run, OrderedDict())
+        prefetches[key] = _Prefetch(query, terms, subject, time.time(), future)
+        prefetches.move_to_end(key)
+        while len(prefetches) > MAX_TRACKED_QUERIES:
+            prefetches.popitem(last=False)
+
+
+def _best_match(query: str, threshold: float, ttl_seconds: float) -> Optional[Tuple[str, bool, Future]]:
+    """
+    The run's prefetched query for `query`: the same normalized query, else the closest one above
+    `threshold` about the same subject. Prefetches older than `ttl_seconds` are dropped.
+    """
+    run = current_run_metrics()
+    if run is None:
+        return None
+    key = normalize_query(query)
+    terms = frozenset(key.split())
+    subject = frozenset(subject_terms(query))
+    now = time.time()
+    with _tracked_lock:
+        prefetches = _tracked.get(run)
+        if not prefetches:
+            return None
+        for stale in [stale for stale, prefetch in prefetches.items() if now - prefetch.started > ttl_seconds]:
+            del prefetches[stale]
+        if key in prefetches:
+            return prefetches[key].query, True, prefetches[key].future
+        best: Optional[Tuple[float, str, Future]] = None
+        for prefetch in prefetches.values():
+            if not terms or not prefetch.terms:
+                continue
+            # "AMD market share" is not related to "NVIDIA market share", however many other terms they share
+            if not prefetch.subject <= terms or not subject <= prefetch.terms:
+                continue
+            similarity = len(terms & prefetch.terms) / len(terms | prefetch.terms)
+            if similarity >= threshold and (best is None or similarity > best[0]):
+                best = (similarity, prefetch.query, prefetch.future)
+    return (best[1], False, best[2]) if best else None
+
+
+def prefetched_result(query: str) -> Optional[str]:
+    """
+    Results of a prefetched query matching `query`, waiting for it if it is still running.
+    None when nothing matches or the prefetch failed or found nothing.
+    """
+    match = _best_match(query, float(os.getenv("PREFETCH_MATCH_THRESHOLD", DEFAULT_MATCH_THRESHOLD)),
+                        get_search_cache().ttl_seconds)
+    if match is None:
+        return None
+    prefetched, same_query, future = match
+    try:
+        results = future.result(timeout=float(os.getenv("PREFETCH_WAIT", DEFAULT_WAIT_SECONDS)))
+    except FutureTimeout:
+        print(f"Prefetch: '{prefetched}' is still running; searching '{query}' directly.")
+        return None
+    except Exception:
+        return None
+    if not results or NO_RESULTS_MARKER in results:
+        return None
+    record_prefetch_use("same" if same_query else "related")
+    if same_query:
+        return results
+    return f"(Results for the closely related search '{prefetched}'.)\n{results}"
+
+# --- Prefetcher ---
+
+def _prefetch_disabled() -> Optional[str]:
+    """Why prefetching should be skipped for this run, or None."""
+    from cassette import get_active_cassette
+
+    if os.getenv("RESEARCH_MODE", "local-first").strip().lower() == "local":
+        return "RESEARCH_MODE=local"
+    cassette = get_active_cassette()
+    if cassette is not None and cassette.mode == "replay" and not cassette.live_tools:
+        return "tool calls are replayed from a cassette"
+    return None
+
+
+class ResearchPrefetcher:
+    """Searches a run's templated queries concurrently at kickoff, warming the search cache."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queries: int = DEFAULT_MAX_QUERIES):
+        self.workers = max(1, workers)
+        self.max_queries = max_queries
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResearchPrefetcher"]:
+        """The prefetcher configured by PREFETCH_* variables, or None when prefetching is turned off."""
+        if os.getenv("RESEARCH_PREFETCH", "true").lower() == "false":
+            return None
+        return cls(int(os.getenv("PREFETCH_WORKERS", str(DEFAULT_WORKERS))),
+                   int(os.getenv("PREFETCH_MAX_QUERIES", str(DEFAULT_MAX_QUERIES))))
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+            return self._pool
+
+    @staticmethod
+    def _fetch(query: str) -> str:
+        if os.getenv("RESEARCH_MODE", "local-first").strip().lower() != "web" and local_findings(query) is not None:
+            record_prefetch_query("local") # research_search will answer this one from earlier reports
+            return ""
+        cached = get_search_cache().get(query, record=False)
+        if cached is not None:
+            record_prefetch_query("cached")
+            return cached
+        try:
+            results = search_and_store(query)
+        except Exception as e:
+            record_prefetch_query("failed")
+            print(f"Prefetch: search for '{query}' failed: {type(e).__name__}: {e}")
+            raise
+        record_prefetch_query("fetched" if results and NO_RESULTS_MARKER not in results else "empty")
+        return results
+
+    def start(self, inputs: Dict[str, Any]) -> List[str]:
+        """Starts searching the queries for `inputs` in the background and returns them. Never raises."""
+        try:
+            reason = _prefetch_disabled()
+            if reason:
+                print(f"Prefetch: skipped ({reason}).")
+                return []
+            queries = expand_queries(inputs, self.max_queries)
+            name = next((str(inputs[key]) for key in NAME_KEYS if inputs.get(key)), "")
+            pool = self._executor()
+            for query in queries:
+                # Copy the caller's context so the run's metrics see the prefetch
+                _track(query, name, pool.submit(contextvars.copy_context().run, self._fetch, query))
+            if queries:
+                print(f"Prefetch: searching {len(queries)} queries in the background ({self.workers} at a time).")
+            return queries
+        except Exception as e:
+            print(f"Warning: Research prefetch could not start: {type(e).__name__}: {e}")
+            return []
@@ -0,0 +1,383 @@
+"""
+Local full-text index over past analysis reports.
+
+Reports written by app.py and advance_agent.py (the top-level *_report*.txt files
+and reports/) are split into task sections, cut into overlapping chunks of a few
+hundred words and stored in an SQLite FTS5 table ranked with BM25. Parsing and
+chunking run on a process pool, so large report folders are ingested on all
+cores; files whose size and modification time are unchanged are skipped.
+
+The research tools call `research_search`, which answers from this index first
+and only falls back to the web search when local coverage is thin (research.py
+runs several queries through it at once).
+
+Usage:
+    python report_index.py build                  # index *.txt here and in reports/
+    python report_index.py build batch_reports --workers 8
+    python report_index.py search "HDFC Bank digital strategy"
+
+Configuration (environment variables, all optional):
+    REPORT_INDEX_PATH          SQLite file location (default: .report_index.sqlite3)
+    RESEARCH_MODE              local-first (default), web, or local
+    REPORT_INDEX_MIN_HITS      Chunks that must cover the query before the web is skipped (default: 3)
+    REPORT_INDEX_MIN_COVERAGE  Share of query terms a chunk must contain to count (default: 0.6)
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from search_cache import cached_search
+from text_terms import FUNCTION_WORDS
+
+DEFAULT_INDEX_PATH = ".report_index.sqlite3"
+DEFAULT_SOURCES = [".", "reports"]
+CHUNK_WORDS = 220
+CHUNK_OVERLAP = 40
+
+_STOPWORDS = FUNCTION_WORDS | {"as", "be", "how", "info", "information", "it", "latest", "or", "recent"}
+
+# Words that say what kind of company a name belongs to, not which one ("HDFC Bank", "NVIDIA Corp")
+_GENERIC_NAME_WORDS = {
+    "bank", "co", "company", "corp", "corporation", "group", "holdings", "inc", "industries",
+    "limited", "llc", "ltd", "plc",
+}
+_TASK_HEADING = re.compile(r"^(?:### )?Task(?: \d+)?: (.+)$", re.MULTILINE)
+_METADATA_HEADING = re.compile(r"^(?:## Execution Metadata|--- Execution Metadata ---)", re.MULTILINE)
+_NOISE_LINE = re.compile(r"^(?:={5,}|-{5,}|\*\*Output:\*\*|Key Findings:|\*Executed by: .*\*)$")
+
+
+class ReportHit(NamedTuple):
+    score: float
+    company: str
+    industry: str
+    generated_on: str
+    task: str
+    path: str
+    text: str
+
+# --- Parsing and Chunking ---
+
+def query_terms(text: str) -> List[str]:
+    return [word for word in re.findall(r"[\w&]+", (text or "").lower()) if len(word) > 1 and word not in _STOPWORDS]
+
+
+def parse_report(text: str) -> Dict[str, Any]:
+    """Splits a text report (either app's format) into its header fields and task sections."""
+    header = text[:600]
+    company = (re.search(r"^# Strategic Analysis Report: (.+)$", header, re.MULTILINE)
+               or re.search(r"^(.+?) Strategic Analysis Report\s*$", header, re.MULTILINE))
+    industry = re.search(r"^(?:## )?Industry: (.+)$", header, re.MULTILINE)
+    generated = re.search(r"^Generated [Oo]n: (.+)$", header, re.MULTILINE)
+    body = _METADATA_HEADING.split(text, 1)[0]
+    headings = list(_TASK_HEADING.finditer(body))
+    sections = []
+    for position, heading in enumerate(headings):
+        end = headings[position + 1].start() if position + 1 < len(headings) else len(body)
+        lines = []
+        for line in body[heading.end():end].split("\n"):
+            line = line.strip()
+            if line.startswith("- "):
+                line = line[2:].strip()
+            if line and not _NOISE_LINE.match(line):
+                lines.append(line)
+        if lines:
+            sections.append((heading.group(1).strip().rstrip(":"), "\n".join(lines)))
+    return {
+        "company": company.group(1).strip() if company else "",
+        "industry": industry.group(1).strip() if industry else "",
+        "generated_on": generated.group(1).strip() if generated else "",
+        "sections": sections,
+    }
+
+
+def chunk_text(text: str, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Cuts text into windows of about `size` words, overlapping by `overlap`, keeping line breaks."""
+    words = re.findall(r"\S+\n?|\n", text)
+    if len(words) <= size:
+        return [text]
+    chunks, start = [], 0
+    while start < len(words):
+        chunks.append(" ".join(word.rstrip("\n") for word in words[start:start + size]).strip())
+        if start + size >= len(words):
+            break
+        start += size - overlap
+    return chunks
+
+
+def prepare_report(path: str) -> Tuple[str, Dict[str, Any], List[Tuple[str, str]]]:
+    """Worker step: reads and chunks one report. Returns (path, header fields, [(task, chunk)])."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        report = parse_report(f.read())
+    chunks = [(task, chunk) for task, section in report.pop("sections") for chunk in chunk_text(section)]
+    return path, report, chunks
+
+
+def find_reports(sources: Iterable[str]) -> List[str]:
+    """Report .txt files in the given files/directories (not recursive)."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(glob.glob(os.path.join(source, "*.txt")))
+        elif os.path.isfile(source):
+            paths.append(source)
+    return sorted({os.path.abspath(path) for path in paths if not path.endswith("requirements.txt")})
+
+# --- Index ---
+
+class ReportIndex:
+    """FTS5 index of report chunks, with per-file bookkeeping for incremental rebuilds."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("REPORT_INDEX_PATH", DEFAULT_INDEX_PATH)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS report_files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, company TEXT,"
+            " industry TEXT, generated_on TEXT, chunks INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS report_chunks USING fts5("
+            " text, task, company, industry UNINDEXED, generated_on UNINDEXED, path UNINDEXED,"
+            " tokenize='porter unicode61')"
+        )
+        self._conn.commit()
+
+    def _is_current(self, path: str) -> bool:
+        stat = os.stat(path)
+        row = self._conn.execute("SELECT size, mtime FROM report_files WHERE path = ?", (path,)).fetchone()
+        return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def _store(self, path: str, report: Dict[str, Any], chunks: List[Tuple[str, str]]) -> None:
+        stat = os.stat(path)
+        self._conn.execute("DELETE FROM report_chunks WHERE path = ?", (path,))
+        self._conn.executemany(
+            "INSERT INTO report_chunks (text, task, company, industry, generated_on, path) VALUES (?, ?, ?, ?, ?, ?)",
+            [(chunk, task, report["company"], report["industry"], report["generated_on"], path) for task, chunk in chunks],
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO report_files (path, size, mtime, company, industry, generated_on, chunks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, report["company"], report["industry"], report["generated_on"], len(chunks)),
+        )
+
+    def build(self, sources: Iterable[str] = DEFAULT_SOURCES, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Indexes new and changed reports under `sources`. Files are parsed and chunked on
+        `workers` processes (default: all cores); this process does all the writing.
+        """
+        with self._lock:
+            paths = [path for path in find_reports(sources) if not self._is_current(path)]
+        stats = {"files": 0, "chunks": 0, "skipped": 0}
+        if not paths:
+            return stats
+        workers = max(1, workers or os.cpu_count() or 1)
+        if workers == 1 or len(paths) == 1:
+            prepared = map(prepare_report, paths)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(paths)))
+            prepared = pool.map(prepare_report, paths, chunksize=max(1, len(paths) // (workers * 4)))
+        try:
+            with self._lock:
+                for path, report, chunks in prepared:
+                    self._store(path, report, chunks) # Files without task sections are remembered as empty
+                    if not chunks:
+                        stats["skipped"] += 1
+                        continue
+                    stats["files"] += 1
+                    stats["chunks"] += len(chunks)
+                self._conn.commit()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return stats
+
+    def add_report(self, path: str) -> int:
+        """Indexes (or re-indexes) one report in this process. Returns the number of chunks stored."""
+        path, report, chunks = prepare_report(os.path.abspath(path))
+        with self._lock:
+            if chunks:
+                self._store(path, report, chunks)
+                self._conn.commit()
+        return len(chunks)
+
+    def search(self, query: str, limit: int = 5, company: Optional[str] = None) -> List[ReportHit]:
+        """Best-matching chunks for the query, by BM25 (any query term may match)."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(terms))
+        sql = ("SELECT bm25(report_chunks, 1.0, 2.0, 3.0), company, industry, generated_on, task, path, text"
+               " FROM report_chunks WHERE report_chunks MATCH ?")
+        params: List[Any] = [match]
+        if company:
+            sql += " AND company = ? COLLATE NOCASE"
+            params.append(company)
+        sql += " ORDER BY bm25(report_chunks, 1.0, 2.0, 3.0) LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                print(f"Warning: Report index query failed for '{query}': {e}")
+                return []
+        # bm25() is lower-is-better; flip it so higher scores mean better matches
+        return [ReportHit(-row[0], *row[1:]) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            files, chunks = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM report_files WHERE chunks > 0").fetchone()
+        return {"files": files, "chunks": chunks}
+
+# --- Local-first Research ---
+
+def _covers(term: str, words: set) -> bool:
+    return term in words or any(word.startswith(term[:max(4, len(term) - 2)]) for word in words)
+
+
+def term_coverage(query: str, text: str) -> float:
+    """Share of the query's terms that appear in the text (prefix match, so plurals count)."""
+    terms = set(query_terms(query))
+    if not terms:
+        return 0.0
+    words = set(query_terms(text))
+    return sum(1 for term in terms if _covers(term, words)) / len(terms)
+
+
+def subject_terms(query: str) -> List[str]:
+    """
+    Terms naming who the query is about: its capitalised words and acronyms, less stopwords
+    and generic company words ("ICICI Bank results" -> ["icici"]).
+    """
+    terms = [word.lower() for word in re.findall(r"[\w&]+", query or "") if word[:1].isupper()]
+    return [term for term in dict.fromkeys(terms)
+            if len(term) > 1 and term not in _STOPWORDS and term not in _GENERIC_NAME_WORDS]
+
+
+def name_terms(name: str) -> List[str]:
+    """The terms of a company name that tell it apart from other companies ("Axis Bank Limited" -> ["axis"])."""
+    return [term for term in query_terms(name) if term not in _GENERIC_NAME_WORDS]
+
+
+def matches_subject(query: str, hit: ReportHit) -> bool:
+    """
+    Whether the hit is about the query's subject: one subject term must name the hit's company
+    and the rest must appear in its company or text. Queries without a subject match any hit.
+    """
+    subject = subject_terms(query)
+    if not subject:
+        return True
+    name = set(name_terms(hit.company))
+    if not any(_covers(term, name) for term in subject):
+        return False
+    words = name | set(query_terms(hit.text))
+    return all(_covers(term, words) for term in subject)
+
+
+def format_local_findings(hits: List[ReportHit]) -> str:
+    lines = ["Findings from earlier analysis reports (local index):"]
+    for number, hit in enumerate(hits, 1):
+        source = os.path.basename(hit.path)
+        lines.append(f"\n[{number}] {hit.company or 'Unknown company'} - {hit.task} ({source}, {hit.generated_on or 'undated'})")
+        lines.append(hit.text)
+    return "\n".join(lines)
+
+
+_index: Optional[ReportIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_report_index() -> Optional[ReportIndex]:
+    """The process-wide report index, or None when it has not been built yet."""
+    global _index
+    if _index is None:
+        path = os.getenv("REPORT_INDEX_PATH", DEFAULT_INDEX_PATH)
+        if not os.path.exists(path):
+            return None
+        with _index_lock:
+            if _index is None:
+                _index = ReportIndex(path)
+    return _index
+
+
+def local_findings(query: str) -> Optional[str]:
+    """
+    Local findings for the query, or None when too few indexed chunks cover it. Chunks only
+    count when they are about the company the query names, so a query about a company that
+    was never analysed goes to the web instead of borrowing another company's report.
+    """
+    index = get_report_index()
+    if index is None:
+        return None
+    min_hits = int(os.getenv("REPORT_INDEX_MIN_HITS", "3"))
+    min_coverage = float(os.getenv("REPORT_INDEX_MIN_COVERAGE", "0.6"))
+    hits = [hit for hit in index.search(query, limit=max(min_hits * 2, 5))
+            if term_coverage(query, hit.text) >= min_coverage and matches_subject(query, hit)]
+    if len(hits) < min_hits:
+        return None
+    return format_local_findings(hits[:max(min_hits, 3)])
+
+
+def research_search(query: str) -> str:
+    """
+    Answers a research query from earlier reports when they cover it well enough, otherwise
+    searches the web (through the search cache). RESEARCH_MODE=web skips the index and
+    RESEARCH_MODE=local never goes to the web.
+    """
+    mode = os.getenv("RESEARCH_MODE", "local-first").strip().lower()
+    if mode != "web":
+        findings = local_findings(query)
+        if findings is not None:
+            print(f"Research: answered '{query}' from the local report index.")
+            return findings
+        if mode == "local":
+            return f"No good local results found for '{query}' in the report index."
+    return cached_search(query)
+
+
+def index_new_report(path: Optional[str]) -> None:
+    """Adds a freshly written report to the index, if one has been built. Never raises."""
+    index = get_report_index()
+    if index is None or not path:
+        return
+    try:
+        index.add_report(path)
+    except Exception as e:
+        print(f"Warning: Could not add '{path}' to the report index: {e}")
+
+# --- Command Line ---
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and query the local report index.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Index new or changed reports.")
+    build.add_argument("sources", nargs="*", default=DEFAULT_SOURCES, help="Report files or directories (default: . and reports/).")
+    build.add_argument("--workers", type=int, default=None, help="Processes used to parse reports (default: all cores).")
+    search = subcommands.add_parser("search", help="Show the best-matching report chunks.")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=5)
+    search.add_argument("--company")
+    args = parser.parse_args()
+
+    index = ReportIndex()
+    if args.command == "build":
+        stats = index.build(args.sources, args.workers)
+        totals = index.stats()
+        print(f"Indexed {stats['files']} new or changed reports ({stats['chunks']} chunks, {stats['skipped']} skipped). "
+              f"Index now holds {totals['files']} reports / {totals['chunks']} chunks in '{index.path}'.")
+    else:
+        for hit in index.search(args.query, args.limit, args.company):
+            print(f"{hit.score:7.2f}  {hit.company} - {hit.task[:70]} ({os.path.basename(hit.path)})")
+            print(f"         {hit.text[:200]}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Streaming text reports.
+
+The report file is opened before the crew starts. The header is written first,
+and each task's section is appended (and echoed to stdout) as soon as that task,
+and every task before it, has finished. A metadata footer is written at the end.
+Sections keep task order, so the file matches a report written after the run,
+but readers get early sections while later tasks are still running and no
+complete report string is ever built in memory.
+"""
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional
+
+if TYPE_CHECKING:
+    from crewai.tasks.task_output import TaskOutput
+
+SectionFormatter = Callable[[int, "TaskOutput"], Iterable[str]]
+
+
+class StreamingReportWriter:
+    """Appends report sections to `path` in task order as task outputs arrive."""
+
+    def __init__(self, path: str, format_section: SectionFormatter, task_count: int, echo: bool = True):
+        self.path = path
+        self.format_section = format_section
+        self.task_count = task_count
+        self.echo = echo
+        self.next_index = 0
+        self.sections_written = 0
+        self._pending: Dict[int, "TaskOutput"] = {} # Finished out of order, waiting for earlier tasks
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _write(self, lines: Iterable[str]) -> None:
+        text = "".join(f"{line}\n" for line in lines)
+        self._file.write(text)
+        self._file.flush()
+        if self.echo:
+            print(text, end="")
+
+    def start(self, header_lines: Iterable[str]) -> "StreamingReportWriter":
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write(header_lines)
+        print(f"Streaming report to '{self.path}'.")
+        return self
+
+    def add(self, index: int, output: "TaskOutput") -> None:
+        """Task completion callback: writes the section now, or once the tasks before it are written."""
+        with self._lock:
+            if self._file is None or index < self.next_index:
+                return
+            self._pending[index] = output
+            while self.next_index in self._pending:
+                ready = self._pending.pop(self.next_index)
+                self._write(self.format_section(self.next_index, ready))
+                self.sections_written += 1
+                self.next_index += 1
+
+    @property
+    def complete(self) -> bool:
+        return self.sections_written >= self.task_count
+
+    def finish(self, footer_lines: Iterable[str]) -> Optional[str]:
+        """Writes the footer and closes the file. Returns the report path, or None if it was never opened."""
+        with self._lock:
+            if self._file is None:
+                return None
+            # Tasks that finished after a gap (e.g. a failed task) are still worth keeping
+            for index in sorted(self._pending):
+                self._write(self.format_section(index, self._pending.pop(index)))
+                self.sections_written += 1
+            if not self.complete:
+                missing = self.task_count - self.sections_written
+                self._write([f"\n!! {missing} task section(s) missing: the run ended before they were written."])
+            self._write(footer_lines)
+            self._file.close()
+            self._file = None
+        print(f"Report '{self.path}' completed.")
+        return self.path
+
+    def abort(self, reason: str) -> Optional[str]:
+        """Closes a report whose run failed, keeping the sections already written."""
+        return self.finish([f"\n!! Run did not finish: {reason}"])
@@ -0,0 +1,84 @@
+"""
+Multi-query research for the Advanced Research Tool.
+
+Given a JSON list of queries (or {"queries": [...]}), `research_fanout` runs each
+one through `report_index.research_search` on a bounded thread pool and merges
+the results into one response with a section per query. Repeated queries are
+searched once. Snippets already shown under an earlier query are left out with
+the same MinHash matching snippet_dedup.py applies across a run.
+
+Configuration (environment variables, all optional):
+    RESEARCH_FANOUT_WORKERS    Queries of one fan-out call searched at the same time (default: 4)
+    RESEARCH_FANOUT_MAX        Queries accepted per fan-out call; the rest are ignored (default: 6)
+"""
+import contextvars
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from report_index import research_search
+from snippet_dedup import SnippetIndex
+
+
+def parse_query_list(text: str) -> Optional[List[str]]:
+    """Returns the queries if the tool input is a JSON list of strings (or {"queries": [...]}), else None."""
+    stripped = (text or "").strip()
+    if not stripped.startswith(("[", "{")):
+        return None
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("queries")
+    if isinstance(data, list) and data and all(isinstance(item, str) for item in data):
+        return data
+    return None
+
+
+def research_fanout(queries: List[str]) -> str:
+    """
+    Researches several queries in one call: each goes through `research_search` on a bounded
+    thread pool, and the results come back as one response with a section per query.
+    """
+    unique: List[str] = []
+    for query in (" ".join(q.split()) for q in queries):
+        if query and query.lower() not in (u.lower() for u in unique):
+            unique.append(query)
+    limit = int(os.getenv("RESEARCH_FANOUT_MAX", "6"))
+    selected, ignored = unique[:limit], unique[limit:]
+    if not selected:
+        return "Error: No research queries given."
+
+    def run(query: str) -> str:
+        try:
+            return research_search(query)
+        except Exception as e:
+            return f"Error: search failed ({type(e).__name__}: {e})"
+
+    workers = max(1, min(int(os.getenv("RESEARCH_FANOUT_WORKERS", "4")), len(selected)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="research") as pool:
+        # Copy the caller's context so each search is still charged to the current run and task
+        results = list(pool.map(lambda query: contextvars.copy_context().run(run, query), selected))
+    print(f"Research: {len(selected)} queries searched together ({workers} at a time).")
+
+    lines = [f"Research findings for {len(selected)} queries:"]
+    shown = SnippetIndex.from_env() # Only this response's sections; the run-wide index is applied by the tool
+    failures = 0
+    for number, (query, result) in enumerate(zip(selected, results), 1):
+        lines.append(f"\n## {number}. {query}")
+        if result.startswith("Error"):
+            failures += 1
+            lines.append(result)
+            continue
+        text, earlier, _, _ = shown.filter(result, query)
+        dropped = sum(earlier.values())
+        lines.append(text.strip() or "(Everything found was already shown above.)")
+        if dropped:
+            lines.append(f"({dropped} snippet(s) already shown above were left out.)")
+    if ignored:
+        lines.append(f"\nNot searched (limit of {limit} queries per call): {'; '.join(ignored)}")
+    if failures == len(selected):
+        return "Error: every research query failed.\n" + "\n".join(lines)
+    return "\n".join(lines)
@@ -0,0 +1,363 @@
+"""
+Append-only store of crew runs.
+
+Every finished run (completed or failed) is appended to a local SQLite database
+together with its per-task outputs. Rows are never updated or deleted; a resumed
+run is stored as a new attempt of the same run ID. Runs are indexed by company,
+industry, start date and task name, and the query helpers stream rows from the
+database instead of loading the whole history into memory.
+
+A task is stored under its crewAI `name` when it has one, and otherwise under
+its position in the crew (task_1, task_2, ...). The tasks in app.py and
+advance_agent.py are unnamed, so their outputs are found by position: in
+app.py, task_2 is the financial analysis.
+
+The apps do not write a crew_results.json results file; this store is their
+results history. Results files from older versions can be imported with
+`python run_store.py import crew_results.json`.
+
+Configuration (environment variables, all optional):
+    RUN_STORE_PATH   SQLite file location (default: .run_store.sqlite3)
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from checkpoint import new_run_id
+
+DEFAULT_STORE_PATH = ".run_store.sqlite3"
+FETCH_SIZE = 200 # Rows pulled from SQLite per round trip while streaming
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " run_id TEXT NOT NULL,"
+    " attempt INTEGER NOT NULL,"
+    " app TEXT NOT NULL,"
+    " company TEXT,"
+    " industry TEXT,"
+    " status TEXT NOT NULL,"
+    " started_at TEXT NOT NULL,"
+    " finished_at TEXT NOT NULL,"
+    " report_path TEXT,"
+    " error TEXT,"
+    " inputs TEXT NOT NULL,"
+    " metrics TEXT,"
+    " UNIQUE (run_id, attempt))",
+    "CREATE TABLE IF NOT EXISTS run_tasks ("
+    " run_seq INTEGER NOT NULL REFERENCES runs(seq),"
+    " task_index INTEGER NOT NULL,"
+    " task_name TEXT NOT NULL,"
+    " agent TEXT,"
+    " description TEXT,"
+    " output TEXT NOT NULL,"
+    " PRIMARY KEY (run_seq, task_index))",
+    "CREATE INDEX IF NOT EXISTS idx_runs_company ON runs(company COLLATE NOCASE, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_industry ON runs(industry COLLATE NOCASE, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_started_at ON runs(started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_run_tasks_name ON run_tasks(task_name, run_seq)",
+]
+# History is append-only: refuse any change to rows already written
+for _table in ("runs", "run_tasks"):
+    for _action in ("UPDATE", "DELETE"):
+        _SCHEMA.append(
+            f"CREATE TRIGGER IF NOT EXISTS {_table}_no_{_action.lower()} BEFORE {_action} ON {_table} "
+            f"BEGIN SELECT RAISE(ABORT, 'the run store is append-only'); END"
+        )
+
+
+def _as_timestamp(value: Any) -> Optional[str]:
+    """ISO string for a datetime or date-like string, so range filters compare correctly."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return datetime.fromisoformat(str(value)).isoformat()
+
+
+def run_company(inputs: Dict[str, Any]) -> Optional[str]:
+    """The analysed company: app.py uses `company_name`, advance_agent.py `target_name`."""
+    return inputs.get("company_name") or inputs.get("target_name")
+
+
+class RunStore:
+    """SQLite-backed, append-only run history shared by threads and worker processes."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("RUN_STORE_PATH", DEFAULT_STORE_PATH)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call: writers from any thread or process are
+        # serialized by SQLite's own lock, and a streaming read never blocks an append.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def append(self, run_id: str, app: str, inputs: Dict[str, Any], tasks: List[Dict[str, Any]],
+               status: str = "completed", started_at: Any = None, report_path: Optional[str] = None,
+               metrics: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> int:
+        """
+        Appends one run attempt with its task outputs in a single transaction.
+        `tasks` holds dicts with index, name, agent, description and output. Returns the attempt number.
+        """
+        finished_at = datetime.now().isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE") # Take the write lock before reading the attempt count
+            attempt = conn.execute("SELECT COUNT(*) FROM runs WHERE run_id = ?", (run_id,)).fetchone()[0] + 1
+            cursor = conn.execute(
+                "INSERT INTO runs (run_id, attempt, app, company, industry, status, started_at, finished_at,"
+                " report_path, error, inputs, metrics) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, attempt, app, run_company(inputs), inputs.get("industry"), status,
+                 _as_timestamp(started_at) or finished_at, finished_at, report_path, error,
+                 json.dumps(inputs, default=str), json.dumps(metrics, default=str) if metrics is not None else None),
+            )
+            conn.executemany(
+                "INSERT INTO run_tasks (run_seq, task_index, task_name, agent, description, output) VALUES (?, ?, ?, ?, ?, ?)",
+                [(cursor.lastrowid, task["index"], task["name"], task.get("agent"), task.get("description"), str(task["output"]))
+                 for task in tasks],
+            )
+            conn.execute("COMMIT")
+            return attempt
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _stream(self, sql: str, params: List[Any]) -> Iterator[sqlite3.Row]:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _run_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = {key: row[key] for key in row.keys() if key != "seq"}
+        record["inputs"] = json.loads(record["inputs"])
+        record["metrics"] = json.loads(record["metrics"]) if record["metrics"] else None
+        return record
+
+    def runs(self, company: Optional[str] = None, industry: Optional[str] = None, since: Any = None,
+             until: Any = None, task: Optional[str] = None, status: Optional[str] = None,
+             app: Optional[str] = None, latest_only: bool = True, include_tasks: bool = False,
+             limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streams matching runs, newest first. Company and industry match case-insensitively,
+        `since`/`until` bound the start time, and `task` keeps runs that produced that task.
+        With `latest_only`, earlier attempts of resumed runs are skipped.
+        """
+        where, params = [], []
+        if company:
+            where.append("r.company = ? COLLATE NOCASE")
+            params.append(company)
+        if industry:
+            where.append("r.industry = ? COLLATE NOCASE")
+            params.append(industry)
+        if since is not None:
+            where.append("r.started_at >= ?")
+            params.append(_as_timestamp(since))
+        if until is not None:
+            where.append("r.started_at < ?")
+            params.append(_as_timestamp(until))
+        if status:
+            where.append("r.status = ?")
+            params.append(status)
+        if app:
+            where.append("r.app = ?")
+            params.append(app)
+        if task:
+            where.append("EXISTS (SELECT 1 FROM run_tasks t WHERE t.run_seq = r.seq AND t.task_name = ?)")
+            params.append(task)
+        if latest_only:
+            where.append("r.attempt = (SELECT MAX(attempt) FROM runs l WHERE l.run_id = r.run_id)")
+        sql = "SELECT r.* FROM runs r"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY r.started_at DESC, r.seq DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for row in self._stream(sql, params):
+            record = self._run_record(row)
+            if include_tasks:
+                record["tasks"] = list(self._tasks_of(row["seq"]))
+            yield record
+
+    def _tasks_of(self, run_seq: int) -> Iterator[Dict[str, Any]]:
+        for row in self._stream(
+            "SELECT task_index, task_name, agent, description, output FROM run_tasks WHERE run_seq = ? ORDER BY task_index",
+            [run_seq],
+        ):
+            yield dict(row)
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """The latest attempt of a run, with its task outputs."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM runs WHERE run_id = ? ORDER BY attempt DESC LIMIT 1", (run_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        record = self._run_record(row)
+        record["tasks"] = list(self._tasks_of(row["seq"]))
+        return record
+
+    def task_outputs(self, task: str, company: Optional[str] = None, industry: Optional[str] = None,
+                     since: Any = None, until: Any = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Streams one task's output across runs, newest first, e.g. every app.py `task_2` (financial analysis) for a company."""
+        where, params = ["t.task_name = ?", "r.status = 'completed'"], [task]
+        if company:
+            where.append("r.company = ? COLLATE NOCASE")
+            params.append(company)
+        if industry:
+            where.append("r.industry = ? COLLATE NOCASE")
+            params.append(industry)
+        if since is not None:
+            where.append("r.started_at >= ?")
+            params.append(_as_timestamp(since))
+        if until is not None:
+            where.append("r.started_at < ?")
+            params.append(_as_timestamp(until))
+        sql = ("SELECT r.run_id, r.attempt, r.company, r.industry, r.started_at, t.task_index, t.task_name, t.agent, t.output"
+               " FROM run_tasks t JOIN runs r ON r.seq = t.run_seq WHERE " + " AND ".join(where) +
+               " ORDER BY r.started_at DESC, r.seq DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for row in self._stream(sql, params):
+            yield dict(row)
+
+    def import_results_json(self, path: str, app: str = "advance_agent", inputs: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Imports a legacy crew_results.json as a completed run. The file does not record the run's
+        inputs, so pass them (e.g. target_name and industry) to make it findable by company. Returns the new run ID.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        metadata = data.get("execution_metadata", {}) or {}
+        inputs = inputs or {}
+        tasks = [
+            {"index": index, "name": f"task_{index + 1}", "agent": item.get("agent"),
+             "description": item.get("task"), "output": item.get("output", "")}
+            for index, item in enumerate(data.get("results", []))
+        ]
+        run_id = new_run_id()
+        self.append(run_id, app, inputs, tasks, started_at=data.get("execution_time"),
+                    metrics={"execution_metadata": metadata, "imported_from": os.path.abspath(path)})
+        return run_id
+
+# --- Recording Crew Runs ---
+
+_store: Optional[RunStore] = None
+_store_lock = threading.Lock()
+
+
+def get_run_store() -> RunStore:
+    """Returns the process-wide run store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RunStore()
+    return _store
+
+
+def crew_task_records(crew) -> List[Dict[str, Any]]:
+    """Task records for every task of the crew that has an output (all of them, unless the run failed)."""
+    return [
+        {"index": index, "name": task.name or f"task_{index + 1}",
+         "agent": task.agent.role if task.agent else None,
+         "description": task.description, "output": task.output.raw}
+        for index, task in enumerate(crew.tasks) if task.output is not None
+    ]
+
+
+def record_crew_run(run_id: str, app: str, inputs: Dict[str, Any], crew, status: str = "completed",
+                    started_at: Any = None, report_path: Optional[str] = None,
+                    metrics: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bool:
+    """Appends a finished crew run to the process-wide store. Never raises; returns whether it was stored."""
+    try:
+        get_run_store().append(run_id, app, inputs, crew_task_records(crew), status=status, started_at=started_at,
+                               report_path=report_path, metrics=metrics, error=error)
+        return True
+    except Exception as e:
+        print(f"Warning: Could not record run {run_id} in the run store: {type(e).__name__}: {e}")
+        return False
+
+# --- Command Line ---
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query and import the run history.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    listing = subcommands.add_parser("list", help="List runs, newest first.")
+    listing.add_argument("--company")
+    listing.add_argument("--industry")
+    listing.add_argument("--since", help="ISO date or timestamp (inclusive).")
+    listing.add_argument("--until", help="ISO date or timestamp (exclusive).")
+    listing.add_argument("--task", help="Only runs that produced this task name (task_<n> for unnamed tasks).")
+    listing.add_argument("--status")
+    listing.add_argument("--all-attempts", action="store_true", help="Include earlier attempts of resumed runs.")
+    listing.add_argument("--limit", type=int)
+    listing.add_argument("--json", action="store_true", help="Print one JSON object per line.")
+    show = subcommands.add_parser("show", help="Print one run with its task outputs as JSON.")
+    show.add_argument("run_id")
+    outputs = subcommands.add_parser("task", help="Print one task's output across runs as JSON lines.")
+    outputs.add_argument("name", help="Task name; unnamed tasks are task_1, task_2, ... by position.")
+    outputs.add_argument("--company")
+    outputs.add_argument("--industry")
+    outputs.add_argument("--since")
+    outputs.add_argument("--until")
+    outputs.add_argument("--limit", type=int)
+    importer = subcommands.add_parser("import", help="Import a legacy crew_results.json.")
+    importer.add_argument("path")
+    importer.add_argument("--app", default="advance_agent")
+    importer.add_argument("--company", help="Company the results are about (not recorded in crew_results.json).")
+    importer.add_argument("--industry")
+    args = parser.parse_args()
+
+    store = get_run_store()
+    if args.command == "list":
+        for run in store.runs(company=args.company, industry=args.industry, since=args.since, until=args.until,
+                              task=args.task, status=args.status, latest_only=not args.all_attempts, limit=args.limit):
+            if args.json:
+                print(json.dumps(run, default=str))
+            else:
+                print(f"{run['run_id']}  #{run['attempt']}  {run['status']:<9}  {run['started_at'][:19]}  "
+                      f"{run['app']:<13}  {run['company'] or '-'} ({run['industry'] or '-'})  {run['report_path'] or ''}")
+    elif args.command == "show":
+        run = store.get(args.run_id)
+        if run is None:
+            raise SystemExit(f"No run '{args.run_id}' in '{store.path}'.")
+        print(json.dumps(run, indent=2, default=str))
+    elif args.command == "task":
+        for row in store.task_outputs(args.name, company=args.company, industry=args.industry,
+                                      since=args.since, until=args.until, limit=args.limit):
+            print(json.dumps(row, default=str))
+    else:
+        inputs = {key: value for key, value in (("company_name" if args.app == "app" else "target_name", args.company),
+                                                ("industry", args.industry)) if value}
+        print(f"Imported '{args.path}' as run {store.import_results_json(args.path, args.app, inputs)}.")
+
+
+if __name__ == "__main__":
+    main()
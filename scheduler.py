@@ -0,0 +1,281 @@
+import contextlib
+import contextvars
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from crewai import Crew, Process, Task
+from crewai.crews.crew_output import CrewOutput
+from crewai.tasks.conditional_task import ConditionalTask
+from crewai.tasks.task_output import TaskOutput
+from pydantic import Field
+
+from metrics import agent_token_usage, record_task, record_task_cache
+from task_cache import task_cache_key
+from token_budget import charge_task_llm_tokens, task_scope
+
+# --- Task Graph Helpers ---
+
+def build_task_graph(tasks: List[Task]) -> Dict[int, List[int]]:
+    """
+    Maps each task index to the indices of the tasks it depends on.
+    An explicit `context` list (even an empty one) is the full dependency set.
+    Tasks without `context` keep crewAI's sequential semantics and depend on
+    the task listed right before them.
+    """
+    position = {id(task): index for index, task in enumerate(tasks)}
+    graph: Dict[int, List[int]] = {}
+    for index, task in enumerate(tasks):
+        if task.context is None:
+            graph[index] = [index - 1] if index > 0 else []
+            continue
+        dependencies = []
+        for upstream in task.context:
+            upstream_index = position.get(id(upstream))
+            if upstream_index is None:
+                raise ValueError(f"Task '{task.description[:60]}...' uses a context task that is not part of the crew.")
+            if upstream_index >= index:
+                raise ValueError(f"Task '{task.description[:60]}...' depends on a task listed after it.")
+            dependencies.append(upstream_index)
+        graph[index] = sorted(set(dependencies))
+    return graph
+
+
+def task_levels(graph: Dict[int, List[int]]) -> List[List[int]]:
+    """Groups task indices into stages; every task in a stage only depends on earlier stages."""
+    level: Dict[int, int] = {}
+    for index in sorted(graph):
+        level[index] = max((level[dep] + 1 for dep in graph[index]), default=0)
+    stages: List[List[int]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for index, stage in level.items():
+        stages[stage].append(index)
+    return stages
+
+@contextlib.contextmanager
+def preserve_std_streams():
+    """
+    Restores sys.stdout/sys.stderr on exit. crewAI swaps the process-wide streams around
+    LLM calls and memory writes; when tasks overlap, the swaps can interleave and leave
+    stdout pointing at a discarded buffer, silently swallowing later output.
+    """
+    stdout, stderr = sys.stdout, sys.stderr
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+# --- Parallel Crew ---
+
+class ParallelCrew(Crew):
+    """
+    A Crew that executes its tasks as a dependency graph instead of a fixed sequence.
+    Each task starts as soon as all tasks in its `context` have finished, with at most
+    `max_concurrency` tasks running at once. Two tasks assigned to the same agent never
+    run at the same time, because an agent keeps per-execution state; a task whose agent
+    can delegate runs alone, since delegation may drive any other agent. This also keeps
+    the per-task token counts recorded in metrics exact. With a `task_cache`, tasks whose
+    definition and upstream outputs are unchanged are served from earlier runs.
+    """
+    max_concurrency: int = Field(default=2, description="Maximum number of tasks executed at the same time.")
+    checkpoint: Optional[Any] = Field(default=None, description="checkpoint.CheckpointRun that saves and restores task outputs.")
+    task_cache: Optional[Any] = Field(default=None, description="task_cache.TaskCache serving unchanged tasks from earlier runs.")
+    on_task_output: Optional[Callable[[int, TaskOutput], None]] = Field(
+        default=None, description="Called with (task index, output) as each task completes, e.g. to stream a report.")
+    context_compactor: Optional[Any] = Field(
+        default=None, description="context_compaction.ContextCompactor that trims upstream outputs to each task's token budget.")
+    prefetcher: Optional[Any] = Field(
+        default=None, description="prefetch.ResearchPrefetcher that searches the run's likely queries at kickoff.")
+
+    def copy(self):
+        """Create a deep copy that keeps the graph scheduler and its settings."""
+        # Crew.copy() always builds a plain Crew, so rebuild it as this class.
+        copied = super().copy()
+        fields = {name: getattr(copied, name) for name in copied.model_fields_set if name != "id"}
+        fields.update({name: getattr(self, name) for name in type(self).model_fields if name not in Crew.model_fields})
+        return type(self)(**fields)
+
+    def kickoff(self, inputs: Optional[Dict[str, Any]] = None) -> CrewOutput:
+        # Searches start in the background, so they overlap the first agent's LLM turns
+        if self.prefetcher is not None and inputs:
+            self.prefetcher.start(inputs)
+        return super().kickoff(inputs)
+
+    @staticmethod
+    def task_name(task: Task, index: int) -> str:
+        """Label used for a task in metrics: its name, or its position in the crew."""
+        return task.name or f"task_{index + 1}"
+
+    def _run_task(self, task: Task, index: int, agent, context: str, tools) -> TaskOutput:
+        """Executes one task and records its wall time and the tokens its agent used."""
+        tokens_before = agent_token_usage(agent)
+        started = time.perf_counter()
+        ok = False
+        try:
+            with task_scope(self.task_name(task, index)): # Tool outputs are charged to this task's token budget
+                output = task.execute_sync(agent=agent, context=context, tools=tools)
+            ok = True
+            return output
+        finally:
+            tokens_after = agent_token_usage(agent)
+            tokens = {kind: tokens_after[kind] - tokens_before[kind] for kind in tokens_after}
+            record_task(self.task_name(task, index), agent.role, time.perf_counter() - started, tokens, ok)
+            charge_task_llm_tokens(self.task_name(task, index), tokens["total"])
+
+    def _get_context(self, task: Task, task_outputs: List[TaskOutput]) -> str:
+        """The task's context, compacted to its token budget when a context compactor is set."""
+        if self.context_compactor is None:
+            return super()._get_context(task, task_outputs)
+        # Same upstream outputs crewAI would join: the explicit context tasks, else the outputs passed in
+        upstream = [t.output for t in task.context if t.output is not None] if task.context else task_outputs
+        index = next((i for i, crew_task in enumerate(self.tasks) if crew_task is task), len(self.tasks))
+        return self.context_compactor.compact(self.task_name(task, index), task.description,
+                                              [output.raw for output in upstream])
+
+    def _notify_task_output(self, index: int, task_output: TaskOutput) -> None:
+        if self.on_task_output is None:
+            return
+        try:
+            self.on_task_output(index, task_output)
+        except Exception as e:
+            # A listener (e.g. the report writer) must never fail the run
+            print(f"Warning: Task output listener failed for task {index + 1}: {type(e).__name__}: {e}")
+
+    def _finish_task(self, task: Task, index: int, task_output: TaskOutput, was_replayed: bool,
+                     cache_key: Optional[str] = None) -> TaskOutput:
+        self._process_task_result(task, task_output)
+        if self.checkpoint is not None:
+            self.checkpoint.save_task(index, task, task_output)
+        if self.task_cache is not None and cache_key:
+            self.task_cache.put(cache_key, task, task_output)
+        self._store_execution_log(task, task_output, index, was_replayed)
+        self._notify_task_output(index, task_output)
+        return task_output
+
+    def _execute_tasks(
+        self,
+        tasks: List[Task],
+        start_index: Optional[int] = 0,
+        was_replayed: bool = False,
+    ) -> CrewOutput:
+        # Hierarchical runs share one manager agent and conditional tasks inspect
+        # the previous output, so both keep crewAI's own sequential loop.
+        if self.process != Process.sequential or any(isinstance(task, ConditionalTask) for task in tasks):
+            if self.checkpoint is not None:
+                print("Warning: Checkpoints need the task graph scheduler; this run is not checkpointed.")
+            return super()._execute_tasks(tasks, start_index, was_replayed)
+
+        graph = build_task_graph(tasks)
+        max_workers = max(1, self.max_concurrency)
+        stages = task_levels(graph)
+        print(f"Task graph: {len(tasks)} tasks in {len(stages)} stages (max concurrency {max_workers}).")
+
+        outputs: Dict[int, TaskOutput] = {}
+        for index, task in enumerate(tasks):
+            # Replays start part-way through; earlier tasks already carry their output.
+            if start_index and index < start_index and task.output:
+                outputs[index] = task.output
+        if self.checkpoint is not None:
+            # Tasks finished by an earlier attempt of this run are skipped; their outputs become context again
+            for index, task_output in self.checkpoint.load_tasks(tasks).items():
+                if index not in outputs:
+                    outputs[index] = task_output
+                    tasks[index].output = task_output
+            if outputs:
+                print(f"Resuming run {self.checkpoint.run_id}: {len(outputs)} of {len(tasks)} tasks restored from checkpoint.")
+        for index in sorted(outputs):
+            self._notify_task_output(index, outputs[index])
+
+        pending = [index for index in range(len(tasks)) if index not in outputs]
+        running: Dict[Future, int] = {}
+        busy_agents = set()
+        exclusive_running = False
+        cache_keys: Dict[int, str] = {}
+        prepared_tools: Dict[int, Any] = {}
+
+        with preserve_std_streams(), ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew-task") as pool:
+            while pending or running:
+                for index in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if any(dep not in outputs for dep in graph[index]):
+                        continue
+                    task = tasks[index]
+                    agent_to_use = self._get_agent_to_use(task)
+                    if agent_to_use is None:
+                        raise ValueError(
+                            f"No agent available for task: {task.description}. Ensure that either the task has an assigned agent or a manager agent is provided."
+                        )
+                    if index not in prepared_tools:
+                        tools_for_task = task.tools or agent_to_use.tools or []
+                        prepared_tools[index] = self._prepare_tools(agent_to_use, task, tools_for_task)
+                    tools_for_task = prepared_tools[index]
+
+                    # Looked up once, when the dependencies are first met; a task waiting for its agent keeps its key
+                    if self.task_cache is not None and index not in cache_keys:
+                        cache_keys[index] = task_cache_key(
+                            task, agent_to_use, tools_for_task, [outputs[dep] for dep in graph[index]],
+                            self.context_compactor.signature(self.task_name(task, index)) if self.context_compactor else None)
+                        cached = self.task_cache.get(cache_keys[index])
+                        if cached is not None:
+                            record_task_cache(self.task_name(task, index), True)
+                            print(f"Task {index + 1} unchanged; served from task cache.")
+                            task.output = cached
+                            outputs[index] = self._finish_task(task, index, cached, was_replayed)
+                            pending.remove(index)
+                            continue
+
+                    if id(agent_to_use) in busy_agents:
+                        continue
+                    exclusive = bool(getattr(agent_to_use, "allow_delegation", False))
+                    if exclusive_running or (exclusive and running):
+                        continue
+                    if self.task_cache is not None:
+                        record_task_cache(self.task_name(task, index), False) # A miss only once the task really runs
+
+                    self._log_task_start(task, agent_to_use.role)
+                    context = self._get_context(task, [outputs[dep] for dep in graph[index]])
+
+                    busy_agents.add(id(agent_to_use))
+                    exclusive_running = exclusive
+                    # Copy the caller's context so context variables set around kickoff
+                    # (such as the run's metrics) stay visible inside the worker thread.
+                    future = pool.submit(
+                        contextvars.copy_context().run,
+                        self._run_task,
+                        task,
+                        index,
+                        agent_to_use,
+                        context,
+                        tools_for_task,
+                    )
+                    running[future] = index
+                    pending.remove(index)
+
+                if not running:
+                    if not pending:
+                        break # Every remaining task was served from the task cache
+                    raise RuntimeError("Task graph cannot make progress; check the tasks' context dependencies.")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                failure: Optional[BaseException] = None
+                for future in done:
+                    index = running.pop(future)
+                    busy_agents.discard(id(self._get_agent_to_use(tasks[index])))
+                    exclusive_running = False
+                    try:
+                        outputs[index] = self._finish_task(tasks[index], index, future.result(), was_replayed, cache_keys.get(index))
+                    except Exception as e:
+                        failure = failure or e
+
+                if failure is not None:
+                    # Let tasks that are already running finish so their outputs are checkpointed, then fail the run.
+                    for future, index in list(running.items()):
+                        try:
+                            outputs[index] = self._finish_task(tasks[index], index, future.result(), was_replayed, cache_keys.get(index))
+                        except Exception:
+                            pass
+                    raise failure
+
+        # Keep outputs in task-definition order so reports line up with crew.tasks.
+        return self._create_crew_output([outputs[index] for index in range(len(tasks))])
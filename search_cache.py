@@ -0,0 +1,209 @@
+"""
+Persistent, TTL-aware cache for web search results.
+
+Search results are stored in a local SQLite database keyed by a normalized form
+of the query, so repeated or slightly reworded queries (case, punctuation,
+word order, filler words) are served from disk instead of DuckDuckGo.
+
+Configuration (environment variables, all optional):
+    SEARCH_CACHE_PATH         SQLite file location (default: .search_cache.sqlite3)
+    SEARCH_CACHE_TTL          Entry lifetime in seconds (default: 86400)
+    SEARCH_CACHE_MAX_ENTRIES  Entries kept before least-recently-used eviction (default: 5000)
+    SEARCH_CACHE_BYPASS       Set to 1/true to always hit the network (fresh results are still stored)
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional
+
+from text_terms import FUNCTION_WORDS
+
+DEFAULT_CACHE_PATH = ".search_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+NO_RESULTS_MARKER = "No good DuckDuckGo Search Results found"
+
+# Filler words that do not change what a search engine returns
+_STOPWORDS = FUNCTION_WORDS | {"information", "info", "latest", "recent"}
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def normalize_query(query: str) -> str:
+    """Reduces a query to a canonical key: lowercase words, no punctuation or filler words, sorted."""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    words = re.findall(r"[\w&+]+", text)
+    kept = {word for word in words if word not in _STOPWORDS}
+    return " ".join(sorted(kept or set(words)))
+
+
+class SearchCache:
+    """SQLite-backed search result cache with per-entry TTL and LRU eviction."""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, bypass: Optional[bool] = None):
+        self.path = path or os.getenv("SEARCH_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("SEARCH_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("SEARCH_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.bypass = _env_flag("SEARCH_CACHE_BYPASS") if bypass is None else bypass
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # One connection shared by all threads of this process, serialized by the lock.
+        # WAL mode and a busy timeout let batch worker processes share the same file.
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY,"
+            " query TEXT NOT NULL,"
+            " results TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_last_access ON search_cache(last_access)")
+        self._conn.commit()
+
+    def get(self, query: str, record: bool = True) -> Optional[str]:
+        """
+        Returns cached results for the query, or None on a miss, expiry or bypass.
+        `record=False` leaves the hit/miss counters alone (used by lookups made on no agent's behalf).
+        """
+        if self.bypass:
+            with self._lock:
+                self.misses += int(record)
+            return None
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, expires_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += int(record)
+                return None
+            results, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += int(record)
+                return None
+            self._conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += int(record)
+            return results
+
+    def set(self, query: str, results: str, ttl_seconds: Optional[float] = None) -> None:
+        """Stores results for the query and evicts least-recently-used entries above the size limit."""
+        key = normalize_query(query)
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, results, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, results, now, now + ttl, now),
+            )
+            self.stores += 1
+            count = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM search_cache WHERE key IN "
+                    "(SELECT key FROM search_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current number of stored entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": entries,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bypass": self.bypass,
+            }
+
+# --- Process-wide Cache and Search Helpers ---
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Returns the process-wide search cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
+
+
+def set_search_cache(cache: Optional[SearchCache]) -> Optional[SearchCache]:
+    """Replaces the process-wide search cache (None: create it again on next use). Returns the previous one."""
+    global _cache
+    with _cache_lock:
+        previous, _cache = _cache, cache
+    return previous
+
+
+def duckduckgo_search(query: str) -> str:
+    """Runs a live DuckDuckGo search."""
+    from langchain_community.tools import DuckDuckGoSearchRun
+    return DuckDuckGoSearchRun().run(query)
+
+
+_search_backend: Callable[[str], str] = duckduckgo_search
+
+
+def set_search_backend(backend: Callable[[str], str]) -> Callable[[str], str]:
+    """Replaces the function used for live searches (e.g. a stand-in backend for benchmarks). Returns the previous one."""
+    global _search_backend
+    previous, _search_backend = _search_backend, backend
+    return previous
+
+
+def search_and_store(query: str) -> str:
+    """Runs a live search and caches the results. Empty or 'no results' responses are never cached."""
+    results = _search_backend(query)
+    if results and NO_RESULTS_MARKER not in results:
+        get_search_cache().set(query, results)
+    return results
+
+
+def cached_search(query: str, bypass: bool = False) -> str:
+    """Searches the web through the cache, then through queries prefetched at kickoff (see prefetch.py)."""
+    from prefetch import prefetched_result
+
+    if not bypass:
+        cached = get_search_cache().get(query)
+        if cached is not None:
+            return cached
+        prefetched = prefetched_result(query)
+        if prefetched is not None:
+            return prefetched
+    return search_and_store(query)
@@ -0,0 +1,225 @@
+"""
+Lexicon-based sentiment engine for business text.
+
+All lexicon terms, negators and intensifiers are compiled into a single regular
+expression, so a text is scored in one pass regardless of lexicon size. Matches
+respect word boundaries ("loss" does not match "glossary"), count every
+occurrence, accept common inflections ("grew"/"growing" via their listed forms,
+"risks"/"declined" via suffixes), and are flipped when a negator appears up to
+a few words earlier in the same sentence ("did not decline").
+"""
+import json
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+DEFAULT_LEXICON: Dict[str, float] = {
+    # Positive business language
+    "growth": 2.0, "grow": 1.5, "grew": 1.5, "innovation": 1.5, "innovative": 1.5, "success": 2.0,
+    "successful": 2.0, "exceed": 2.0, "exceeded": 2.0, "strong": 1.5, "opportunity": 1.5,
+    "achieve": 1.5, "achievement": 1.5, "positive": 1.5, "benefit": 1.5, "value": 1.0,
+    "revolutionary": 1.5, "increase": 1.0, "profit": 1.5, "profitable": 2.0, "record high": 2.0,
+    "improve": 1.5, "improvement": 1.5, "gain": 1.5, "robust": 1.5, "resilient": 1.5,
+    "leader": 1.0, "leading": 1.0, "outperform": 2.0, "expand": 1.0, "expansion": 1.0,
+    "efficient": 1.0, "milestone": 1.0, "partnership": 1.0, "confident": 1.0, "excellent": 2.0, "great": 1.5,
+    "market leader": 2.0, "cost savings": 1.5, "upgrade": 1.0, "momentum": 1.0,
+    # Negative business language
+    "decline": -2.0, "struggle": -2.0, "loss": -2.0, "failure": -2.5, "fail": -2.0,
+    "problem": -1.5, "decrease": -1.0, "challenge": -1.0, "concern": -1.5, "risk": -1.0,
+    "issue": -1.0, "negative": -1.5, "obstacle": -1.5, "downturn": -2.0, "weak": -1.5,
+    "slowdown": -1.5, "layoff": -2.0, "lawsuit": -2.0, "penalty": -2.0, "fraud": -3.0,
+    "default": -2.0, "debt": -0.5, "volatile": -1.0, "volatility": -1.0, "disruption": -1.0,
+    "shortage": -1.5, "inflation": -1.0, "miss": -1.5, "missed": -1.5, "downgrade": -2.0,
+    "underperform": -2.0, "bankruptcy": -3.0, "scandal": -2.5, "delay": -1.0, "headwind": -1.5,
+    "market share loss": -2.5, "profit warning": -2.5,
+}
+DEFAULT_NEGATORS = ("not", "no", "never", "without", "hardly", "barely", "neither", "nor",
+                    "cannot", "can't", "don't", "doesn't", "didn't", "isn't", "wasn't",
+                    "aren't", "won't", "lack", "lacks", "lacking")
+DEFAULT_INTENSIFIERS: Dict[str, float] = {
+    "very": 1.5, "highly": 1.5, "significantly": 1.5, "extremely": 1.8, "substantially": 1.5,
+    "major": 1.3, "slightly": 0.6, "somewhat": 0.7, "marginally": 0.6,
+}
+NEGATION_WINDOW = 3 # Words after a negator whose sentiment is flipped
+_SUFFIXES = "(?:s|es|ed|d|ing|ly)?"
+
+
+class SentimentResult(NamedTuple):
+    label: str # "Positive", "Negative" or "Neutral"
+    compound: float # Normalized score in [-1, 1]
+    score: float # Raw weighted sum
+    positive_hits: int
+    negative_hits: int
+    negated_hits: int
+    words: int
+    top_terms: List[str]
+
+
+class _ScanState:
+    """Running totals, so long texts can be scored chunk by chunk."""
+    __slots__ = ("score", "positive", "negative", "negated", "words", "terms")
+
+    def __init__(self):
+        self.score = 0.0
+        self.positive = 0
+        self.negative = 0
+        self.negated = 0
+        self.words = 0
+        self.terms: Dict[str, float] = {}
+
+
+class SentimentEngine:
+    """Scores text against a weighted lexicon using one compiled multi-pattern regex."""
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None,
+                 negators: Sequence[str] = DEFAULT_NEGATORS,
+                 intensifiers: Optional[Dict[str, float]] = None,
+                 negation_window: int = NEGATION_WINDOW, threshold: float = 0.05):
+        self.lexicon = {term.lower(): weight for term, weight in (lexicon or DEFAULT_LEXICON).items()}
+        self.intensifiers = {k.lower(): v for k, v in (intensifiers or DEFAULT_INTENSIFIERS).items()}
+        self.negators = {n.lower() for n in negators}
+        self.negation_window = negation_window
+        self.threshold = threshold
+
+        def alternation(words: Iterable[str]) -> str:
+            # Longest first so multi-word phrases win over their component words
+            return "|".join(re.escape(w).replace(r"\ ", r"\s+") for w in sorted(words, key=len, reverse=True))
+
+        self._pattern = re.compile(
+            rf"(?P<neg>\b(?:{alternation(self.negators)})\b)"
+            rf"|(?P<term>\b(?:{alternation(self.lexicon)}){_SUFFIXES}\b)"
+            rf"|(?P<amp>\b(?:{alternation(self.intensifiers)})\b)"
+            r"|(?P<stop>[.!?;:\n]+)",
+            re.IGNORECASE,
+        )
+        self._word_pattern = re.compile(r"\b\w+\b")
+
+    def _lookup(self, matched: str) -> Optional[str]:
+        """Maps an inflected match back to its lexicon entry."""
+        term = " ".join(matched.lower().split())
+        if term in self.lexicon:
+            return term
+        for suffix in ("ing", "es", "ed", "ly", "s", "d"):
+            if term.endswith(suffix) and term[:-len(suffix)] in self.lexicon:
+                return term[:-len(suffix)]
+        return None
+
+    def _scan(self, text: str, state: _ScanState) -> None:
+        negation_end = -1 # Word position up to which sentiment is flipped
+        amplifier, amplifier_end = 1.0, -1
+        last_pos, word_index = 0, 0
+        for match in self._pattern.finditer(text):
+            word_index += len(self._word_pattern.findall(text, last_pos, match.start()))
+            last_pos = match.end()
+            kind = match.lastgroup
+            if kind == "stop":
+                negation_end, amplifier_end = -1, -1
+                continue
+            if kind == "neg":
+                negation_end = word_index + self.negation_window
+            elif kind == "amp":
+                amplifier, amplifier_end = self.intensifiers[match.group().lower()], word_index + 1
+            else:
+                term = self._lookup(match.group())
+                if term is not None:
+                    weight = self.lexicon[term]
+                    if word_index <= amplifier_end:
+                        weight *= amplifier
+                    if word_index <= negation_end:
+                        weight = -weight * 0.75 # "not strong" is milder than "weak"
+                        state.negated += 1
+                    if weight > 0:
+                        state.positive += 1
+                    elif weight < 0:
+                        state.negative += 1
+                    state.score += weight
+                    state.terms[term] = state.terms.get(term, 0.0) + weight
+            word_index += len(self._word_pattern.findall(match.group()))
+        word_index += len(self._word_pattern.findall(text, last_pos))
+        state.words += word_index
+
+    def _result(self, state: _ScanState) -> SentimentResult:
+        compound = state.score / math.sqrt(state.score * state.score + 15.0)
+        if compound >= self.threshold:
+            label = "Positive"
+        elif compound <= -self.threshold:
+            label = "Negative"
+        else:
+            label = "Neutral"
+        top_terms = [term for term, _ in sorted(state.terms.items(), key=lambda item: -abs(item[1]))[:5]]
+        return SentimentResult(label, round(compound, 4), round(state.score, 2), state.positive,
+                               state.negative, state.negated, state.words, top_terms)
+
+    def analyze(self, text: str) -> SentimentResult:
+        """Scores a single text."""
+        state = _ScanState()
+        self._scan(text or "", state)
+        return self._result(state)
+
+    def analyze_batch(self, texts: Sequence[str], workers: int = 1, chunksize: int = 256) -> List[SentimentResult]:
+        """Scores many texts in one call; results keep the input order. workers > 1 uses a process pool."""
+        if workers <= 1 or len(texts) < chunksize:
+            return [self.analyze(text) for text in texts]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.analyze, texts, chunksize=chunksize))
+
+    def analyze_stream(self, chunks: Iterable[str], max_buffer: int = 1 << 16) -> SentimentResult:
+        """
+        Scores a text delivered in chunks (e.g. a large file) without holding it all in memory.
+        Chunks are cut at sentence boundaries so phrases and negations are never split;
+        a run longer than `max_buffer` with no boundary is cut at the last whitespace.
+        """
+        state = _ScanState()
+        carry = ""
+        for chunk in chunks:
+            buffer = carry + chunk
+            cut = max(buffer.rfind(ch) for ch in ".!?;:\n") + 1
+            if cut <= 0 and len(buffer) > max_buffer:
+                cut = max(buffer.rfind(" "), 0)
+            if cut > 0:
+                self._scan(buffer[:cut], state)
+                carry = buffer[cut:]
+            else:
+                carry = buffer
+        if carry:
+            self._scan(carry, state)
+        return self._result(state)
+
+    def analyze_file(self, path: str, chunk_size: int = 1 << 16) -> SentimentResult:
+        """Streams a text file through analyze_stream."""
+        def read_chunks() -> Iterator[str]:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        return self.analyze_stream(read_chunks())
+
+
+_default_engine: Optional[SentimentEngine] = None
+
+
+def get_sentiment_engine() -> SentimentEngine:
+    """Returns the process-wide engine built from the default lexicon."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = SentimentEngine()
+    return _default_engine
+
+
+def parse_batch_input(text: str) -> Optional[List[str]]:
+    """Returns the texts if the tool input is a JSON list of strings (or {"texts": [...]}), else None."""
+    stripped = (text or "").strip()
+    if not stripped.startswith(("[", "{")):
+        return None
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("texts")
+    if isinstance(data, list) and data and all(isinstance(item, str) for item in data):
+        return data
+    return None
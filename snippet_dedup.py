@@ -0,0 +1,183 @@
+"""
+Run-scoped elimination of near-duplicate search snippets.
+
+In app.py the research coordinator, financial analyst and competitor analyst
+all research the same company, so the same news snippets came back in call
+after call and were billed as prompt tokens every time. This layer sits behind
+the Advanced Research Tool. It splits each result into snippets (the sentences
+of each line) and fingerprints each one with MinHash over word shingles.
+Snippets that are near-duplicates of one already shown to the crew in this run
+are left out. A closing note points back to the searches that
+returned them first.
+
+Fingerprints are bucketed with locality-sensitive hashing (bands of the MinHash
+signature), so each snippet is only compared with likely matches, not with
+every snippet seen so far. State is kept per run (the metrics run started by
+`metrics.start_run_metrics()`); tool calls outside a run are passed through
+unchanged. The snippets and estimated tokens left out are counted in the run
+metrics and listed in the report's Execution Metadata.
+
+Configuration (environment variables, all optional):
+    SNIPPET_DEDUP            Set to "false" to pass results through unchanged (default: true)
+    SNIPPET_DEDUP_THRESHOLD  Estimated Jaccard similarity at which a snippet counts as a duplicate (default: 0.7)
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import weakref
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import current_run_metrics, record_snippet_dedup
+from text_terms import SENTENCE_BREAK
+from token_budget import estimate_tokens
+
+NUM_PERM = 64
+BANDS = 16 # 16 bands of 4 rows: pairs above ~0.5 similarity usually share a band
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+MIN_SNIPPET_WORDS = 8 # Headings, labels and short fragments are always kept
+MAX_SNIPPETS_PER_RUN = 20000
+DEFAULT_THRESHOLD = 0.7
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(20240601) # Fixed seed: the same snippet gets the same signature in every process
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_WORD = re.compile(r"\w+")
+
+# --- Fingerprints ---
+
+def shingle_hashes(text: str, size: int = SHINGLE_WORDS) -> set:
+    """32-bit hashes of the word shingles (runs of `size` words) of `text`."""
+    words = _WORD.findall(text.lower())
+    shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return {int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles}
+
+
+def minhash(hashes: set) -> Tuple[int, ...]:
+    """MinHash signature of a shingle set: the minimum of each of NUM_PERM universal hash permutations."""
+    return tuple(min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures: the share of positions where they agree."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+def split_snippets(text: str) -> List[List[str]]:
+    """The lines of `text`, each split into its snippets (sentences)."""
+    return [[piece for piece in SENTENCE_BREAK.split(line) if piece] for line in text.splitlines()]
+
+# --- Run-scoped Index ---
+
+class SnippetIndex:
+    """The snippets shown to a run's crew so far, as MinHash signatures bucketed by LSH band."""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: List[Tuple[int, ...]] = []
+        self.sources: List[str] = []
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self.snippets_seen = 0
+        self.snippets_dropped = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SnippetIndex":
+        """An empty index with the threshold from SNIPPET_DEDUP_THRESHOLD."""
+        return cls(float(os.getenv("SNIPPET_DEDUP_THRESHOLD", DEFAULT_THRESHOLD)))
+
+    def _match(self, signature: Tuple[int, ...]) -> Optional[int]:
+        candidates = set()
+        for band in range(BANDS):
+            candidates.update(self.buckets.get((band, signature[band * ROWS:(band + 1) * ROWS]), ()))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            score = similarity(signature, self.signatures[candidate])
+            if score >= best_similarity:
+                best, best_similarity = candidate, score
+        return best
+
+    def _add(self, signature: Tuple[int, ...], source: str) -> None:
+        if len(self.signatures) >= MAX_SNIPPETS_PER_RUN:
+            return
+        position = len(self.signatures)
+        self.signatures.append(signature)
+        self.sources.append(source)
+        for band in range(BANDS):
+            self.buckets.setdefault((band, signature[band * ROWS:(band + 1) * ROWS]), []).append(position)
+
+    def filter(self, text: str, source: str) -> Tuple[str, Counter, int, int]:
+        """
+        `text` without the snippets already shown in this run (or earlier in `text`), the
+        sources those snippets were first shown by, the estimated tokens left out and the
+        number of snippets checked.
+        """
+        earlier: Counter = Counter()
+        saved = checked = 0
+        kept_lines = []
+        with self._lock:
+            for snippets in split_snippets(text):
+                kept = []
+                for snippet in snippets:
+                    if len(_WORD.findall(snippet)) < MIN_SNIPPET_WORDS:
+                        kept.append(snippet)
+                        continue
+                    signature = minhash(shingle_hashes(snippet))
+                    checked += 1
+                    match = self._match(signature)
+                    if match is None:
+                        self._add(signature, source)
+                        kept.append(snippet)
+                        continue
+                    earlier[self.sources[match]] += 1
+                    saved += estimate_tokens(snippet)
+                if kept or not "".join(snippets).strip():
+                    kept_lines.append(" ".join(kept))
+            self.snippets_seen += checked
+            self.snippets_dropped += sum(earlier.values())
+            self.tokens_saved += saved
+        return "\n".join(kept_lines), earlier, saved, checked
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"snippets_seen": self.snippets_seen, "snippets_dropped": self.snippets_dropped,
+                    "tokens_saved": self.tokens_saved, "indexed": len(self.signatures)}
+
+
+_indexes: "weakref.WeakKeyDictionary[Any, SnippetIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def current_snippet_index() -> Optional[SnippetIndex]:
+    """The snippet index of the run in progress, or None outside a run or when dedup is off."""
+    run = current_run_metrics()
+    if run is None or os.getenv("SNIPPET_DEDUP", "true").lower() == "false":
+        return None
+    with _indexes_lock:
+        index = _indexes.get(run)
+        if index is None:
+            index = _indexes[run] = SnippetIndex.from_env()
+        return index
+
+
+def dedupe_tool_output(tool_name: str, tool_input: str, output: str) -> str:
+    """A tool result without the snippets the crew has already seen in this run, with a note saying where they were."""
+    index = current_snippet_index()
+    if index is None or not isinstance(output, str) or output.startswith("Error"):
+        return output
+    source = " ".join(str(tool_input).split())[:80]
+    text, earlier, saved, checked = index.filter(output, source)
+    dropped = sum(earlier.values())
+    record_snippet_dedup(tool_name, checked, dropped, saved)
+    if not dropped:
+        return output
+    references = "; ".join(f"'{query}'" + (" (this search)" if query == source else "") + f" x{count}"
+                           for query, count in earlier.most_common(3))
+    return (f"{text}\n[{dropped} snippet(s) already returned earlier in this run were left out, "
+            f"first seen in: {references}.]")
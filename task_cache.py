@@ -0,0 +1,97 @@
+"""
+Content-addressed cache of task outputs for incremental re-runs.
+
+A task's cache key hashes everything that can change its output: the rendered
+description and expected output, the output format, the agent's configuration and
+LLM, the tool set, and the hashes of the upstream outputs it receives as context.
+Editing one task therefore re-executes only that task and the tasks downstream of
+it, and only when their inputs actually changed. Everything else is served from
+<TASK_CACHE_DIR>/<key[:2]>/<key>.json.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from crewai import Task
+    from crewai.tasks.task_output import TaskOutput
+
+from checkpoint import write_json_atomic
+
+DEFAULT_TASK_CACHE_DIR = ".task_cache"
+
+
+def output_hash(output: "TaskOutput") -> str:
+    return hashlib.sha256((output.raw or "").encode("utf-8")).hexdigest()
+
+
+def _agent_config(agent: Any) -> Dict[str, Any]:
+    llm = getattr(agent, "llm", None)
+    return {
+        "role": agent.role,
+        "goal": agent.goal,
+        "backstory": agent.backstory,
+        "llm": getattr(llm, "model", None) or str(llm),
+        "temperature": getattr(llm, "temperature", None),
+        "allow_delegation": getattr(agent, "allow_delegation", None),
+        "max_iter": getattr(agent, "max_iter", None),
+    }
+
+
+def task_cache_key(task: "Task", agent: Any, tools: List[Any], upstream: List["TaskOutput"],
+                   context_settings: Optional[str] = None) -> str:
+    """Hash of a task's rendered definition, agent, tools and upstream outputs (and how its context is compacted)."""
+    payload = {
+        "description": task.description,
+        "expected_output": task.expected_output,
+        "output_format": [getattr(task.output_json, "__name__", None), getattr(task.output_pydantic, "__name__", None)],
+        "agent": _agent_config(agent),
+        "tools": sorted((tool.name, tool.description, type(tool).__qualname__) for tool in tools),
+        "upstream": [output_hash(output) for output in upstream],
+    }
+    if context_settings is not None:
+        payload["context"] = context_settings # Only when set, so keys from runs without compaction stay valid
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class TaskCache:
+    """Task outputs on disk, one JSON file per cache key."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("TASK_CACHE_DIR", DEFAULT_TASK_CACHE_DIR)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional["TaskOutput"]:
+        from crewai.tasks.task_output import TaskOutput
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return TaskOutput(**json.load(f)["output"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Ignoring unreadable task cache entry '{path}': {e}")
+            return None
+
+    def put(self, key: str, task: "Task", output: "TaskOutput") -> None:
+        os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+        write_json_atomic(self._path(key), {
+            "key": key,
+            "task": task.description[:200],
+            "saved_at": datetime.now().isoformat(),
+            "output": output.model_dump(mode="json", exclude={"pydantic"}),
+        })
+
+    def clear(self) -> int:
+        """Deletes every cached output; returns how many were removed."""
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".json"):
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        return removed
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key") # crewAI builds an LLM client per agent; nothing is called
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+pytest.importorskip("crewai")
+
+from crewai import Agent, Process, Task # noqa: E402
+from crewai.tasks.task_output import TaskOutput # noqa: E402
+
+from checkpoint import CheckpointRun # noqa: E402
+from scheduler import ParallelCrew # noqa: E402
+
+INPUTS = {"company_name": "HDFC Bank", "industry": "Banking"}
+
+
+def build_crew(checkpoint):
+    researcher = Agent(role="Researcher", goal="Research goal", backstory="Research backstory")
+    analyst = Agent(role="Analyst", goal="Analyst goal", backstory="Analyst backstory")
+    research = Task(description="research", expected_output="A short answer.", agent=researcher)
+    finance = Task(description="finance", expected_output="A short answer.", agent=analyst, context=[research])
+    summary = Task(description="summary", expected_output="A short answer.", agent=analyst, context=[finance])
+    return ParallelCrew(agents=[researcher, analyst], tasks=[research, finance, summary],
+                        process=Process.sequential, checkpoint=checkpoint)
+
+
+def run(monkeypatch, crew, fail=()):
+    """Runs the crew's task graph with a stand-in for task execution. Returns [(description, context)] in run order."""
+    calls = []
+
+    def fake_run_task(self, task, index, agent, context, tools):
+        calls.append((task.description, context))
+        if task.description in fail:
+            raise RuntimeError(f"{task.description} failed")
+        return TaskOutput(description=task.description, raw=f"{task.description} output", agent=agent.role)
+
+    monkeypatch.setattr(ParallelCrew, "_run_task", fake_run_task)
+    crew._execute_tasks(crew.tasks)
+    return calls
+
+
+def test_resume_skips_completed_tasks_and_feeds_their_outputs_as_context(monkeypatch, tmp_path):
+    checkpoint = CheckpointRun.start(INPUTS, app="test", root=str(tmp_path))
+    with pytest.raises(RuntimeError, match="finance failed"):
+        run(monkeypatch, build_crew(checkpoint), fail={"finance"})
+    assert sorted(os.listdir(checkpoint.path)) == ["run.json", "task_0.json"]
+
+    resumed = CheckpointRun.resume(checkpoint.run_id, root=str(tmp_path))
+    assert resumed.inputs == INPUTS
+    calls = run(monkeypatch, build_crew(resumed))
+    assert [description for description, _ in calls] == ["finance", "summary"]
+    assert "research output" in calls[0][1] # The restored output is finance's context
+    assert sorted(os.listdir(checkpoint.path)) == ["run.json", "task_0.json", "task_1.json", "task_2.json"]
+
+
+def test_changed_task_is_not_restored(tmp_path):
+    checkpoint = CheckpointRun.start(INPUTS, root=str(tmp_path))
+    crew = build_crew(checkpoint)
+    research, finance = crew.tasks[0], crew.tasks[1]
+    checkpoint.save_task(0, research, TaskOutput(description="research", raw="research output", agent="Researcher"))
+    checkpoint.save_task(1, finance, TaskOutput(description="finance", raw="finance output", agent="Analyst"))
+
+    finance.description = "finance for a different company"
+    restored = checkpoint.load_tasks(crew.tasks)
+    assert list(restored) == [0]
+    assert restored[0].raw == "research output"
+
+
+def test_unreadable_checkpoint_runs_again(tmp_path):
+    checkpoint = CheckpointRun.start(INPUTS, root=str(tmp_path))
+    crew = build_crew(checkpoint)
+    (tmp_path / checkpoint.run_id / "task_0.json").write_text("{not json", encoding="utf-8")
+    assert checkpoint.load_tasks(crew.tasks) == {}
+
+
+def test_mark_keeps_inputs_and_unknown_runs_are_rejected(tmp_path):
+    checkpoint = CheckpointRun.start(INPUTS, app="test", root=str(tmp_path))
+    checkpoint.mark("failed", error="RuntimeError: boom")
+    with open(os.path.join(checkpoint.path, "run.json"), encoding="utf-8") as f:
+        metadata = json.load(f)
+    assert metadata["status"] == "failed"
+    assert metadata["error"] == "RuntimeError: boom"
+    assert metadata["inputs"] == INPUTS
+    with pytest.raises(FileNotFoundError):
+        CheckpointRun.resume("no-such-run", root=str(tmp_path))
@@ -0,0 +1,81 @@
+import pytest
+
+from context_compaction import DIVIDER, OMISSION, ContextCompactor, compact_text, split_units
+from token_budget import estimate_tokens
+
+TOPICS = ["deposits", "loans", "branches", "margins", "capital", "liquidity", "payments", "treasury"]
+
+
+def report(sections=3, sentences=12):
+    """A multi-section report; every sentence is distinct and mentions one topic."""
+    lines = []
+    for section in range(sections):
+        lines.append(f"## Section {section + 1}")
+        for number in range(sentences):
+            topic = TOPICS[(section * sentences + number) % len(TOPICS)]
+            lines.append(f"HDFC Bank {topic} changed in period {section}-{number} as management reviewed segment {number}.")
+    return "\n".join(lines)
+
+
+def kept_units(text):
+    return [line for line in text.splitlines() if line != OMISSION]
+
+
+def test_text_within_budget_is_unchanged():
+    text = report(sections=1, sentences=3)
+    assert compact_text(text, estimate_tokens(text)) == text
+
+
+@pytest.mark.parametrize("budget", [60, 150, 300])
+def test_result_fits_the_budget(budget):
+    text = report()
+    compacted = compact_text(text, budget)
+    assert estimate_tokens(text) > budget
+    assert sum(estimate_tokens(unit) + 1 for unit in kept_units(compacted)) <= budget
+    assert OMISSION in compacted
+
+
+def test_kept_units_stay_in_order_under_their_headings():
+    text = report()
+    original = [unit.text for unit in split_units(text)]
+    compacted = kept_units(compact_text(text, 200))
+    positions = [original.index(unit) for unit in compacted]
+    assert positions == sorted(positions)
+    for unit in compacted: # Every kept sentence is preceded by its own section heading
+        if not unit.startswith("## "):
+            section = int(unit.split("period ")[1].split("-")[0]) + 1
+            assert f"## Section {section}" in compacted[:compacted.index(unit)]
+
+
+def test_focus_terms_decide_what_is_kept():
+    text = report()
+    assert "treasury" not in compact_text(text, 60, focus="deposits growth")
+    assert "treasury" in compact_text(text, 60, focus="treasury operations")
+
+
+def test_near_duplicates_are_kept_once():
+    sentence = "HDFC Bank deposits grew 18% in the year while loan growth stayed strong across regions."
+    text = "\n".join([sentence, sentence.replace("HDFC Bank", "The bank"), report(sections=1)])
+    compacted = compact_text(text, 120, focus="deposits grew")
+    assert sum("deposits grew 18%" in unit for unit in kept_units(compacted)) == 1
+
+
+def test_compaction_is_deterministic():
+    text = report()
+    assert compact_text(text, 150, focus="loans") == compact_text(text, 150, focus="loans")
+
+
+def test_compactor_shares_the_budget_by_length_and_caches_outputs():
+    compactor = ContextCompactor(budget_tokens=300, cache_size=8)
+    short, long = report(sections=1, sentences=8), report(sections=3, sentences=12)
+    assert compactor.compact("task_3", "", [short]) == short # Under budget: passed through
+
+    context = compactor.compact("task_5", "loans", [short, long])
+    parts = context.split(DIVIDER)
+    assert len(parts) == 2
+    assert estimate_tokens(parts[0]) < estimate_tokens(parts[1]) # The longer output gets the larger share
+    assert estimate_tokens(context) < estimate_tokens(short) + estimate_tokens(long)
+
+    misses = compactor.stats()["misses"]
+    assert compactor.compact("task_5", "loans", [short, long]) == context
+    assert compactor.stats()["misses"] == misses
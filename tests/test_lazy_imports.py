@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run_python(code, cwd=ROOT):
+    """Runs `code` in a fresh interpreter, so modules loaded by earlier tests do not count."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=cwd, env=env)
+    return result.stdout.strip()
+
+
+@pytest.mark.parametrize("module", ["app", "advance_agent", "email_agent", "app_report", "advance_agent_report", "batch"])
+def test_importing_a_module_does_not_load_crewai(module):
+    loaded = run_python(f"import sys, {module}; print([name for name in ('crewai', 'scheduler') if name in sys.modules])")
+    assert loaded == "[]"
+
+
+def test_importing_an_app_does_not_load_dotenv(tmp_path):
+    (tmp_path / ".env").write_text("LAZY_IMPORT_PROBE=loaded\n")
+    assert run_python("import os, app; print(os.getenv('LAZY_IMPORT_PROBE', 'unset'))", cwd=tmp_path) == "unset"
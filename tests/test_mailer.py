@@ -0,0 +1,111 @@
+import json
+from email import message_from_bytes
+
+import pytest
+
+from mailer import Mailer, SMTPSettings, StandInSMTPServer, build_report_message
+from outbox import Outbox, OutboxWorker
+
+RECIPIENTS = ["a@example.com", "b@example.com", "c@example.com"]
+
+
+@pytest.fixture
+def server():
+    server = StandInSMTPServer(username="reports@example.com", password="secret").start()
+    yield server
+    server.stop()
+
+
+def settings_for(server):
+    return SMTPSettings("127.0.0.1", server.port, "reports@example.com", "secret",
+                        use_ssl=False, starttls=False, timeout=5)
+
+
+def stored_recipients(server):
+    return sorted(address for message in server.messages for address in message["to"])
+
+
+def test_421_on_middle_recipient_retries_everyone(server):
+    server.refuse_once["b@example.com"] = 421
+    settings = settings_for(server)
+    mailer = Mailer(settings, pool_size=1, retries=2, backoff=0.01)
+    result = mailer.send(build_report_message(settings.username, RECIPIENTS, "Report", "Attached."), RECIPIENTS)
+    mailer.close()
+    assert result.ok
+    assert sorted(result.delivered) == RECIPIENTS
+    assert result.refused == {}
+    assert result.attempts == 2
+    assert stored_recipients(server) == RECIPIENTS
+
+
+def test_permanent_refusal_is_not_retried(server):
+    server.refuse["a@example.com"] = 550
+    server.refuse_once["b@example.com"] = 421
+    settings = settings_for(server)
+    mailer = Mailer(settings, pool_size=1, retries=2, backoff=0.01)
+    result = mailer.send(build_report_message(settings.username, RECIPIENTS, "Report", "Attached."), RECIPIENTS)
+    mailer.close()
+    assert not result.ok
+    assert sorted(result.delivered) == ["b@example.com", "c@example.com"]
+    assert list(result.refused) == ["a@example.com"]
+    assert stored_recipients(server) == ["b@example.com", "c@example.com"]
+
+
+def test_outbox_requeues_every_undelivered_recipient(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(server.port))
+    monkeypatch.setenv("SMTP_STARTTLS", "false")
+    monkeypatch.setenv("TEST_SMTP_USER", "reports@example.com")
+    monkeypatch.setenv("TEST_SMTP_PASSWORD", "secret")
+    monkeypatch.setenv("OUTBOX_RETRY_BASE", "0")
+    report = tmp_path / "report.txt"
+    report.write_text("Report body", encoding="utf-8")
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    message_id = outbox.enqueue(RECIPIENTS, "Report", "Attached.", str(report), "TEST_SMTP_USER", "TEST_SMTP_PASSWORD")
+    worker = OutboxWorker(outbox, concurrency=1)
+    server.refuse_once["b@example.com"] = 421
+
+    assert worker.deliver(outbox.claim(1)[0]) == "queued"
+    row = outbox.latest()[0]
+    assert row["id"] == message_id
+    assert json.loads(row["recipients"]) == RECIPIENTS
+
+    assert worker.deliver(outbox.claim(1)[0]) == "sent"
+    assert stored_recipients(server) == RECIPIENTS
+
+
+def test_non_ascii_attachment_name_is_rfc2231_encoded(server, tmp_path):
+    report = tmp_path / "Société_Générale_report.txt"
+    report.write_text("Report body", encoding="utf-8")
+    settings = settings_for(server)
+    mailer = Mailer(settings, pool_size=1, retries=0)
+    result = mailer.send(build_report_message(settings.username, ["a@example.com"], "Rapport", "Ci-joint.", str(report)),
+                         ["a@example.com"])
+    mailer.close()
+    assert result.ok
+    data = server.messages[0]["data"]
+    assert b"filename*=utf-8''Soci%C3%A9t%C3%A9_G%C3%A9n%C3%A9rale_report.txt" in data
+    attachment = next(part for part in message_from_bytes(data).walk() if part.get_filename())
+    assert attachment.get_filename() == report.name
+    assert attachment.get_payload(decode=True) == b"Report body"
+
+
+def test_outbox_does_not_retry_a_message_that_cannot_be_encoded(tmp_path, monkeypatch):
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", "25")
+    monkeypatch.setenv("TEST_SMTP_USER", "reports@example.com")
+    monkeypatch.setenv("TEST_SMTP_PASSWORD", "secret")
+    report = tmp_path / "report.txt"
+    report.write_text("Report body", encoding="utf-8")
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue(RECIPIENTS, "Report", "Attached.", str(report), "TEST_SMTP_USER", "TEST_SMTP_PASSWORD")
+
+    class Unencodable:
+        def send(self, message, recipients):
+            raise UnicodeEncodeError("ascii", "é", 0, 1, "ordinal not in range(128)")
+
+    worker = OutboxWorker(outbox, concurrency=1)
+    monkeypatch.setattr(worker, "_mailer", lambda settings: Unencodable())
+    assert worker.deliver(outbox.claim(1)[0]) == "failed"
+    assert outbox.counts().get("failed") == 1
+    assert outbox.claim(1) == []
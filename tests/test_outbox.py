@@ -0,0 +1,92 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import outbox
+from outbox import LEASE_SECONDS, Outbox
+
+RECIPIENTS = ["a@example.com", "b@example.com"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the outbox's wall clock with one the test moves forward."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(outbox, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def box(tmp_path, monkeypatch, clock):
+    monkeypatch.setenv("OUTBOX_RETRY_BASE", "30")
+    monkeypatch.setenv("OUTBOX_MAX_ATTEMPTS", "3")
+    return Outbox(str(tmp_path / "outbox.sqlite3"))
+
+
+def enqueue(box, subject="Report"):
+    return box.enqueue(RECIPIENTS, subject, "Attached.", None, "TEST_SMTP_USER", "TEST_SMTP_PASSWORD")
+
+
+def test_claimed_message_is_leased_until_the_lease_expires(box, clock):
+    message_id = enqueue(box)
+    claimed = box.claim(5)
+    assert [(message["id"], message["attempts"]) for message in claimed] == [(message_id, 1)]
+    assert box.claim(5) == [] # Another worker does not get it while the lease holds
+
+    clock.value += LEASE_SECONDS - 1
+    assert box.claim(5) == []
+    clock.value += 2 # The worker that claimed it is presumed dead
+    assert [(message["id"], message["attempts"]) for message in box.claim(5)] == [(message_id, 2)]
+
+
+def test_concurrent_claims_never_share_a_message(box):
+    ids = {enqueue(box, f"Report {number}") for number in range(20)}
+    claimed = []
+    lock = threading.Lock()
+
+    def claim():
+        for _ in range(10):
+            messages = box.claim(3)
+            with lock:
+                claimed.extend(message["id"] for message in messages)
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_retries_back_off_exponentially_then_fail(box, clock):
+    message_id = enqueue(box)
+    delays = []
+    for attempt in (1, 2):
+        message = box.claim(1)[0]
+        assert message["attempts"] == attempt
+        assert box.mark_retry(message, RECIPIENTS[1:], RECIPIENTS[:1], "SMTPServerDisconnected") == "queued"
+        delays.append(box.next_due_in())
+        assert box.claim(1) == [] # Not due yet
+        clock.value += delays[-1]
+    assert delays == [30.0, 60.0]
+
+    message = box.claim(1)[0]
+    assert json.loads(message["recipients"]) == RECIPIENTS[1:] # Only the recipients still owed the message
+    assert box.mark_retry(message, RECIPIENTS[1:], RECIPIENTS[:1], "SMTPServerDisconnected") == "failed"
+    row = box.latest()[0]
+    assert (row["id"], row["status"]) == (message_id, "failed")
+    assert row["last_error"].endswith("(gave up after 3 attempts)")
+    assert box.next_due_in() is None
+
+
+def test_duplicate_is_not_queued_twice_and_failed_message_is_requeued(box):
+    message_id = enqueue(box)
+    assert enqueue(box) == message_id
+    assert box.counts() == {"queued": 1}
+
+    box.mark_failed(message_id, [], "550 mailbox unavailable")
+    assert enqueue(box) == message_id
+    message = box.claim(1)[0]
+    assert (message["id"], message["attempts"]) == (message_id, 1) # Attempts start again
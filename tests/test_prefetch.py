@@ -0,0 +1,75 @@
+import contextvars
+from concurrent.futures import Future
+
+import pytest
+
+import prefetch
+from metrics import start_run_metrics
+from prefetch import _best_match, _track, expand_queries
+
+INPUTS = {"company_name": "NVIDIA Corp", "industry": "Semiconductors"}
+TTL = 3600.0
+
+
+def done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def in_new_run(function, *args):
+    """Calls `function` in a fresh context with its own run metrics, like one crew run."""
+    def run():
+        start_run_metrics()
+        return function(*args)
+    return contextvars.copy_context().run(run)
+
+
+def track_run_queries():
+    for query in expand_queries(INPUTS):
+        _track(query, INPUTS["company_name"], done(f"results for {query}"))
+
+
+def test_same_and_related_queries_match():
+    def check():
+        track_run_queries()
+        same = _best_match("nvidia corp LATEST news", 0.6, TTL)
+        related = _best_match("NVIDIA financial results revenue profit", 0.6, TTL)
+        return same, related
+    same, related = in_new_run(check)
+    assert same[:2] == ("NVIDIA Corp latest news", True)
+    assert related[:2] == ("NVIDIA Corp financial results revenue profit growth", False)
+
+
+def test_other_company_is_not_related():
+    def check():
+        track_run_queries()
+        return (_best_match("AMD Semiconductors market share competitors", 0.5, TTL),
+                _best_match("AMD financial results revenue profit growth", 0.5, TTL))
+    assert in_new_run(check) == (None, None)
+
+
+def test_prefetches_are_scoped_to_their_run():
+    in_new_run(track_run_queries)
+    assert in_new_run(_best_match, "NVIDIA Corp latest news", 0.6, TTL) is None
+    assert _best_match("NVIDIA Corp latest news", 0.6, TTL) is None # Outside any run
+
+
+def test_prefetches_expire_with_the_cache_ttl(monkeypatch):
+    def check():
+        track_run_queries()
+        fresh = _best_match("NVIDIA Corp latest news", 0.6, TTL)
+        monkeypatch.setattr(prefetch.time, "time", lambda: now + TTL + 1)
+        return fresh, _best_match("NVIDIA Corp latest news", 0.6, TTL)
+    now = prefetch.time.time()
+    fresh, stale = in_new_run(check)
+    assert fresh is not None
+    assert stale is None
+
+
+@pytest.mark.parametrize("inputs, first", [
+    ({"company_name": "HDFC Bank", "industry": "Banking"}, "HDFC Bank latest news"),
+    ({"target_name": "Axis Bank"}, "Axis Bank latest news"),
+])
+def test_expand_queries_uses_the_run_subject(inputs, first):
+    assert expand_queries(inputs)[0] == first
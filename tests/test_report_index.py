@@ -0,0 +1,60 @@
+import pytest
+
+import report_index
+from report_index import ReportHit, ReportIndex, local_findings, matches_subject, subject_terms
+
+SECTIONS = [
+    "Research {company} in the Banking sector",
+    "Analyze the financial performance of {company}",
+    "Assess the digital strategy of {company}",
+]
+FINDING = ("{company} reported strong financial performance this year, with loan growth, stable asset quality "
+           "and a digital strategy built on mobile banking, payments and new branches across India.")
+
+
+def write_report(directory, company):
+    lines = [f"{company} Strategic Analysis Report", "Industry: Banking", "Generated on: 2025-03-29T10:00:00", "=" * 50, ""]
+    for heading in SECTIONS:
+        lines += [f"Task: {heading.format(company=company)}", "-" * 40, "Key Findings:", FINDING.format(company=company), ""]
+    path = directory / (company.lower().replace(" ", "_") + "_report.txt")
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    write_report(tmp_path, "HDFC Bank")
+    write_report(tmp_path, "Axis Bank Limited")
+    index = ReportIndex(str(tmp_path / "index.sqlite3"))
+    index.build([str(tmp_path)], workers=1)
+    monkeypatch.setattr(report_index, "_index", index)
+    monkeypatch.setenv("REPORT_INDEX_MIN_HITS", "2")
+    return index
+
+
+def test_subject_terms_skip_generic_company_words():
+    assert subject_terms("ICICI Bank financial performance") == ["icici"]
+    assert subject_terms("State Bank of India digital strategy") == ["state", "india"]
+    assert subject_terms("recent banking trends") == []
+
+
+def test_matches_subject_needs_the_hit_company():
+    hit = ReportHit(1.0, "HDFC Bank", "Banking", "", "task", "hdfc.txt", FINDING.format(company="HDFC Bank"))
+    assert matches_subject("HDFC Bank financial performance", hit)
+    assert not matches_subject("ICICI Bank financial performance", hit)
+    assert matches_subject("bank financial performance", hit)
+
+
+def test_indexed_company_is_answered_locally(index):
+    findings = local_findings("HDFC Bank financial performance")
+    assert findings is not None
+    assert "HDFC Bank -" in findings and "Axis Bank" not in findings
+
+
+@pytest.mark.parametrize("query", [
+    "ICICI Bank financial performance",
+    "State Bank of India digital strategy",
+    "Infosys recent developments and strategic initiatives",
+])
+def test_company_not_in_index_falls_through_to_web(index, query):
+    assert local_findings(query) is None
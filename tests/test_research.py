@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+import research
+from research import parse_query_list, research_fanout
+
+SHARED = "HDFC Bank grew its loan book by sixteen percent while keeping asset quality stable across regions."
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Stands in for research_search; records every query it is asked."""
+    asked = []
+    lock = threading.Lock()
+
+    def search(query):
+        with lock:
+            asked.append(query)
+        if "broken" in query:
+            raise RuntimeError("backend down")
+        return f"Findings about {query} that only this query returned for the crew.\n{SHARED}"
+
+    monkeypatch.setattr(research, "research_search", search)
+    return asked
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('["HDFC Bank financials", "HDFC Bank leadership"]', ["HDFC Bank financials", "HDFC Bank leadership"]),
+    ('{"queries": ["HDFC Bank news"]}', ["HDFC Bank news"]),
+    ("HDFC Bank financials", None),
+    ('{"texts": ["HDFC Bank news"]}', None),
+    ("[1, 2]", None),
+    ("[]", None),
+    ("[not json", None),
+])
+def test_parse_query_list(text, expected):
+    assert parse_query_list(text) == expected
+
+
+def test_fanout_gives_each_query_a_section_and_shows_shared_snippets_once(searches):
+    response = research_fanout(["HDFC Bank financials", "HDFC Bank leadership"])
+
+    assert "## 1. HDFC Bank financials" in response
+    assert "## 2. HDFC Bank leadership" in response
+    assert response.count(SHARED) == 1
+    assert "(1 snippet(s) already shown above were left out.)" in response
+
+
+def test_fanout_searches_repeated_queries_once_and_respects_the_limit(searches, monkeypatch):
+    monkeypatch.setenv("RESEARCH_FANOUT_MAX", "2")
+    response = research_fanout(["HDFC Bank news", " hdfc  bank NEWS ", "HDFC Bank leadership", "HDFC Bank risks"])
+
+    assert sorted(searches) == ["HDFC Bank leadership", "HDFC Bank news"]
+    assert "Not searched (limit of 2 queries per call): HDFC Bank risks" in response
+
+
+def test_fanout_reports_failed_queries_in_their_own_section(searches):
+    response = research_fanout(["broken query", "HDFC Bank news"])
+    assert not response.startswith("Error")
+    assert "Error: search failed (RuntimeError: backend down)" in response
+
+    assert research_fanout(["broken query"]).startswith("Error: every research query failed.")
+    assert research_fanout(["  "]) == "Error: No research queries given."
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from run_store import RunStore
+
+INPUTS = {"company_name": "HDFC Bank", "industry": "Banking"}
+TASKS = [
+    {"index": 0, "name": "task_1", "agent": "Researcher", "description": "Research HDFC Bank", "output": "Research output"},
+    {"index": 1, "name": "task_2", "agent": "Analyst", "description": "Analyse HDFC Bank", "output": "Financial output"},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(str(tmp_path / "runs.sqlite3"))
+
+
+def connect(store):
+    return sqlite3.connect(store.path, isolation_level=None)
+
+
+@pytest.mark.parametrize("sql", [
+    "UPDATE runs SET status = 'completed'",
+    "DELETE FROM runs",
+    "UPDATE run_tasks SET output = 'rewritten'",
+    "DELETE FROM run_tasks",
+])
+def test_written_rows_cannot_be_changed(store, sql):
+    store.append("run-1", "app", INPUTS, TASKS, status="failed", error="RuntimeError: boom")
+    conn = connect(store)
+    try:
+        with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+            conn.execute(sql)
+    finally:
+        conn.close()
+    run = store.get("run-1")
+    assert run["status"] == "failed"
+    assert [task["output"] for task in run["tasks"]] == ["Research output", "Financial output"]
+
+
+def test_triggers_survive_reopening(store):
+    RunStore(store.path) # Creating the schema again keeps the existing triggers
+    store.append("run-1", "app", INPUTS, TASKS)
+    conn = connect(store)
+    try:
+        triggers = sorted(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+            conn.execute("DELETE FROM runs WHERE run_id = 'run-1'")
+    finally:
+        conn.close()
+    assert triggers == ["run_tasks_no_delete", "run_tasks_no_update", "runs_no_delete", "runs_no_update"]
+
+
+def test_resumed_run_is_a_new_attempt(store):
+    assert store.append("run-1", "app", INPUTS, TASKS[:1], status="failed", error="RuntimeError: boom") == 1
+    assert store.append("run-1", "app", INPUTS, TASKS) == 2
+
+    latest = store.get("run-1")
+    assert (latest["attempt"], latest["status"], len(latest["tasks"])) == (2, "completed", 2)
+    assert [run["attempt"] for run in store.runs(company="hdfc bank", latest_only=False)] == [2, 1]
+    assert [run["attempt"] for run in store.runs(company="hdfc bank")] == [2]
+    assert [row["output"] for row in store.task_outputs("task_2", company="HDFC Bank")] == ["Financial output"]
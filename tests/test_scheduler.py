@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key") # crewAI builds an LLM client per agent; nothing is called
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+pytest.importorskip("crewai")
+
+from crewai import Agent, Process, Task # noqa: E402
+from crewai.tasks.task_output import TaskOutput # noqa: E402
+
+from scheduler import ParallelCrew, build_task_graph, task_levels # noqa: E402
+
+TASK_SECONDS = 0.2
+
+
+def agent(role, allow_delegation=False):
+    return Agent(role=role, goal=f"{role} goal", backstory=f"{role} backstory", allow_delegation=allow_delegation)
+
+
+def task(description, owner, context=None):
+    return Task(description=description, expected_output="A short answer.", agent=owner, context=context)
+
+
+def run_and_record(monkeypatch, crew, seconds=None, fail=()):
+    """
+    Runs the crew's task graph with a stand-in for task execution; tasks named in `fail` raise.
+    Returns {description: (start, end)}.
+    """
+    intervals = {}
+    lock = threading.Lock()
+
+    def fake_run_task(self, task, index, agent, context, tools):
+        started = time.perf_counter()
+        time.sleep((seconds or {}).get(task.description, TASK_SECONDS))
+        if task.description in fail:
+            raise RuntimeError(f"{task.description} failed")
+        with lock:
+            intervals[task.description] = (started, time.perf_counter())
+        return TaskOutput(description=task.description, raw=f"{task.description} done", agent=agent.role)
+
+    monkeypatch.setattr(ParallelCrew, "_run_task", fake_run_task)
+    crew._execute_tasks(crew.tasks)
+    return intervals
+
+
+def overlap(first, second):
+    return first[0] < second[1] and second[0] < first[1]
+
+
+def test_task_graph_follows_context():
+    researcher, analyst = agent("Researcher"), agent("Analyst")
+    research = task("research", researcher)
+    finance = task("finance", analyst, context=[research])
+    competitors = task("competitors", researcher, context=[research])
+    summary = task("summary", analyst, context=[finance, competitors])
+    graph = build_task_graph([research, finance, competitors, summary])
+    assert graph == {0: [], 1: [0], 2: [0], 3: [1, 2]}
+    assert task_levels(graph) == [[0], [1, 2], [3]]
+
+
+def test_tasks_without_context_run_in_sequence():
+    researcher = agent("Researcher")
+    tasks = [task("first", researcher), task("second", researcher), task("third", researcher, context=[])]
+    graph = build_task_graph(tasks)
+    assert graph == {0: [], 1: [0], 2: []}
+    assert task_levels(graph) == [[0, 2], [1]]
+
+
+def test_task_graph_rejects_forward_and_foreign_context():
+    researcher = agent("Researcher")
+    later = task("later", researcher)
+    outsider = task("outsider", researcher)
+    with pytest.raises(ValueError, match="listed after it"):
+        build_task_graph([task("early", researcher, context=[later]), later])
+    with pytest.raises(ValueError, match="not part of the crew"):
+        build_task_graph([task("lonely", researcher, context=[outsider])])
+
+
+def test_delegating_task_runs_alone(monkeypatch):
+    researcher, analyst, strategist = agent("Researcher"), agent("Analyst"), agent("Strategist", allow_delegation=True)
+    crew = ParallelCrew(
+        agents=[researcher, analyst, strategist],
+        tasks=[task("research", researcher, context=[]), task("finance", analyst, context=[]),
+               task("strategy", strategist, context=[]), task("outlook", analyst, context=[])],
+        process=Process.sequential, max_concurrency=3,
+    )
+    intervals = run_and_record(monkeypatch, crew)
+    assert overlap(intervals["research"], intervals["finance"]) # Independent tasks still run together
+    for other in ("research", "finance", "outlook"):
+        assert not overlap(intervals["strategy"], intervals[other])
+
+
+def test_same_agent_never_overlaps(monkeypatch):
+    researcher, analyst = agent("Researcher"), agent("Analyst")
+    crew = ParallelCrew(
+        agents=[researcher, analyst],
+        tasks=[task("first", analyst, context=[]), task("second", analyst, context=[]),
+               task("research", researcher, context=[])],
+        process=Process.sequential, max_concurrency=3,
+    )
+    intervals = run_and_record(monkeypatch, crew)
+    assert not overlap(intervals["first"], intervals["second"])
+    assert overlap(intervals["first"], intervals["research"])
+
+
+class RecordingCheckpoint:
+    """Stands in for checkpoint.CheckpointRun: restores nothing and records what is saved."""
+    run_id = "test-run"
+
+    def __init__(self):
+        self.saved = []
+
+    def load_tasks(self, tasks):
+        return {}
+
+    def save_task(self, index, task, output):
+        self.saved.append(task.description)
+
+
+def test_failure_still_checkpoints_running_tasks(monkeypatch):
+    researcher, analyst, strategist = agent("Researcher"), agent("Analyst"), agent("Strategist")
+    checkpoint = RecordingCheckpoint()
+    crew = ParallelCrew(
+        agents=[researcher, analyst, strategist],
+        tasks=[task("research", researcher, context=[]), task("finance", analyst, context=[]),
+               task("strategy", strategist, context=[])],
+        process=Process.sequential, max_concurrency=2, checkpoint=checkpoint,
+    )
+    with pytest.raises(RuntimeError, match="research failed"):
+        run_and_record(monkeypatch, crew, seconds={"research": 0.05, "finance": 0.3}, fail={"research"})
+    # Finance was still running when research failed: it is saved; strategy never starts
+    assert checkpoint.saved == ["finance"]
+
+
+class CountingTaskCache:
+    """Stands in for task_cache.TaskCache: always misses and counts lookups."""
+
+    def __init__(self):
+        self.lookups = []
+        self.stored = []
+
+    def get(self, key):
+        self.lookups.append(key)
+        return None
+
+    def put(self, key, task, output):
+        self.stored.append(task.description)
+
+
+def test_waiting_task_is_looked_up_in_the_cache_once(monkeypatch):
+    import scheduler
+
+    researcher, analyst = agent("Researcher"), agent("Analyst")
+    cache = CountingTaskCache()
+    recorded = []
+    monkeypatch.setattr(scheduler, "record_task_cache", lambda name, hit: recorded.append((name, hit)))
+    crew = ParallelCrew(
+        agents=[researcher, analyst],
+        tasks=[task("first", analyst, context=[]), task("second", analyst, context=[]),
+               task("research", researcher, context=[])],
+        process=Process.sequential, max_concurrency=3, task_cache=cache,
+    )
+    run_and_record(monkeypatch, crew) # "second" waits while its agent works on "first"
+    assert len(cache.lookups) == 3
+    assert sorted(recorded) == [("task_1", False), ("task_2", False), ("task_3", False)]
+    assert sorted(cache.stored) == ["first", "research", "second"]
@@ -0,0 +1,15 @@
+from search_cache import SearchCache, normalize_query
+
+
+def test_normalize_query_drops_only_filler():
+    assert normalize_query("What is the latest on HDFC Bank?") == normalize_query("hdfc bank")
+    assert normalize_query("Infosys IT services") != normalize_query("Infosys services")
+    assert normalize_query("how to hedge or insure") == "hedge how insure or"
+
+
+def test_reworded_query_hits_and_entries_expire(tmp_path):
+    cache = SearchCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, bypass=False)
+    cache.set("HDFC Bank latest news", "results")
+    assert cache.get("hdfc bank news!") == "results"
+    cache.set("Axis Bank news", "old results", ttl_seconds=-1)
+    assert cache.get("Axis Bank news") is None
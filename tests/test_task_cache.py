@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from task_cache import TaskCache, task_cache_key
+
+
+def llm(model="gpt-4o-mini", temperature=0.2):
+    return SimpleNamespace(model=model, temperature=temperature)
+
+
+def agent(**changes):
+    fields = dict(role="Financial Analyst", goal="Analyse HDFC Bank", backstory="Ten years in banking.",
+                  llm=llm(), allow_delegation=False, max_iter=20)
+    fields.update(changes)
+    return SimpleNamespace(**fields)
+
+
+def task(**changes):
+    fields = dict(description="Analyse the financial performance of HDFC Bank.",
+                  expected_output="A short financial analysis.", output_json=None, output_pydantic=None)
+    fields.update(changes)
+    return SimpleNamespace(**fields)
+
+
+def tool(name="Advanced Research Tool", description="Researches companies."):
+    return SimpleNamespace(name=name, description=description)
+
+
+def output(raw):
+    return SimpleNamespace(raw=raw)
+
+
+def key(task_=None, agent_=None, tools=None, upstream=None, context_settings=None):
+    return task_cache_key(task_ or task(), agent_ or agent(), [tool()] if tools is None else tools,
+                          [output("Research findings.")] if upstream is None else upstream, context_settings)
+
+
+def test_key_is_stable_for_the_same_inputs():
+    assert key() == key()
+    # Tool order does not matter; the set of tools does
+    research, knowledge = tool(), tool("Knowledge Base Tool", "Looks things up.")
+    assert key(tools=[research, knowledge]) == key(tools=[knowledge, research])
+
+
+@pytest.mark.parametrize("changed", [
+    dict(task_=task(description="Analyse the financial performance of ICICI Bank.")),
+    dict(task_=task(expected_output="A long financial analysis.")),
+    dict(agent_=agent(goal="Analyse ICICI Bank")),
+    dict(agent_=agent(llm=llm(model="gpt-4o"))),
+    dict(agent_=agent(llm=llm(temperature=0.9))),
+    dict(agent_=agent(allow_delegation=True)),
+    dict(tools=[tool(description="Researches companies and people.")]),
+    dict(tools=[]),
+    dict(upstream=[output("Different research findings.")]),
+    dict(upstream=[]),
+    dict(context_settings="budget=2000"),
+], ids=["description", "expected_output", "goal", "model", "temperature", "delegation", "tool", "no_tools",
+        "upstream_output", "no_upstream", "context_settings"])
+def test_every_input_changes_the_key(changed):
+    assert key(**changed) != key()
+
+
+def test_upstream_order_changes_the_key():
+    first, second = output("Research findings."), output("Financial analysis.")
+    assert key(upstream=[first, second]) != key(upstream=[second, first])
+
+
+def test_put_and_get_round_trip(tmp_path):
+    task_output = pytest.importorskip("crewai.tasks.task_output")
+    cache = TaskCache(str(tmp_path))
+    cached = task_output.TaskOutput(description="Analyse HDFC Bank.", raw="Revenue grew 12%.", agent="Financial Analyst")
+    assert cache.get(key()) is None
+
+    cache.put(key(), task(), cached)
+    restored = cache.get(key())
+    assert restored.raw == "Revenue grew 12%."
+    assert restored.agent == "Financial Analyst"
+    assert cache.clear() == 1
+    assert cache.get(key()) is None
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    pytest.importorskip("crewai")
+    cache = TaskCache(str(tmp_path))
+    path = tmp_path / key()[:2] / f"{key()}.json"
+    path.parent.mkdir()
+    path.write_text("{not json", encoding="utf-8")
+    assert cache.get(key()) is None
@@ -0,0 +1,57 @@
+import contextvars
+import re
+
+from metrics import start_run_metrics
+from token_budget import budget_summary, cap_tool_output, charge_task_llm_tokens, current_budget, estimate_tokens, task_scope
+
+WORDS = ("deposits loans branches margins capital liquidity payments treasury retail wholesale "
+         "insurance cards mortgages savings bonds fees").split()
+
+
+def sentences(topic, count):
+    """`count` distinct sentences about `topic`."""
+    return " ".join(f"{topic} {WORDS[i % len(WORDS)]} grew {i + 3}% in {WORDS[(i * 5) % len(WORDS)]} during quarter {i}."
+                    for i in range(count))
+
+
+def test_single_result_is_reduced_to_the_cap(monkeypatch):
+    monkeypatch.setenv("TOOL_OUTPUT_TOKENS", "200")
+    text = cap_tool_output("Research Tool", sentences("Revenue", 60), "revenue")
+    assert estimate_tokens(text) < 300
+    assert "output reduced from" in text
+
+
+def test_each_fanout_section_gets_its_own_cap(monkeypatch):
+    monkeypatch.setenv("TOOL_OUTPUT_TOKENS", "200")
+    queries = ["HDFC Bank revenue", "HDFC Bank leadership", "HDFC Bank competitors"]
+    output = "Research findings for 3 queries:" + "".join(
+        f"\n## {number}. {query}\n{sentences(query.split()[-1].title(), 40)}\n" for number, query in enumerate(queries, 1))
+    text = cap_tool_output("Research Tool", output, str(queries))
+    bodies = re.split(r"^## \d+\. .+$", text, flags=re.MULTILINE)[1:]
+    assert len(bodies) == 3
+    for body in bodies: # The last query is not crowded out by the first
+        assert 100 < estimate_tokens(body) <= 250
+
+
+def test_outside_a_run_outputs_are_capped_but_not_recorded(monkeypatch):
+    monkeypatch.setenv("TOOL_OUTPUT_TOKENS", "200")
+    text = contextvars.copy_context().run(cap_tool_output, "Research Tool", sentences("Revenue", 60), "revenue")
+    assert "output reduced from" in text
+    assert contextvars.copy_context().run(current_budget) is None
+    contextvars.copy_context().run(charge_task_llm_tokens, "task_1", 500) # Nothing to charge, and no error
+
+
+def test_inside_a_run_outputs_are_charged_to_the_task(monkeypatch):
+    monkeypatch.setenv("TOOL_OUTPUT_TOKENS", "200")
+
+    def run():
+        metrics = start_run_metrics()
+        with task_scope("task_1"):
+            cap_tool_output("Research Tool", sentences("Revenue", 60), "revenue")
+        charge_task_llm_tokens("task_1", 500)
+        return budget_summary(metrics)
+
+    summary = contextvars.copy_context().run(run)
+    assert summary["llm_tokens"] == 500
+    assert summary["tool_outputs_trimmed"] == 1
+    assert summary["tasks"]["task_1"]["tool_delivered"] < summary["tasks"]["task_1"]["tool_raw"]
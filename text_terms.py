@@ -0,0 +1,20 @@
+"""
+Stopwords and sentence splitting shared by the search and retrieval modules.
+
+FUNCTION_WORDS are dropped by every module that matches text by its terms.
+Each module adds its own filler words on top: search_cache.py for query keys,
+report_index.py for report chunks and knowledge_index.py for knowledge base
+questions. Words such as "it" or "how" stay meaningful in some of them ("IT
+services"), so they are not shared. report_index.py and snippet_dedup.py cut
+search results into sentences with SENTENCE_BREAK.
+"""
+import re
+
+# Articles, prepositions and the like; never what a query is about
+FUNCTION_WORDS = frozenset({
+    "a", "about", "an", "and", "are", "at", "by", "for", "from", "in", "is", "of", "on", "the",
+    "to", "what", "with",
+})
+
+# A sentence ends at ., ! or ? followed by whitespace and something that can start a sentence
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
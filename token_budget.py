@@ -0,0 +1,271 @@
+"""
+Token budgets for crew runs.
+
+Nothing used to cap the text an LLM reads. A research tool could return a full
+search dump, and a failing tool returned its whole Python traceback as its
+result. This module has three parts:
+
+- `estimate_tokens()` counts tokens with tiktoken's cl100k_base encoding when it
+  is available; the copy bundled with litellm is used, so no download is needed.
+  Otherwise it assumes about four characters per token.
+- `cap_tool_output()` keeps each tool result under its tool's cap. Over-cap
+  results are reduced to the passages most relevant to the tool's input
+  (context_compaction.compact_text) instead of being cut off at a fixed length.
+  A multi-query research result gets the cap for each of its query sections.
+  `error_envelope()` is the short error result that replaces tracebacks.
+- Each run gets a `TokenBudget`, tied to the metrics run started by
+  `metrics.start_run_metrics()`. It is charged with every task's LLM tokens and
+  every tool output, and its totals appear in the report's Execution Metadata.
+  When a run budget is set and the run gets close to it, tool output caps
+  shrink with the remaining budget.
+
+Configuration (environment variables, all optional):
+    TOKEN_ESTIMATOR     "tiktoken" (default; falls back when unavailable) or "chars"
+    TOOL_OUTPUT_TOKENS  Default cap per tool result (default: 800)
+    TOOL_OUTPUT_CAPS    Per-tool caps by tool name, e.g. "Advanced Research Tool=1200,Knowledge Base Tool=600"
+    TASK_TOKEN_BUDGET   LLM tokens per task; tasks over it are flagged (default: no limit)
+    RUN_TOKEN_BUDGET    LLM tokens per run; tool caps shrink as it runs out (default: no limit)
+"""
+import contextlib
+import contextvars
+import importlib.util
+import os
+import re
+import threading
+import weakref
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from metrics import current_run_metrics
+
+DEFAULT_TOOL_OUTPUT_TOKENS = 800
+MIN_TOOL_OUTPUT_TOKENS = 150
+ERROR_MESSAGE_CHARS = 240
+
+_SECTION_HEADING = re.compile(r"^## \d+\. (.+)$", re.MULTILINE) # One per query in research_fanout results
+
+# --- Token Estimates ---
+
+_encoding: Any = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding() -> Any:
+    """tiktoken's cl100k_base, or None when tiktoken (or its encoding file) is not available."""
+    if os.getenv("TOKEN_ESTIMATOR", "tiktoken").lower() == "chars":
+        return None
+    try:
+        import tiktoken
+        spec = importlib.util.find_spec("litellm")
+        if spec and spec.origin and "TIKTOKEN_CACHE_DIR" not in os.environ:
+            # litellm ships the encoding file; pointing tiktoken at it avoids a download
+            os.environ["TIKTOKEN_CACHE_DIR"] = os.path.join(os.path.dirname(spec.origin), "litellm_core_utils", "tokenizers")
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Warning: tiktoken is unavailable ({type(e).__name__}); token counts are estimated from length.")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of `text` with cl100k_base, or about four characters per token without tiktoken."""
+    global _encoding, _encoding_loaded
+    if not text:
+        return 0
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                _encoding = _load_encoding()
+                _encoding_loaded = True
+    if _encoding is None:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+# --- Run and Task Accounting ---
+
+_current_task: contextvars.ContextVar[str] = contextvars.ContextVar("current_task", default="unassigned")
+
+
+@contextlib.contextmanager
+def task_scope(task_name: str) -> Iterator[None]:
+    """Charges tool outputs produced inside the block to `task_name`."""
+    token = _current_task.set(task_name)
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name, "").strip()
+    return int(value) if value.isdigit() else None
+
+
+class TokenBudget:
+    """Token accounting for one run: LLM tokens and tool output tokens per task, against optional limits."""
+
+    def __init__(self, run_limit: Optional[int] = None, task_limit: Optional[int] = None):
+        self.run_limit = run_limit
+        self.task_limit = task_limit
+        self.tasks: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _task(self, task_name: str) -> Dict[str, int]:
+        return self.tasks.setdefault(task_name, {"llm": 0, "tool_raw": 0, "tool_delivered": 0, "tool_trimmed": 0})
+
+    def charge_llm(self, task_name: str, tokens: int) -> None:
+        with self._lock:
+            task = self._task(task_name)
+            before = task["llm"]
+            task["llm"] += tokens
+        if self.task_limit and before <= self.task_limit < before + tokens:
+            print(f"Warning: Task '{task_name}' used {before + tokens} LLM tokens, over its budget of {self.task_limit}.")
+
+    def charge_tool(self, task_name: str, raw_tokens: int, delivered_tokens: int) -> None:
+        with self._lock:
+            task = self._task(task_name)
+            task["tool_raw"] += raw_tokens
+            task["tool_delivered"] += delivered_tokens
+            task["tool_trimmed"] += int(delivered_tokens < raw_tokens)
+
+    def llm_tokens(self) -> int:
+        with self._lock:
+            return sum(task["llm"] for task in self.tasks.values())
+
+    def remaining(self) -> Optional[int]:
+        return None if self.run_limit is None else self.run_limit - self.llm_tokens()
+
+    def tool_cap(self, base_cap: int) -> int:
+        """The cap for the next tool output: `base_cap`, lowered once the run's remaining budget gets small."""
+        remaining = self.remaining()
+        if remaining is None or remaining >= base_cap * 4:
+            return base_cap
+        return max(MIN_TOOL_OUTPUT_TOKENS, remaining // 4)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            tasks = {name: dict(values) for name, values in sorted(self.tasks.items())}
+        llm = sum(task["llm"] for task in tasks.values())
+        return {
+            "run_limit": self.run_limit,
+            "task_limit": self.task_limit,
+            "llm_tokens": llm,
+            "tool_output_tokens": sum(task["tool_raw"] for task in tasks.values()),
+            "tool_output_delivered": sum(task["tool_delivered"] for task in tasks.values()),
+            "tool_outputs_trimmed": sum(task["tool_trimmed"] for task in tasks.values()),
+            "over_budget_tasks": [name for name, task in tasks.items() if self.task_limit and task["llm"] > self.task_limit],
+            "run_over_budget": bool(self.run_limit and llm > self.run_limit),
+            "tasks": tasks,
+        }
+
+
+_budgets: "weakref.WeakKeyDictionary[Any, TokenBudget]" = weakref.WeakKeyDictionary()
+_budgets_lock = threading.Lock()
+
+
+def current_budget() -> Optional[TokenBudget]:
+    """
+    The budget of the run in progress (created with the limits from the environment), or None
+    outside a run: tool outputs there are only capped, and nothing is recorded.
+    """
+    run = current_run_metrics()
+    if run is None:
+        return None
+    with _budgets_lock:
+        budget = _budgets.get(run)
+        if budget is None:
+            budget = _budgets[run] = TokenBudget(_env_int("RUN_TOKEN_BUDGET"), _env_int("TASK_TOKEN_BUDGET"))
+        return budget
+
+
+def budget_summary(run: Any) -> Optional[Dict[str, Any]]:
+    """Summary of the budget kept for a metrics run, or None if nothing was charged to it."""
+    with _budgets_lock:
+        budget = _budgets.get(run)
+    return budget.summary() if budget is not None else None
+
+
+def charge_task_llm_tokens(task_name: str, tokens: int) -> None:
+    budget = current_budget()
+    if budget is not None and tokens:
+        budget.charge_llm(task_name, tokens)
+
+# --- Tool Outputs ---
+
+def _parse_caps(spec: str) -> Dict[str, int]:
+    caps = {}
+    for item in (spec or "").split(","):
+        name, _, value = item.rpartition("=")
+        if name.strip() and value.strip().isdigit():
+            caps[name.strip()] = int(value)
+    return caps
+
+
+def tool_output_cap(tool_name: str) -> int:
+    caps = _parse_caps(os.getenv("TOOL_OUTPUT_CAPS", ""))
+    return caps.get(tool_name, _env_int("TOOL_OUTPUT_TOKENS") or DEFAULT_TOOL_OUTPUT_TOKENS)
+
+
+def _split_sections(text: str) -> List[Tuple[str, str, str]]:
+    """(heading, query, body) for each "## N. <query>" section of a multi-query result; the preamble has no query."""
+    headings = list(_SECTION_HEADING.finditer(text))
+    if len(headings) < 2:
+        return []
+    sections = [("", "", text[:headings[0].start()])]
+    for position, heading in enumerate(headings):
+        end = headings[position + 1].start() if position + 1 < len(headings) else len(text)
+        sections.append((heading.group(0), heading.group(1), text[heading.end():end]))
+    return sections
+
+
+def cap_tool_output(tool_name: str, output: str, query: str = "") -> str:
+    """
+    Keeps a tool result under the tool's cap. Over-cap results are reduced to the passages
+    most relevant to `query` (the tool input). A multi-query result (research_fanout) gets the
+    cap once per query section, each reduced around its own query, so later queries are not
+    crowded out. Charges the result to the current task (during a run) either way.
+    """
+    from context_compaction import compact_text
+
+    raw = output if isinstance(output, str) else str(output)
+    budget = current_budget()
+    raw_tokens = estimate_tokens(raw)
+    cap = tool_output_cap(tool_name) if budget is None else budget.tool_cap(tool_output_cap(tool_name))
+    text = raw
+    if raw_tokens > cap:
+        sections = _split_sections(raw)
+        if sections:
+            text = "".join(heading + (f"\n{compact_text(body, cap, focus=section_query)}\n"
+                                      if section_query and estimate_tokens(body) > cap else body)
+                           for heading, section_query, body in sections)
+        else:
+            text = compact_text(raw, cap, focus=query)
+        if text != raw:
+            text += f"\n[{tool_name}: output reduced from ~{raw_tokens} to ~{estimate_tokens(text)} tokens; key passages kept.]"
+    if budget is not None:
+        budget.charge_tool(_current_task.get(), raw_tokens, estimate_tokens(text) if text != raw else raw_tokens)
+    return text
+
+
+def error_envelope(tool_name: str, error: BaseException, tool_input: str = "") -> str:
+    """A short error result for the LLM in place of a traceback. Starts with "Error" so metrics count it as a failure."""
+    message = " ".join(str(error).split())[:ERROR_MESSAGE_CHARS]
+    shown_input = " ".join(str(tool_input or "").split())[:80]
+    return (f"Error: {tool_name} failed ({type(error).__name__}: {message}). "
+            f"Input was: '{shown_input}'. Try a simpler or differently worded input, or continue without this tool.")
+
+
+def format_budget_lines(summary: Optional[Dict[str, Any]]) -> List[str]:
+    """Execution Metadata lines for a run's token budget."""
+    if not summary:
+        return []
+    run_limit = f" of {summary['run_limit']} budgeted" if summary["run_limit"] else ""
+    lines = [f"Token budget: {summary['llm_tokens']} LLM tokens{run_limit}"
+             + (" (over budget)" if summary["run_over_budget"] else "")]
+    if summary["tool_output_tokens"]:
+        lines.append(f"Tool output tokens: {summary['tool_output_delivered']} sent to the LLM of {summary['tool_output_tokens']} produced "
+                     f"({summary['tool_outputs_trimmed']} output(s) trimmed)")
+    for name, task in summary["tasks"].items():
+        if task["llm"] or task["tool_raw"]:
+            flag = " (over budget)" if name in summary["over_budget_tasks"] else ""
+            lines.append(f"Task budget [{name}]: {task['llm']} LLM tokens, {task['tool_delivered']} tool output tokens{flag}")
+    return lines
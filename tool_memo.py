@@ -0,0 +1,91 @@
+"""
+Memoization for deterministic tools.
+
+Tools whose output depends only on their input string opt in by setting
+`memoize = True` on the class. Results are kept in a bounded LRU cache shared by
+every instance of that tool class in the process. JSON inputs are canonicalized
+(sorted keys, compact separators) before lookup, so the same payload with its keys
+in a different order still hits.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+DEFAULT_MEMO_SIZE = 256
+
+
+def canonical_input(input_string: str) -> str:
+    """Canonical form of a tool input: re-serialized JSON when it parses, otherwise the stripped string."""
+    text = (input_string or "").strip()
+    if text[:1] in ("{", "["):
+        try:
+            return json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        except (json.JSONDecodeError, TypeError, ValueError):
+            pass
+    return text
+
+
+class ToolMemo:
+    """A thread-safe LRU cache of results for one tool class, with hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_MEMO_SIZE):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_memos: Dict[str, ToolMemo] = {}
+_memos_lock = threading.Lock()
+
+
+def get_tool_memo(tool_cls: type, maxsize: int = DEFAULT_MEMO_SIZE) -> ToolMemo:
+    """Returns the process-wide memo for a tool class, creating it on first use."""
+    key = f"{tool_cls.__module__}.{tool_cls.__name__}"
+    memo = _memos.get(key)
+    if memo is None:
+        with _memos_lock:
+            memo = _memos.setdefault(key, ToolMemo(key, maxsize))
+    return memo
+
+
+def memo_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit-rate statistics for every memoized tool class used in this process."""
+    return {name: memo.stats() for name, memo in sorted(_memos.items())}
@@ -0,0 +1,87 @@
+"""
+Process-wide registry of shared tool instances.
+
+Crews used to build fresh tool objects for every agent and task that listed them,
+so one crew held around twenty copies of six tools. Each copy re-ran crewAI's
+schema and description generation, and every crew built by batch.py did it all
+again. The registry builds each tool type once per process (or once per
+distinct set of constructor arguments) and hands the same instance to every
+agent, task and crew. Tools keep no per-call state, and the memoized ones share
+their LRU cache through tool_memo.py, so sharing them is safe across threads.
+
+The static part of each tool's metadata (name, description, argument JSON
+schema) is computed once per tool type into a manifest. `get_metadata()` adds
+the live figures (reliability, memo stats) on top.
+"""
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+class ToolRegistry:
+    """Shared tool instances, keyed by class and constructor arguments, plus their manifest."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instances: Dict[Tuple[type, Tuple[Tuple[str, Any], ...]], Any] = {}
+        self._manifest: Dict[Tuple[type, str], Dict[str, Any]] = {}
+        self.requests = 0
+
+    def get(self, tool_cls: type, **kwargs: Any) -> Any:
+        """The shared instance of `tool_cls` built with `kwargs`, created on first use."""
+        key = (tool_cls, tuple(sorted(kwargs.items())))
+        with self._lock:
+            self.requests += 1
+            tool = self._instances.get(key)
+            if tool is None:
+                tool = tool_cls(**kwargs)
+                self._instances[key] = tool
+            return tool
+
+    def tools(self, *tool_classes: type) -> List[Any]:
+        """Shared instances for several tool classes, in order."""
+        return [self.get(tool_cls) for tool_cls in tool_classes]
+
+    def describe(self, tool: Any) -> Dict[str, Any]:
+        """A tool's static manifest entry. Computed once per tool type and name, then served from the manifest."""
+        key = (type(tool), getattr(tool, "name", ""))
+        entry = self._manifest.get(key)
+        if entry is None:
+            args_schema = getattr(tool, "args_schema", None)
+            entry = {
+                "tool_name": tool.name or "Unnamed Tool",
+                "class": f"{type(tool).__module__}.{type(tool).__qualname__}",
+                # crewAI prefixes the description with the tool name and arguments; keep the plain text
+                "description": str(tool.description).split("Tool Description: ", 1)[-1],
+                "args_schema": args_schema.model_json_schema() if hasattr(args_schema, "model_json_schema") else None,
+            }
+            with self._lock:
+                entry = self._manifest.setdefault(key, entry)
+        return entry
+
+    def manifest(self) -> List[Dict[str, Any]]:
+        """Manifest entries for every registered tool instance."""
+        with self._lock:
+            tools = list(self._instances.values())
+        return [self.describe(tool) for tool in tools]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tool_types": len({tool_cls for tool_cls, _ in self._instances}),
+                "instances": len(self._instances),
+                "requests": self.requests,
+            }
+
+
+# --- Process-wide registry ---
+
+_registry = ToolRegistry()
+
+
+def get_tool_registry() -> ToolRegistry:
+    return _registry
+
+
+def shared_tools(*tool_classes: type) -> List[Any]:
+    """Shared instances of the given tool classes (see ToolRegistry.get)."""
+    return _registry.tools(*tool_classes)